@@ -1,5 +1,6 @@
 """Public package surface for the Instacart analytics dashboard."""
 
+from .coalescing import CoalescingAnalyticsRepository
 from .data import (
     AnalyticsRepository,
     DemoAnalyticsRepository,
@@ -14,6 +15,7 @@ from .data import (
 
 __all__ = [
     "AnalyticsRepository",
+    "CoalescingAnalyticsRepository",
     "DemoAnalyticsRepository",
     "MariaDBAnalyticsRepository",
     "RepositoryConfigurationError",
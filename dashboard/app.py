@@ -25,6 +25,7 @@ PROJECT_ROOT = Path(__file__).resolve().parents[1]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
+from dashboard.coalescing import CoalescingAnalyticsRepository
 from dashboard.components import clear_data_cache, render_source_status
 from dashboard.data import (
     AnalyticsRepository,
@@ -49,9 +50,9 @@ PAGES: dict[str, PageRenderer] = {
 
 @st.cache_resource(show_spinner=False)
 def initialize_repository() -> AnalyticsRepository:
-    """Create one checked repository resource for the Streamlit server process."""
+    """Create one checked, request-coalescing repository for the server process."""
 
-    return create_repository(get_settings())
+    return CoalescingAnalyticsRepository(create_repository(get_settings()))
 
 
 def render_sidebar(repository: AnalyticsRepository) -> str:
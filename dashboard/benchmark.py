@@ -0,0 +1,463 @@
+"""Concurrent load test and latency baseline for analytics repositories.
+
+Each simulated session replays a deterministic, weighted mix of every
+:class:`~dashboard.data.AnalyticsRepository` method with the parameter shapes the
+pages actually send (department filters, slider limits, explorer tables).  The
+report records throughput, end-to-end p50/p95/p99 latency, per-method latency
+and, for pooled SQLAlchemy sources, how long callers waited for a connection.
+Reports are plain JSON so a run can be diffed against a stored baseline.
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import json
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Callable, Iterator, Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any, Final
+
+import numpy as np
+
+from etl.config import PROJECT_ROOT, get_settings
+
+from .coalescing import CoalescingAnalyticsRepository
+from .data import TABLE_WHITELIST, AnalyticsRepository, create_repository
+
+BENCHMARK_SCHEMA_VERSION: Final = 1
+DEFAULT_OUTPUT_PATH: Final = PROJECT_ROOT / "artifacts" / "benchmarks" / "dashboard-latest.json"
+DEFAULT_SESSIONS: Final = 5
+DEFAULT_REQUESTS_PER_SESSION: Final = 40
+# Relative call frequency per page visit: overview and product views dominate,
+# the table explorer is opened rarely.
+METHOD_WEIGHTS: Final = {
+    "overview_kpis": 6,
+    "day_trends": 5,
+    "hour_trends": 5,
+    "weekend_comparison": 4,
+    "departments": 6,
+    "products": 8,
+    "aisles": 4,
+    "customer_segments": 3,
+    "basket_distribution": 3,
+    "table_catalog": 1,
+    "table_metadata": 1,
+    "table_sample": 1,
+}
+PRODUCT_LIMITS: Final = (10, 20, 30, 50, 100)
+AISLE_LIMITS: Final = (10, 15, 20, 25, 30)
+AISLE_MIN_ITEMS: Final = (1_000, 5_000, 10_000, 50_000)
+SAMPLE_LIMITS: Final = (5, 10, 25, 50)
+REGRESSION_METRICS: Final = ("p50_ms", "p95_ms", "p99_ms")
+
+BenchmarkRequest = tuple[str, dict[str, Any]]
+
+
+class BenchmarkError(RuntimeError):
+    """Raised when a benchmark cannot be configured or compared."""
+
+
+@dataclass(frozen=True)
+class CallSample:
+    """One timed repository call made by a simulated session."""
+
+    session: int
+    method: str
+    elapsed_ms: float
+    ok: bool
+
+
+def build_workload(
+    *,
+    sessions: int,
+    requests_per_session: int,
+    seed: int,
+    departments: Sequence[str],
+) -> list[list[BenchmarkRequest]]:
+    """Return one deterministic request sequence per simulated session.
+
+    Every session starts with the overview batch the landing page issues, then
+    draws weighted calls.  Products alternate between the page's fixed top-100
+    request and slider-sized limits, with or without a department filter.
+    """
+
+    if sessions < 1 or requests_per_session < 1:
+        raise BenchmarkError("sessions and requests per session must be at least 1")
+    methods = list(METHOD_WEIGHTS)
+    weights = list(METHOD_WEIGHTS.values())
+    department_choices: list[str | None] = [None, *departments]
+    tables = sorted(TABLE_WHITELIST)
+    workload: list[list[BenchmarkRequest]] = []
+    for session in range(sessions):
+        rng = random.Random(seed + session)
+        requests: list[BenchmarkRequest] = [
+            ("overview_kpis", {}),
+            ("day_trends", {}),
+            ("hour_trends", {}),
+            ("departments", {}),
+        ]
+        while len(requests) < requests_per_session:
+            method = rng.choices(methods, weights=weights)[0]
+            requests.append((method, _parameters(method, rng, department_choices, tables)))
+        workload.append(requests[:requests_per_session])
+    return workload
+
+
+def _parameters(
+    method: str,
+    rng: random.Random,
+    departments: Sequence[str | None],
+    tables: Sequence[str],
+) -> dict[str, Any]:
+    if method == "products":
+        return {"limit": rng.choice(PRODUCT_LIMITS), "department": rng.choice(departments)}
+    if method == "aisles":
+        return {"limit": rng.choice(AISLE_LIMITS), "min_items": rng.choice(AISLE_MIN_ITEMS)}
+    if method == "table_metadata":
+        return {"table_name": rng.choice(tables)}
+    if method == "table_sample":
+        return {"table_name": rng.choice(tables), "limit": rng.choice(SAMPLE_LIMITS)}
+    return {}
+
+
+class PoolWaitProbe:
+    """Time connection checkouts on a SQLAlchemy pool while installed."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._waits_ms: list[float] = []
+
+    @property
+    def waits_ms(self) -> list[float]:
+        with self._lock:
+            return list(self._waits_ms)
+
+    @contextmanager
+    def installed(self, repository: AnalyticsRepository) -> Iterator[bool]:
+        """Wrap the source pool's ``connect``; yields whether a pool was found."""
+
+        pool = getattr(getattr(_source(repository), "engine", None), "pool", None)
+        connect = getattr(pool, "connect", None)
+        if pool is None or not callable(connect):
+            yield False
+            return
+
+        def timed_connect(*args: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            try:
+                return connect(*args, **kwargs)
+            finally:
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                with self._lock:
+                    self._waits_ms.append(elapsed_ms)
+
+        pool.connect = timed_connect
+        try:
+            yield True
+        finally:
+            del pool.connect
+
+
+def _source(repository: AnalyticsRepository) -> AnalyticsRepository:
+    while isinstance(repository, CoalescingAnalyticsRepository):
+        repository = repository.repository
+    return repository
+
+
+def run_benchmark(
+    repository: AnalyticsRepository,
+    workload: Sequence[Sequence[BenchmarkRequest]],
+    *,
+    clock: Callable[[], float] = time.perf_counter,
+) -> dict[str, Any]:
+    """Replay ``workload`` with one thread per session and summarize the run."""
+
+    probe = PoolWaitProbe()
+    samples: list[CallSample] = []
+    samples_lock = threading.Lock()
+
+    def run_session(session: int, requests: Sequence[BenchmarkRequest]) -> None:
+        session_samples: list[CallSample] = []
+        for method, parameters in requests:
+            started = clock()
+            try:
+                getattr(repository, method)(**parameters)
+                ok = True
+            except Exception:  # Benchmark boundary: count the failure, keep the session going.
+                ok = False
+            session_samples.append(
+                CallSample(session, method, (clock() - started) * 1000, ok)
+            )
+        with samples_lock:
+            samples.extend(session_samples)
+
+    with probe.installed(repository) as pooled:
+        started = clock()
+        with ThreadPoolExecutor(
+            max_workers=len(workload), thread_name_prefix="benchmark-session"
+        ) as executor:
+            for future in [
+                executor.submit(run_session, session, requests)
+                for session, requests in enumerate(workload)
+            ]:
+                future.result()
+        elapsed_seconds = clock() - started
+
+    metadata = repository.source_metadata
+    by_method: defaultdict[str, list[CallSample]] = defaultdict(list)
+    for sample in samples:
+        by_method[sample.method].append(sample)
+    return {
+        "benchmark_schema_version": BENCHMARK_SCHEMA_VERSION,
+        "created_at": datetime.now(UTC).isoformat(),
+        "source": {
+            "label": metadata.label,
+            "mode": metadata.mode,
+            "requested_mode": metadata.requested_mode,
+            "is_live": metadata.is_live,
+            "coalesced": isinstance(repository, CoalescingAnalyticsRepository),
+        },
+        "sessions": len(workload),
+        "requests": len(samples),
+        "errors": sum(not sample.ok for sample in samples),
+        "elapsed_seconds": elapsed_seconds,
+        "throughput_rps": len(samples) / elapsed_seconds if elapsed_seconds > 0 else None,
+        "latency_ms": latency_stats([sample.elapsed_ms for sample in samples]),
+        "pool_wait_ms": latency_stats(probe.waits_ms) | {"checkouts": len(probe.waits_ms)}
+        if pooled
+        else None,
+        "methods": {
+            method: {
+                "requests": len(method_samples),
+                "errors": sum(not sample.ok for sample in method_samples),
+            }
+            | latency_stats([sample.elapsed_ms for sample in method_samples])
+            for method, method_samples in sorted(by_method.items())
+        },
+    }
+
+
+def latency_stats(values_ms: Sequence[float]) -> dict[str, float | None]:
+    """Return mean, max and p50/p95/p99 in milliseconds; ``None`` when empty."""
+
+    if not values_ms:
+        return dict.fromkeys(("mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"))
+    values = np.asarray(values_ms, dtype=float)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "max_ms": float(values.max()),
+    }
+
+
+def compare_reports(
+    current: Mapping[str, Any], baseline: Mapping[str, Any]
+) -> list[dict[str, Any]]:
+    """Return per-metric percentage changes of ``current`` against ``baseline``.
+
+    Latency rows are positive when the current run is slower; the throughput row
+    is positive when the current run served fewer requests per second.
+    """
+
+    if baseline.get("benchmark_schema_version") != BENCHMARK_SCHEMA_VERSION:
+        raise BenchmarkError("Baseline was written by an incompatible benchmark version.")
+    rows: list[dict[str, Any]] = []
+
+    def add(scope: str, metric: str, before: Any, after: Any, *, higher_is_better: bool) -> None:
+        if before is None or after is None or before == 0:
+            return
+        change = (after - before) / before * 100
+        rows.append(
+            {
+                "scope": scope,
+                "metric": metric,
+                "baseline": before,
+                "current": after,
+                "regression_pct": -change if higher_is_better else change,
+            }
+        )
+
+    add(
+        "overall",
+        "throughput_rps",
+        baseline.get("throughput_rps"),
+        current.get("throughput_rps"),
+        higher_is_better=True,
+    )
+    scopes = [("overall", baseline["latency_ms"], current["latency_ms"])]
+    scopes += [
+        (method, baseline["methods"][method], stats)
+        for method, stats in current.get("methods", {}).items()
+        if method in baseline.get("methods", {})
+    ]
+    for scope, before, after in scopes:
+        for metric in REGRESSION_METRICS:
+            add(scope, metric, before.get(metric), after.get(metric), higher_is_better=False)
+    return rows
+
+
+def load_repository(spec: str | None, mode: str) -> AnalyticsRepository:
+    """Create the benchmark target from a ``module:factory`` spec or a dashboard mode."""
+
+    if spec:
+        module_name, _, attribute = spec.partition(":")
+        if not module_name or not attribute:
+            raise BenchmarkError("--repository must look like 'package.module:factory'.")
+        factory = getattr(importlib.import_module(module_name), attribute, None)
+        if not callable(factory):
+            raise BenchmarkError(f"{spec} is not a callable repository factory.")
+        repository = factory()
+        if not isinstance(repository, AnalyticsRepository):
+            raise BenchmarkError(f"{spec} did not return an AnalyticsRepository.")
+        return repository
+    if mode == "demo":
+        return create_repository({"DASHBOARD_MODE": "demo"})
+    return create_repository(replace(get_settings(), dashboard_mode=mode))
+
+
+def _write_report(path: Path, payload: Mapping[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(payload, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+
+def _format_ms(value: float | None) -> str:
+    return "n/a" if value is None else f"{value:.1f} ms"
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Load-test dashboard repository methods from concurrent sessions."
+    )
+    parser.add_argument(
+        "--mode",
+        choices=("demo", "live", "auto"),
+        default="demo",
+        help="dashboard data mode to benchmark (ignored with --repository)",
+    )
+    parser.add_argument(
+        "--repository",
+        help="zero-argument factory returning any AnalyticsRepository, as module:callable",
+    )
+    parser.add_argument(
+        "--coalesce",
+        action="store_true",
+        help="wrap the source in the dashboard's coalescing cache, as the app does",
+    )
+    parser.add_argument("--sessions", type=int, default=DEFAULT_SESSIONS)
+    parser.add_argument(
+        "--requests-per-session", type=int, default=DEFAULT_REQUESTS_PER_SESSION
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT_PATH)
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        help="earlier benchmark JSON to diff this run against",
+    )
+    parser.add_argument(
+        "--fail-on-regression",
+        type=float,
+        metavar="PCT",
+        help="exit non-zero when any compared metric regresses by more than PCT percent",
+    )
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.sessions < 1 or args.requests_per_session < 1:
+        parser.error("--sessions and --requests-per-session must be at least 1")
+    if args.fail_on_regression is not None and args.baseline is None:
+        parser.error("--fail-on-regression requires --baseline")
+
+    try:
+        baseline = (
+            json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline else None
+        )
+        repository = load_repository(args.repository, args.mode)
+    except Exception as exc:  # CLI boundary: report setup failures without a traceback.
+        print(f"Benchmark setup failed: {exc.__class__.__name__}: {exc}", file=sys.stderr)
+        return 1
+    if args.coalesce:
+        repository = CoalescingAnalyticsRepository(repository)
+
+    try:
+        departments = repository.departments()["department_name"].astype(str).tolist()
+        workload = build_workload(
+            sessions=args.sessions,
+            requests_per_session=args.requests_per_session,
+            seed=args.seed,
+            departments=departments,
+        )
+        report = run_benchmark(repository, workload)
+    finally:
+        close = getattr(repository, "close", None)
+        if callable(close):
+            close()
+    report["workload"] = {
+        "seed": args.seed,
+        "requests_per_session": args.requests_per_session,
+        "method_weights": dict(METHOD_WEIGHTS),
+    }
+
+    exit_code = 0
+    if baseline is not None:
+        try:
+            comparison = compare_reports(report, baseline)
+        except BenchmarkError as exc:
+            print(f"Benchmark comparison failed: {exc}", file=sys.stderr)
+            return 1
+        report["comparison"] = {"baseline": str(args.baseline), "metrics": comparison}
+        for row in comparison:
+            print(
+                f"{row['scope']:<20} {row['metric']:<15} "
+                f"{row['baseline']:>10.2f} -> {row['current']:>10.2f} "
+                f"({row['regression_pct']:+.1f}% regression)"
+            )
+        if args.fail_on_regression is not None and any(
+            row["regression_pct"] > args.fail_on_regression for row in comparison
+        ):
+            exit_code = 2
+
+    _write_report(args.output, report)
+    latency = report["latency_ms"]
+    pool_wait = report["pool_wait_ms"] or {}
+    print(
+        f"{report['requests']} requests from {report['sessions']} sessions "
+        f"({report['errors']} errors) at {report['throughput_rps'] or 0:.1f} req/s; "
+        f"p50 {_format_ms(latency['p50_ms'])}, p95 {_format_ms(latency['p95_ms'])}, "
+        f"p99 {_format_ms(latency['p99_ms'])}; "
+        f"pool wait p95 {_format_ms(pool_wait.get('p95_ms'))}"
+    )
+    print(f"Benchmark report written to {args.output}")
+    return exit_code
+
+
+__all__ = [
+    "BENCHMARK_SCHEMA_VERSION",
+    "BenchmarkError",
+    "PoolWaitProbe",
+    "build_workload",
+    "compare_reports",
+    "latency_stats",
+    "load_repository",
+    "main",
+    "run_benchmark",
+]
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,246 @@
+"""Single-flight, stale-while-revalidate wrapper around an analytics repository.
+
+Streamlit reruns every session independently, so an expired result used to send
+one identical aggregate query per concurrent session to the warehouse.  The
+wrapper keys each repository call by method name and bound parameters, lets the
+first caller execute it, and hands the same result to every caller that arrives
+while it is in flight.  Once a result is older than its fresh window it is still
+served for a bounded stale window while one background refresh replaces it.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass, field, replace
+from typing import Any, Final
+
+import pandas as pd
+
+from .data import AnalyticsRepository, RepositoryHealth, SourceMetadata, TableMetadata
+from .instrumentation import QueryRecorder
+
+LOGGER = logging.getLogger(__name__)
+DEFAULT_FRESH_SECONDS: Final = 900.0
+DEFAULT_STALE_SECONDS: Final = 900.0
+DEFAULT_MAX_ENTRIES: Final = 128
+COALESCED_METHODS: Final = frozenset(
+    {
+        "overview_kpis",
+        "day_trends",
+        "hour_trends",
+        "weekend_comparison",
+        "departments",
+        "products",
+        "aisles",
+        "customer_segments",
+        "basket_distribution",
+        "table_catalog",
+        "table_metadata",
+        "table_sample",
+    }
+)
+
+CallKey = tuple[str, tuple[tuple[str, Any], ...]]
+
+
+@dataclass(slots=True)
+class _Entry:
+    value: Any
+    loaded_at: float
+
+
+@dataclass(slots=True)
+class _Flight:
+    done: threading.Event = field(default_factory=threading.Event)
+    result: Any = None
+    error: BaseException | None = None
+
+
+class CoalescingAnalyticsRepository(AnalyticsRepository):
+    """Share one in-flight execution and result per identical repository call."""
+
+    def __init__(
+        self,
+        repository: AnalyticsRepository,
+        *,
+        fresh_seconds: float = DEFAULT_FRESH_SECONDS,
+        stale_seconds: float = DEFAULT_STALE_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if fresh_seconds < 0 or stale_seconds < 0:
+            raise ValueError("fresh_seconds and stale_seconds must be non-negative")
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self._repository = repository
+        self._recorder = repository.query_recorder or QueryRecorder()
+        self._fresh_seconds = float(fresh_seconds)
+        self._stale_seconds = float(stale_seconds)
+        self._max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: dict[CallKey, _Entry] = {}
+        self._flights: dict[CallKey, _Flight] = {}
+
+    @property
+    def repository(self) -> AnalyticsRepository:
+        """The wrapped source; exposed for diagnostics, not for page code."""
+
+        return self._repository
+
+    @property
+    def source_metadata(self) -> SourceMetadata:
+        return self._repository.source_metadata
+
+    @property
+    def query_recorder(self) -> QueryRecorder:
+        """The source's query records plus this layer's cache outcomes."""
+
+        return self._recorder
+
+    def health_check(self) -> RepositoryHealth:
+        return self._repository.health_check()
+
+    def call(self, method_name: str, parameters: Mapping[str, Any] | None = None) -> Any:
+        """Return a coalesced, isolated result for one whitelisted repository method."""
+
+        if method_name not in COALESCED_METHODS:
+            raise ValueError(f"Unsupported repository method: {method_name}")
+        bound = dict(parameters or {})
+        key: CallKey = (method_name, tuple(sorted(bound.items())))
+        with self._lock:
+            entry = self._entries.get(key)
+            age = None if entry is None else self._clock() - entry.loaded_at
+            if entry is not None and age is not None and age < self._fresh_seconds:
+                self._recorder.record_cache(method_name, "fresh")
+                return _isolated(entry.value)
+            if (
+                entry is not None
+                and age is not None
+                and age < self._fresh_seconds + self._stale_seconds
+            ):
+                self._recorder.record_cache(method_name, "stale")
+                if key not in self._flights:
+                    flight = self._flights[key] = _Flight()
+                    threading.Thread(
+                        target=self._execute,
+                        args=(key, flight, method_name, bound),
+                        name=f"repository-refresh-{method_name}",
+                        daemon=True,
+                    ).start()
+                return _isolated(entry.value)
+            flight = self._flights.get(key)
+            leader = flight is None
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+            self._recorder.record_cache(method_name, "miss" if leader else "coalesced")
+
+        if leader:
+            self._execute(key, flight, method_name, bound)
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return _isolated(flight.result)
+
+    def clear(self) -> None:
+        """Forget completed results; in-flight executions still finish normally."""
+
+        with self._lock:
+            self._entries.clear()
+
+    def close(self) -> None:
+        self.clear()
+        close = getattr(self._repository, "close", None)
+        if callable(close):
+            close()
+
+    def _execute(
+        self,
+        key: CallKey,
+        flight: _Flight,
+        method_name: str,
+        parameters: dict[str, Any],
+    ) -> None:
+        try:
+            flight.result = getattr(self._repository, method_name)(**parameters)
+        except BaseException as exc:  # re-raised in every waiting caller
+            flight.error = exc
+            LOGGER.warning(
+                "Coalesced repository method %s failed (%s)",
+                method_name,
+                type(exc).__name__,
+            )
+        with self._lock:
+            if flight.error is None:
+                self._entries[key] = _Entry(value=flight.result, loaded_at=self._clock())
+                self._evict_oldest()
+            self._flights.pop(key, None)
+        flight.done.set()
+
+    def _evict_oldest(self) -> None:
+        while len(self._entries) > self._max_entries:
+            oldest = min(self._entries, key=lambda key: self._entries[key].loaded_at)
+            del self._entries[oldest]
+
+    def overview_kpis(self) -> pd.DataFrame:
+        return self.call("overview_kpis")
+
+    def day_trends(self) -> pd.DataFrame:
+        return self.call("day_trends")
+
+    def hour_trends(self) -> pd.DataFrame:
+        return self.call("hour_trends")
+
+    def weekend_comparison(self) -> pd.DataFrame:
+        return self.call("weekend_comparison")
+
+    def departments(self) -> pd.DataFrame:
+        return self.call("departments")
+
+    def products(
+        self, *, limit: int = 20, department: str | None = None
+    ) -> pd.DataFrame:
+        return self.call("products", {"limit": limit, "department": department})
+
+    def aisles(
+        self, *, limit: int = 15, min_items: int = 10_000
+    ) -> pd.DataFrame:
+        return self.call("aisles", {"limit": limit, "min_items": min_items})
+
+    def customer_segments(self) -> pd.DataFrame:
+        return self.call("customer_segments")
+
+    def basket_distribution(self) -> pd.DataFrame:
+        return self.call("basket_distribution")
+
+    def table_catalog(self) -> pd.DataFrame:
+        return self.call("table_catalog")
+
+    def table_metadata(self, table_name: str) -> TableMetadata:
+        return self.call("table_metadata", {"table_name": table_name})
+
+    def table_sample(self, table_name: str, *, limit: int = 10) -> pd.DataFrame:
+        return self.call("table_sample", {"table_name": table_name, "limit": limit})
+
+
+def _isolated(value: Any) -> Any:
+    # Shared results must not leak caller mutations into other sessions.
+    if isinstance(value, pd.DataFrame):
+        return value.copy(deep=True)
+    if isinstance(value, TableMetadata):
+        return replace(
+            value,
+            columns=value.columns.copy(deep=True),
+            indexes=value.indexes.copy(deep=True),
+            partitions=value.partitions.copy(deep=True),
+        )
+    return value
+
+
+__all__ = [
+    "COALESCED_METHODS",
+    "CoalescingAnalyticsRepository",
+]
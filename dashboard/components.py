@@ -3,17 +3,27 @@
 from __future__ import annotations
 
 import logging
-from collections.abc import Iterable
+import threading
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from html import escape
-from typing import Any
+from typing import Any, Final
 
 import pandas as pd
 import plotly.graph_objects as go
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
+from dashboard.coalescing import CoalescingAnalyticsRepository
 from dashboard.data import AnalyticsRepository, SourceMetadata
 
 LOGGER = logging.getLogger(__name__)
+# Matches the live engine's ``pool_size`` so a batch never queues on overflow
+# connections; the executor is shared, bounding concurrency across sessions.
+BATCH_MAX_WORKERS: Final = 5
+RepositoryRequest = tuple[str, Mapping[str, Any]]
+_BATCH_EXECUTOR: ThreadPoolExecutor | None = None
+_BATCH_EXECUTOR_LOCK = threading.Lock()
 PLOTLY_CONFIG = {
     "displaylogo": False,
     "responsive": True,
@@ -82,6 +92,31 @@ def _cached_repository_call(
     return method(**dict(parameters))
 
 
+def _fetch_repository_data(
+    repository: AnalyticsRepository,
+    method_name: str,
+    cache_parameters: tuple[tuple[str, Any], ...],
+) -> Any:
+    if isinstance(repository, CoalescingAnalyticsRepository):
+        # The coalescing repository owns freshness and stale serving;
+        # a second Streamlit TTL would pin stale results for a full period.
+        return repository.call(method_name, dict(cache_parameters))
+    return _cached_repository_call(
+        repository,
+        source_cache_key(repository.source_metadata),
+        method_name,
+        cache_parameters,
+    )
+
+
+def _warn_unavailable(method_name: str, error: BaseException) -> None:
+    LOGGER.error("Dashboard repository method %s failed", method_name, exc_info=error)
+    st.warning(
+        "This view could not load from the selected data source. "
+        "Retry the session or verify the warehouse readiness check."
+    )
+
+
 def load_repository_data(
     repository: AnalyticsRepository,
     method_name: str,
@@ -94,21 +129,67 @@ def load_repository_data(
     cache_parameters = tuple(sorted(parameters.items()))
     try:
         with st.spinner(loading_label):
-            return _cached_repository_call(
-                repository,
-                source_cache_key(repository.source_metadata),
-                method_name,
-                cache_parameters,
-            )
-    except Exception:
-        LOGGER.exception("Dashboard repository method %s failed", method_name)
-        st.warning(
-            "This view could not load from the selected data source. "
-            "Retry the session or verify the warehouse readiness check."
-        )
+            return _fetch_repository_data(repository, method_name, cache_parameters)
+    except Exception as exc:
+        _warn_unavailable(method_name, exc)
         return None
 
 
+def _batch_executor() -> ThreadPoolExecutor:
+    global _BATCH_EXECUTOR
+    with _BATCH_EXECUTOR_LOCK:
+        if _BATCH_EXECUTOR is None:
+            _BATCH_EXECUTOR = ThreadPoolExecutor(
+                max_workers=BATCH_MAX_WORKERS,
+                thread_name_prefix="repository-batch",
+            )
+        return _BATCH_EXECUTOR
+
+
+def iter_repository_batch(
+    repository: AnalyticsRepository,
+    requests: Sequence[RepositoryRequest],
+) -> Iterator[tuple[int, Future[Any]]]:
+    """Dispatch repository requests concurrently and yield them as they complete.
+
+    Each item is the request's position and its finished future.  Worker threads
+    never render; callers inspect the future on the script thread.
+    """
+
+    context = get_script_run_ctx()
+
+    def fetch(method_name: str, cache_parameters: tuple[tuple[str, Any], ...]) -> Any:
+        if context is not None:
+            add_script_run_ctx(threading.current_thread(), context)
+        return _fetch_repository_data(repository, method_name, cache_parameters)
+
+    executor = _batch_executor()
+    positions = {
+        executor.submit(fetch, method_name, tuple(sorted(dict(parameters).items()))): index
+        for index, (method_name, parameters) in enumerate(requests)
+    }
+    for future in as_completed(positions):
+        yield positions[future], future
+
+
+def load_repository_batch(
+    repository: AnalyticsRepository,
+    requests: Sequence[RepositoryRequest],
+    *,
+    loading_label: str,
+) -> list[Any | None]:
+    """Prefetch several page datasets at once; results keep the request order."""
+
+    results: list[Any | None] = [None] * len(requests)
+    with st.spinner(loading_label):
+        for index, future in iter_repository_batch(repository, requests):
+            try:
+                results[index] = future.result()
+            except Exception as exc:
+                _warn_unavailable(requests[index][0], exc)
+    return results
+
+
 def clear_data_cache() -> None:
     """Clear only cached repository results, leaving the connection resource intact."""
 
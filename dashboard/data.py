@@ -9,6 +9,7 @@ demo aggregates, or automatic live-to-demo fallback after a health check.
 from __future__ import annotations
 
 import os
+import time
 from abc import ABC, abstractmethod
 from collections.abc import Mapping
 from dataclasses import asdict, dataclass
@@ -20,6 +21,7 @@ from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.engine import URL
 
 from . import demo_data
+from .instrumentation import QueryRecorder
 
 REQUIRED_TABLES: Final = frozenset(
     {
@@ -32,6 +34,9 @@ REQUIRED_TABLES: Final = frozenset(
         "Fact_Order_Details",
     }
 )
+# Largest result a page may request; pages fetch this once and slice locally.
+PRODUCT_LIMIT_MAX: Final = 100
+AISLE_LIMIT_MAX: Final = 134
 TABLE_WHITELIST: Final = {
     name: {"kind": kind, "description": description}
     for name, kind, description, _ in demo_data.TABLE_CATALOG
@@ -103,6 +108,12 @@ class AnalyticsRepository(ABC):
 
         return self.source_metadata
 
+    @property
+    def query_recorder(self) -> QueryRecorder | None:
+        """Rolling query instrumentation; sources that run no SQL report ``None``."""
+
+        return None
+
     @abstractmethod
     def health_check(self) -> RepositoryHealth:
         """Validate connectivity, schema contract, and minimum warehouse data."""
@@ -261,7 +272,7 @@ class DemoAnalyticsRepository(AnalyticsRepository):
     def products(
         self, *, limit: int = 20, department: str | None = None
     ) -> pd.DataFrame:
-        safe_limit = _validated_limit(limit, maximum=100)
+        safe_limit = _validated_limit(limit, maximum=PRODUCT_LIMIT_MAX)
         frame = demo_data.top_products()
         if department:
             normalized = department.strip().casefold()
@@ -273,7 +284,7 @@ class DemoAnalyticsRepository(AnalyticsRepository):
     def aisles(
         self, *, limit: int = 15, min_items: int = 10_000
     ) -> pd.DataFrame:
-        safe_limit = _validated_limit(limit, maximum=134)
+        safe_limit = _validated_limit(limit, maximum=AISLE_LIMIT_MAX)
         safe_min_items = _validated_nonnegative_int(min_items, "min_items")
         frame = demo_data.aisle_reorder_rates()
         frame = frame[frame["items"] >= safe_min_items]
@@ -332,9 +343,16 @@ class DemoAnalyticsRepository(AnalyticsRepository):
 class MariaDBAnalyticsRepository(AnalyticsRepository):
     """Read-only aggregate repository backed by the MariaDB warehouse."""
 
-    def __init__(self, engine: Any, *, requested_mode: str = "live") -> None:
+    def __init__(
+        self,
+        engine: Any,
+        *,
+        requested_mode: str = "live",
+        recorder: QueryRecorder | None = None,
+    ) -> None:
         self._engine = engine
         self._requested_mode = requested_mode
+        self._recorder = recorder if recorder is not None else QueryRecorder()
         self._health = RepositoryHealth(
             healthy=False,
             checked_at=_utcnow(),
@@ -357,6 +375,16 @@ class MariaDBAnalyticsRepository(AnalyticsRepository):
             checked_at=self._health.checked_at,
         )
 
+    @property
+    def query_recorder(self) -> QueryRecorder:
+        return self._recorder
+
+    @property
+    def engine(self) -> Any:
+        """The pooled engine, exposed for diagnostics such as pool-wait probes."""
+
+        return self._engine
+
     def health_check(self) -> RepositoryHealth:
         checks: dict[str, bool] = {
             "connection": False,
@@ -464,7 +492,8 @@ class MariaDBAnalyticsRepository(AnalyticsRepository):
                     COUNT(DISTINCT aisle_id) AS total_aisles
                 FROM Dim_Product
             ) AS product_metrics
-            """
+            """,
+            operation="overview_kpis",
         )
 
     def day_trends(self) -> pd.DataFrame:
@@ -480,7 +509,8 @@ class MariaDBAnalyticsRepository(AnalyticsRepository):
             INNER JOIN Dim_Time AS t ON fo.time_id = t.time_id
             GROUP BY t.order_dow, t.dow_name
             ORDER BY t.order_dow
-            """
+            """,
+            operation="day_trends",
         )
 
     def hour_trends(self) -> pd.DataFrame:
@@ -495,7 +525,8 @@ class MariaDBAnalyticsRepository(AnalyticsRepository):
             INNER JOIN Dim_Time AS t ON fo.time_id = t.time_id
             GROUP BY t.order_hour
             ORDER BY t.order_hour
-            """
+            """,
+            operation="hour_trends",
         )
 
     def weekend_comparison(self) -> pd.DataFrame:
@@ -514,7 +545,8 @@ class MariaDBAnalyticsRepository(AnalyticsRepository):
             INNER JOIN Dim_Time AS t ON fo.time_id = t.time_id
             GROUP BY CASE WHEN t.is_weekend = 1 THEN 'Weekend' ELSE 'Weekday' END
             ORDER BY day_type DESC
-            """
+            """,
+            operation="weekend_comparison",
         )
 
     def departments(self) -> pd.DataFrame:
@@ -532,7 +564,8 @@ class MariaDBAnalyticsRepository(AnalyticsRepository):
                 ON p.department_id = d.department_id
             GROUP BY d.department_id, d.department_name
             ORDER BY total_items DESC
-            """
+            """,
+            operation="departments",
         )
         denominator = frame["total_items"].sum() if not frame.empty else 0
         frame["market_share_pct"] = (
@@ -543,7 +576,7 @@ class MariaDBAnalyticsRepository(AnalyticsRepository):
     def products(
         self, *, limit: int = 20, department: str | None = None
     ) -> pd.DataFrame:
-        safe_limit = _validated_limit(limit, maximum=100)
+        safe_limit = _validated_limit(limit, maximum=PRODUCT_LIMIT_MAX)
         where_clause = ""
         params: dict[str, Any] = {"limit": safe_limit}
         if department:
@@ -573,12 +606,13 @@ class MariaDBAnalyticsRepository(AnalyticsRepository):
             LIMIT :limit
             """,
             params,
+            operation="products",
         )
 
     def aisles(
         self, *, limit: int = 15, min_items: int = 10_000
     ) -> pd.DataFrame:
-        safe_limit = _validated_limit(limit, maximum=134)
+        safe_limit = _validated_limit(limit, maximum=AISLE_LIMIT_MAX)
         safe_min_items = _validated_nonnegative_int(min_items, "min_items")
         return self._read_frame(
             """
@@ -595,6 +629,7 @@ class MariaDBAnalyticsRepository(AnalyticsRepository):
             LIMIT :limit
             """,
             {"min_items": safe_min_items, "limit": safe_limit},
+            operation="aisles",
         )
 
     def customer_segments(self) -> pd.DataFrame:
@@ -614,7 +649,8 @@ class MariaDBAnalyticsRepository(AnalyticsRepository):
               AND u.user_segment <> ''
             GROUP BY u.user_segment
             ORDER BY avg_orders DESC
-            """
+            """,
+            operation="customer_segments",
         )
 
     def basket_distribution(self) -> pd.DataFrame:
@@ -642,7 +678,8 @@ class MariaDBAnalyticsRepository(AnalyticsRepository):
             WHERE fo.total_items > 0
             GROUP BY bucket_order, basket_size
             ORDER BY bucket_order
-            """
+            """,
+            operation="basket_distribution",
         )
 
     def table_catalog(self) -> pd.DataFrame:
@@ -693,6 +730,7 @@ class MariaDBAnalyticsRepository(AnalyticsRepository):
               AND TABLE_NAME = :table_name
             """,
             {"table_name": safe_name},
+            operation="table_metadata",
         )
         partitions = self._read_frame(
             """
@@ -708,6 +746,7 @@ class MariaDBAnalyticsRepository(AnalyticsRepository):
             ORDER BY PARTITION_ORDINAL_POSITION
             """,
             {"table_name": safe_name},
+            operation="table_metadata",
         )
         row_count_estimate: int | None = None
         size_mb: float | None = None
@@ -734,7 +773,9 @@ class MariaDBAnalyticsRepository(AnalyticsRepository):
         # SQL identifiers cannot be bound by DBAPI. Interpolation is safe here
         # because ``safe_name`` has been resolved from the fixed whitelist.
         return self._read_frame(
-            f"SELECT * FROM `{safe_name}` LIMIT :limit", {"limit": safe_limit}
+            f"SELECT * FROM `{safe_name}` LIMIT :limit",
+            {"limit": safe_limit},
+            operation="table_sample",
         )
 
     def close(self) -> None:
@@ -743,9 +784,36 @@ class MariaDBAnalyticsRepository(AnalyticsRepository):
             dispose()
 
     def _read_frame(
-        self, statement: str, params: Mapping[str, Any] | None = None
+        self,
+        statement: str,
+        params: Mapping[str, Any] | None = None,
+        *,
+        operation: str,
     ) -> pd.DataFrame:
-        return pd.read_sql(text(statement), self._engine, params=dict(params or {}))
+        bound = dict(params or {})
+        started = time.perf_counter()
+        frame = pd.read_sql(text(statement), self._engine, params=bound)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        plan_json = (
+            self._explain(statement, bound)
+            if self._recorder.should_capture_plan(elapsed_ms)
+            else None
+        )
+        self._recorder.record_query(
+            operation, elapsed_ms=elapsed_ms, frame=frame, plan_json=plan_json
+        )
+        return frame
+
+    def _explain(self, statement: str, params: Mapping[str, Any]) -> str | None:
+        # Plans are diagnostics only: a failed EXPLAIN must never fail the page.
+        try:
+            with self._engine.connect() as connection:
+                plan = connection.execute(
+                    text(f"EXPLAIN FORMAT=JSON {statement}"), dict(params)
+                ).scalar()
+        except Exception:
+            return None
+        return None if plan is None else str(plan)
 
 
 def create_repository(settings: Any = None) -> AnalyticsRepository:
@@ -757,6 +825,9 @@ def create_repository(settings: Any = None) -> AnalyticsRepository:
     demo repository with a sanitized ``fallback_reason`` when live data is not
     ready.
 
+    ``DASHBOARD_SLOW_QUERY_MS`` optionally enables ``EXPLAIN FORMAT=JSON``
+    capture for live queries at or above that latency.
+
     For tests, callers may inject an ``engine`` setting.  Production callers can
     provide ``database_url`` or DB host/user/password/name fields, including a
     nested ``DB_CONFIG`` mapping compatible with ``etl.config``.
@@ -779,13 +850,14 @@ def create_repository(settings: Any = None) -> AnalyticsRepository:
         )
     if requested_mode == "demo":
         return DemoAnalyticsRepository(requested_mode="demo")
+    recorder = QueryRecorder(slow_query_ms=_slow_query_threshold(settings))
 
     try:
         engine = _setting(settings, "engine", "DB_ENGINE", default=None)
         if engine is None:
             engine = _build_engine(settings)
         live_repository = MariaDBAnalyticsRepository(
-            engine, requested_mode=requested_mode
+            engine, requested_mode=requested_mode, recorder=recorder
         )
         health = live_repository.health_check()
     except Exception as exc:
@@ -876,6 +948,25 @@ def _build_engine(settings: Any) -> Any:
     )
 
 
+def _slow_query_threshold(settings: Any) -> float | None:
+    raw_value = _setting(
+        settings, "DASHBOARD_SLOW_QUERY_MS", "dashboard_slow_query_ms", default=None
+    )
+    if raw_value is None or str(raw_value).strip() == "":
+        return None
+    try:
+        threshold = float(raw_value)
+    except (TypeError, ValueError) as exc:
+        raise RepositoryConfigurationError(
+            "DASHBOARD_SLOW_QUERY_MS must be a non-negative number of milliseconds."
+        ) from exc
+    if threshold < 0:
+        raise RepositoryConfigurationError(
+            "DASHBOARD_SLOW_QUERY_MS must be a non-negative number of milliseconds."
+        )
+    return threshold
+
+
 def _setting(settings: Any, *keys: str, default: Any = None) -> Any:
     # Explicitly supplied settings must win over ambient process variables,
     # even when the caller uses a lower-case/dataclass alias for the same key.
@@ -993,9 +1084,11 @@ def _demo_partitions(table_name: str) -> pd.DataFrame:
 
 
 __all__ = [
+    "AISLE_LIMIT_MAX",
     "AnalyticsRepository",
     "DemoAnalyticsRepository",
     "MariaDBAnalyticsRepository",
+    "PRODUCT_LIMIT_MAX",
     "RepositoryConfigurationError",
     "RepositoryHealth",
     "RepositoryUnavailableError",
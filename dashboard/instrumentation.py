@@ -0,0 +1,172 @@
+"""Rolling, credential-free performance records for dashboard repository calls.
+
+The live repository records one entry per executed warehouse query: latency,
+returned rows, in-memory result size, and optionally an ``EXPLAIN FORMAT=JSON``
+plan for slow statements.  The coalescing layer records whether each page
+request was answered from its cache.  Both are summarized per repository
+method so slow aggregates are visible before users report them.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+from collections import defaultdict, deque
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime
+from typing import Any, Final
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_WINDOW: Final = 500
+CACHE_OUTCOMES: Final = ("fresh", "stale", "coalesced", "miss")
+SUMMARY_COLUMNS: Final = [
+    "method",
+    "queries",
+    "p50_ms",
+    "p95_ms",
+    "max_ms",
+    "avg_rows",
+    "avg_result_kb",
+    "cache_requests",
+    "cache_hit_rate_pct",
+    "slow_plans",
+]
+
+
+@dataclass(frozen=True)
+class QueryRecord:
+    """One executed warehouse query; never contains SQL text or parameters."""
+
+    method: str
+    elapsed_ms: float
+    rows: int
+    result_bytes: int
+    recorded_at: datetime
+    plan_json: str | None = None
+
+
+class QueryRecorder:
+    """Thread-safe rolling window of query timings and cache outcomes per method."""
+
+    def __init__(
+        self,
+        *,
+        window: int = DEFAULT_WINDOW,
+        slow_query_ms: float | None = None,
+    ) -> None:
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        if slow_query_ms is not None and slow_query_ms < 0:
+            raise ValueError("slow_query_ms must be non-negative")
+        self._window = window
+        self._slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._queries: defaultdict[str, deque[QueryRecord]] = defaultdict(
+            lambda: deque(maxlen=self._window)
+        )
+        self._cache: defaultdict[str, deque[str]] = defaultdict(
+            lambda: deque(maxlen=self._window)
+        )
+
+    @property
+    def slow_query_ms(self) -> float | None:
+        """Latency above which callers should capture a query plan, if enabled."""
+
+        return self._slow_query_ms
+
+    def should_capture_plan(self, elapsed_ms: float) -> bool:
+        return self._slow_query_ms is not None and elapsed_ms >= self._slow_query_ms
+
+    def record_query(
+        self,
+        method: str,
+        *,
+        elapsed_ms: float,
+        frame: pd.DataFrame,
+        plan_json: str | None = None,
+    ) -> QueryRecord:
+        record = QueryRecord(
+            method=method,
+            elapsed_ms=float(elapsed_ms),
+            rows=len(frame),
+            result_bytes=int(frame.memory_usage(deep=True).sum()),
+            recorded_at=datetime.now(UTC),
+            plan_json=plan_json,
+        )
+        with self._lock:
+            self._queries[method].append(record)
+        return record
+
+    def record_cache(self, method: str, outcome: str) -> None:
+        if outcome not in CACHE_OUTCOMES:
+            raise ValueError(f"outcome must be one of: {', '.join(CACHE_OUTCOMES)}")
+        with self._lock:
+            self._cache[method].append(outcome)
+
+    def records(self) -> list[QueryRecord]:
+        with self._lock:
+            return [record for records in self._queries.values() for record in records]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._queries.clear()
+            self._cache.clear()
+
+    def summary(self) -> pd.DataFrame:
+        """Return rolling p50/p95 latency, size, and cache hit rate per method."""
+
+        with self._lock:
+            queries = {method: list(records) for method, records in self._queries.items()}
+            cache = {method: list(outcomes) for method, outcomes in self._cache.items()}
+        rows: list[dict[str, Any]] = []
+        for method in sorted(set(queries) | set(cache)):
+            records = queries.get(method, [])
+            outcomes = cache.get(method, [])
+            latencies = np.asarray([record.elapsed_ms for record in records], dtype=float)
+            hits = sum(outcome != "miss" for outcome in outcomes)
+            rows.append(
+                {
+                    "method": method,
+                    "queries": len(records),
+                    "p50_ms": float(np.percentile(latencies, 50)) if records else None,
+                    "p95_ms": float(np.percentile(latencies, 95)) if records else None,
+                    "max_ms": float(latencies.max()) if records else None,
+                    "avg_rows": (
+                        float(np.mean([record.rows for record in records])) if records else None
+                    ),
+                    "avg_result_kb": (
+                        float(np.mean([record.result_bytes for record in records])) / 1024
+                        if records
+                        else None
+                    ),
+                    "cache_requests": len(outcomes),
+                    "cache_hit_rate_pct": hits / len(outcomes) * 100 if outcomes else None,
+                    "slow_plans": sum(record.plan_json is not None for record in records),
+                }
+            )
+        return pd.DataFrame(rows, columns=SUMMARY_COLUMNS)
+
+    def to_json(self) -> str:
+        """Serialize the summary plus raw records for offline comparison."""
+
+        summary = self.summary().astype(object)
+        payload = {
+            "exported_at": datetime.now(UTC).isoformat(),
+            "window": self._window,
+            "slow_query_ms": self._slow_query_ms,
+            "summary": summary.where(summary.notna(), None).to_dict(orient="records"),
+            "queries": [
+                asdict(record) | {"recorded_at": record.recorded_at.isoformat()}
+                for record in self.records()
+            ],
+        }
+        return json.dumps(payload, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+__all__ = [
+    "CACHE_OUTCOMES",
+    "QueryRecord",
+    "QueryRecorder",
+]
@@ -11,7 +11,7 @@ from dashboard.components import (
     format_integer,
     format_percent,
     insight_card,
-    load_repository_data,
+    load_repository_batch,
     page_header,
     plotly_chart,
     require_columns,
@@ -43,10 +43,10 @@ def show(repository: AnalyticsRepository) -> None:
         "VIP has at least 50 orders; Frequent 20–49; Regular 10–19; New fewer than 10."
     )
 
-    segments = load_repository_data(
+    segments, baskets = load_repository_batch(
         repository,
-        "customer_segments",
-        loading_label="Loading customer segments…",
+        [("customer_segments", {}), ("basket_distribution", {})],
+        loading_label="Loading customer segments and basket distribution…",
     )
     segment_ok = require_columns(
         segments,
@@ -140,11 +140,6 @@ def show(repository: AnalyticsRepository) -> None:
         )
 
     st.subheader("Basket size distribution")
-    baskets = load_repository_data(
-        repository,
-        "basket_distribution",
-        loading_label="Loading basket distribution…",
-    )
     basket_ok = require_columns(
         baskets,
         (
@@ -12,7 +12,7 @@ from dashboard.components import (
     format_decimal,
     format_percent,
     insight_card,
-    load_repository_data,
+    load_repository_batch,
     page_header,
     plotly_chart,
     require_columns,
@@ -50,10 +50,15 @@ def show(repository: AnalyticsRepository) -> None:
         eyebrow="Instacart Decision Intelligence",
     )
 
-    kpis = load_repository_data(
+    kpis, day, hour, departments = load_repository_batch(
         repository,
-        "overview_kpis",
-        loading_label="Loading snapshot KPIs…",
+        [
+            ("overview_kpis", {}),
+            ("day_trends", {}),
+            ("hour_trends", {}),
+            ("departments", {}),
+        ],
+        loading_label="Loading snapshot KPIs, demand timing, and department mix…",
     )
     if not require_columns(
         kpis,
@@ -88,22 +93,6 @@ def show(repository: AnalyticsRepository) -> None:
         f"{format_compact_number(row.get('total_aisles'))} aisles."
     )
 
-    day = load_repository_data(
-        repository,
-        "day_trends",
-        loading_label="Loading day-of-week distribution…",
-    )
-    hour = load_repository_data(
-        repository,
-        "hour_trends",
-        loading_label="Loading hourly distribution…",
-    )
-    departments = load_repository_data(
-        repository,
-        "departments",
-        loading_label="Loading department mix…",
-    )
-
     st.subheader("When customers shop")
     day_ok = require_columns(day, ("dow_name", "orders", "share_pct"), context="Daily trend")
     hour_ok = require_columns(
@@ -1,4 +1,10 @@
-"""Product and aisle analytics page."""
+"""Product and aisle analytics page.
+
+Both sections are Streamlit fragments: moving a slider or changing a filter
+reruns only the section that owns the widget.  Each section loads the largest
+result its widgets can show once and slices smaller limits locally, so slider
+movement never reaches the data source.
+"""
 
 from __future__ import annotations
 
@@ -15,7 +21,7 @@ from dashboard.components import (
     plotly_chart,
     require_columns,
 )
-from dashboard.data import AnalyticsRepository
+from dashboard.data import AISLE_LIMIT_MAX, PRODUCT_LIMIT_MAX, AnalyticsRepository
 from dashboard.styles import SEQUENTIAL_SCALE, style_figure
 
 
@@ -44,6 +50,12 @@ def show(repository: AnalyticsRepository) -> None:
             sorted(departments["department_name"].dropna().astype(str).unique())
         )
 
+    _product_ranking(repository, department_options)
+    _aisle_loyalty(repository)
+
+
+@st.fragment
+def _product_ranking(repository: AnalyticsRepository, department_options: list[str]) -> None:
     st.subheader("Product ranking")
     filter_left, filter_right = st.columns(2)
     with filter_left:
@@ -68,7 +80,7 @@ def show(repository: AnalyticsRepository) -> None:
         repository,
         "products",
         loading_label="Loading product ranking…",
-        limit=100,
+        limit=PRODUCT_LIMIT_MAX,
         department=repository_department,
     )
     product_ok = require_columns(
@@ -85,7 +97,7 @@ def show(repository: AnalyticsRepository) -> None:
     )
     if product_ok:
         search_term = st.text_input(
-            "Search within up to 100 loaded top products",
+            f"Search within up to {PRODUCT_LIMIT_MAX} loaded top products",
             placeholder="Try banana, milk, or organic…",
             help=(
                 "This is a client-side search over the ranked result set, not a "
@@ -161,6 +173,9 @@ def show(repository: AnalyticsRepository) -> None:
                 key="products-download",
             )
 
+
+@st.fragment
+def _aisle_loyalty(repository: AnalyticsRepository) -> None:
     st.subheader("Aisle loyalty")
     aisle_left, aisle_right = st.columns(2)
     with aisle_left:
@@ -182,19 +197,28 @@ def show(repository: AnalyticsRepository) -> None:
             value=15,
             step=5,
         )
-    aisles = load_repository_data(
+    # Every aisle, already ranked by reorder rate then volume; the support
+    # filter and limit below reproduce the repository's HAVING and LIMIT.
+    all_aisles = load_repository_data(
         repository,
         "aisles",
         loading_label="Loading aisle aggregates…",
-        limit=aisle_limit,
-        min_items=min_items,
+        limit=AISLE_LIMIT_MAX,
+        min_items=0,
     )
     aisle_ok = require_columns(
-        aisles,
+        all_aisles,
         ("aisle_name", "reorder_rate_pct", "items"),
         context="Aisle ranking",
     )
-    if aisle_ok:
+    if not aisle_ok:
+        return
+    aisles = (
+        all_aisles[all_aisles["items"] >= min_items].head(aisle_limit).reset_index(drop=True)
+    )
+    if aisles.empty:
+        st.info("No aisle meets this minimum support. Lower the threshold to continue.")
+    else:
         aisle_chart_frame = aisles.sort_values("reorder_rate_pct", ascending=True)
         aisle_chart = px.bar(
             aisle_chart_frame,
@@ -13,6 +13,7 @@ from dashboard.components import (
     require_columns,
 )
 from dashboard.data import AnalyticsRepository, TableMetadata
+from dashboard.instrumentation import QueryRecorder
 
 
 def _catalog_label(catalog: pd.DataFrame, table_name: str) -> str:
@@ -98,6 +99,53 @@ def _render_metadata(metadata: TableMetadata) -> None:
             )
 
 
+def _render_query_performance(recorder: QueryRecorder | None) -> None:
+    st.subheader("Query performance")
+    if recorder is None:
+        st.info("This data source does not record query performance.")
+        return
+    summary = recorder.summary()
+    threshold = recorder.slow_query_ms
+    st.caption(
+        "Rolling latency percentiles per repository method for this server process. "
+        "Cache hits include fresh, stale-while-revalidate, and coalesced requests. "
+        + (
+            f"EXPLAIN plans are captured for queries of at least {threshold:,.0f} ms."
+            if threshold is not None
+            else "Set DASHBOARD_SLOW_QUERY_MS to capture EXPLAIN plans for slow queries."
+        )
+    )
+    if summary.empty:
+        st.info("No repository calls have been recorded yet in this process.")
+        return
+    st.dataframe(
+        summary,
+        width="stretch",
+        hide_index=True,
+        column_config={
+            "method": "Repository method",
+            "queries": st.column_config.NumberColumn("Warehouse queries", format="%d"),
+            "p50_ms": st.column_config.NumberColumn("p50 (ms)", format="%.1f"),
+            "p95_ms": st.column_config.NumberColumn("p95 (ms)", format="%.1f"),
+            "max_ms": st.column_config.NumberColumn("Max (ms)", format="%.1f"),
+            "avg_rows": st.column_config.NumberColumn("Average rows", format="%.1f"),
+            "avg_result_kb": st.column_config.NumberColumn("Average result (KB)", format="%.1f"),
+            "cache_requests": st.column_config.NumberColumn("Page requests", format="%d"),
+            "cache_hit_rate_pct": st.column_config.NumberColumn(
+                "Cache hit rate", format="%.1f%%"
+            ),
+            "slow_plans": st.column_config.NumberColumn("Captured plans", format="%d"),
+        },
+    )
+    st.download_button(
+        "Download query performance JSON",
+        data=recorder.to_json().encode("utf-8"),
+        file_name="instacart-query-performance.json",
+        mime="application/json",
+        key="tables-download-query-performance",
+    )
+
+
 def show(repository: AnalyticsRepository) -> None:
     page_header(
         "Warehouse explorer",
@@ -183,3 +231,5 @@ def show(repository: AnalyticsRepository) -> None:
                 ),
             },
         )
+
+    _render_query_performance(repository.query_recorder)
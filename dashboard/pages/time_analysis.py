@@ -10,7 +10,7 @@ from dashboard.components import (
     format_integer,
     format_percent,
     insight_card,
-    load_repository_data,
+    load_repository_batch,
     page_header,
     plotly_chart,
     require_columns,
@@ -29,20 +29,14 @@ def show(repository: AnalyticsRepository) -> None:
         eyebrow="Demand timing",
     )
 
-    day = load_repository_data(
+    day, hour, comparison = load_repository_batch(
         repository,
-        "day_trends",
-        loading_label="Loading day-of-week aggregates…",
-    )
-    hour = load_repository_data(
-        repository,
-        "hour_trends",
-        loading_label="Loading hour aggregates…",
-    )
-    comparison = load_repository_data(
-        repository,
-        "weekend_comparison",
-        loading_label="Loading normalized weekday comparison…",
+        [
+            ("day_trends", {}),
+            ("hour_trends", {}),
+            ("weekend_comparison", {}),
+        ],
+        loading_label="Loading day, hour, and normalized weekday aggregates…",
     )
 
     day_ok = require_columns(
@@ -44,6 +44,20 @@ def _positive_int(environment: Mapping[str, str], name: str, default: int) -> in
     return value
 
 
+def _int_tuple(
+    environment: Mapping[str, str], name: str, default: tuple[int, ...]
+) -> tuple[int, ...]:
+    raw_value = environment.get(name, "").strip()
+    if not raw_value:
+        return default
+    try:
+        return tuple(dict.fromkeys(int(part) for part in raw_value.split(",") if part.strip()))
+    except ValueError as exc:
+        raise ConfigurationError(
+            f"{name} must be a comma-separated list of integers, received {raw_value!r}"
+        ) from exc
+
+
 def _resolve_path(raw_path: str) -> Path:
     path = Path(raw_path).expanduser()
     return path.resolve() if path.is_absolute() else (PROJECT_ROOT / path).resolve()
@@ -65,6 +79,8 @@ class Settings:
     dashboard_cache_ttl: int
     mining_random_state: int
     mining_order_limit: int
+    mining_sample_seeds: tuple[int, ...]
+    etl_report_path: Path
 
     @classmethod
     def from_env(cls, environment: Mapping[str, str] | None = None) -> Settings:
@@ -74,6 +90,7 @@ class Settings:
             allowed = ", ".join(sorted(VALID_DASHBOARD_MODES))
             raise ConfigurationError(f"DASHBOARD_MODE must be one of: {allowed}")
 
+        mining_random_state = int(env.get("MINING_RANDOM_STATE", "42"))
         return cls(
             db_host=env.get("DB_HOST", "localhost").strip(),
             db_port=_positive_int(env, "DB_PORT", 3307),
@@ -85,8 +102,10 @@ class Settings:
             chunk_size=_positive_int(env, "CHUNK_SIZE", 50_000),
             dashboard_mode=dashboard_mode,
             dashboard_cache_ttl=_positive_int(env, "DASHBOARD_CACHE_TTL", 3600),
-            mining_random_state=int(env.get("MINING_RANDOM_STATE", "42")),
+            mining_random_state=mining_random_state,
             mining_order_limit=_positive_int(env, "MINING_ORDER_LIMIT", 100_000),
+            mining_sample_seeds=_int_tuple(env, "MINING_SAMPLE_SEEDS", (mining_random_state,)),
+            etl_report_path=_resolve_path(env.get("ETL_REPORT_PATH", "artifacts/etl/latest.json")),
         )
 
     @property
@@ -17,6 +17,12 @@ from sqlalchemy.engine import Connection, Engine
 
 from . import load_dimensions, load_facts
 from .config import PROJECT_ROOT, Settings, get_engine, get_settings
+from .eval_orders import (
+    EVAL_ORDERS_TABLE,
+    build_eval_orders,
+    eval_orders_table_present,
+)
+from .mining_sample import SAMPLE_TABLES, build_order_samples, sample_tables_present
 from .quality import require_source_files, run_warehouse_checks
 from .update_fact_metrics import update_all_metrics
 
@@ -92,11 +98,22 @@ def ensure_empty_load_target(engine: Engine) -> None:
 
 
 def reset_load_data(engine: Engine) -> None:
-    """Clear only ETL-owned rows; Dim_Time and the database itself are preserved."""
+    """Clear only ETL-owned rows; Dim_Time and the database itself are preserved.
+
+    Persisted mining samples rank the old ``Fact_Orders`` rows, so they are
+    cleared as well; a load that skips the sample stage then leaves mining on
+    the sort fallback instead of stale ranks.  The held-out train orders
+    describe the old load too and are cleared with them.
+    """
+    tables = (
+        *(SAMPLE_TABLES if sample_tables_present(engine) else ()),
+        *((EVAL_ORDERS_TABLE,) if eval_orders_table_present(engine) else ()),
+        *MUTABLE_TABLES,
+    )
     with engine.connect() as connection:
         connection.exec_driver_sql("SET FOREIGN_KEY_CHECKS=0")
         try:
-            for table in MUTABLE_TABLES:
+            for table in tables:
                 connection.exec_driver_sql(f"TRUNCATE TABLE {table}")
         finally:
             connection.exec_driver_sql("SET FOREIGN_KEY_CHECKS=1")
@@ -165,6 +182,22 @@ def run_pipeline(
         f"in {metric_result.elapsed_seconds:.1f}s"
     )
 
+    if sample_tables_present(engine):
+        stages.append(
+            _timed_stage(
+                "mining_samples",
+                lambda: build_order_samples(engine, settings.mining_sample_seeds),
+            )
+        )
+    else:
+        print("[mining_samples] skipped: Mining_Order_Sample is missing; run `make schema`")
+    if eval_orders_table_present(engine):
+        stages.append(
+            _timed_stage("eval_orders", lambda: build_eval_orders(engine, settings))
+        )
+    else:
+        print("[eval_orders] skipped: Mining_Eval_Orders is missing; run `make schema`")
+
     checks = run_warehouse_checks(engine)
     quality_results = [asdict(check) | {"passed": check.passed} for check in checks]
     return stages, table_counts(engine), quality_results
@@ -175,6 +208,14 @@ def _write_report(path: Path, payload: dict[str, Any]) -> None:
     path.write_text(json.dumps(payload, indent=2, sort_keys=True) + "\n", encoding="utf-8")
 
 
+def _loaded_run_id(path: Path) -> str | None:
+    try:
+        previous = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return None
+    return previous.get("loaded_run_id") if isinstance(previous, dict) else None
+
+
 def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         description="Load, reconcile, and validate the Instacart MariaDB warehouse."
@@ -202,8 +243,7 @@ def build_parser() -> argparse.ArgumentParser:
     parser.add_argument(
         "--report",
         type=Path,
-        default=DEFAULT_REPORT_PATH,
-        help="machine-readable ETL report path",
+        help="machine-readable ETL report path (default: ETL_REPORT_PATH)",
     )
     return parser
 
@@ -223,7 +263,9 @@ def cli(argv: list[str] | None = None) -> int:
         print("All required source files are present.")
         return 0
 
+    report_path = args.report or settings.etl_report_path
     run_id = str(uuid.uuid4())
+    previous_load = _loaded_run_id(report_path)
     started_at = _utc_now()
     started = time.perf_counter()
     payload: dict[str, Any] = {
@@ -242,6 +284,8 @@ def cli(argv: list[str] | None = None) -> int:
         payload.update(
             {
                 "status": "succeeded",
+                # Keys warehouse-derived caches such as the mining basket store.
+                "loaded_run_id": previous_load if args.validate_only else run_id,
                 "stages": [asdict(stage) for stage in stages],
                 "table_counts": counts,
                 "quality_checks": checks,
@@ -256,13 +300,15 @@ def cli(argv: list[str] | None = None) -> int:
                 "error": str(exc),
             }
         )
+        # A failed load may have changed tables, so derived caches must not match it.
+        payload["loaded_run_id"] = previous_load if args.validate_only else None
         print(f"ETL failed: {exc.__class__.__name__}: {exc}", file=sys.stderr)
         exit_code = 1
 
     payload["finished_at"] = _utc_now()
     payload["elapsed_seconds"] = round(time.perf_counter() - started, 3)
-    _write_report(args.report, payload)
-    print(f"ETL report: {args.report}")
+    _write_report(report_path, payload)
+    print(f"ETL report: {report_path}")
     return exit_code
 
 
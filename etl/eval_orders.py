@@ -0,0 +1,78 @@
+"""Record the held-out ``train`` orders so mining can leave them out."""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+
+from .config import Settings, get_engine, get_settings
+from .quality import require_source_files
+
+EVAL_ORDERS_TABLE = "Mining_Eval_Orders"
+# Mining queries append this to a ``Fact_Orders orders`` scope to drop held-out orders.
+EXCLUDE_EVAL_ORDERS = (
+    "NOT EXISTS (SELECT 1 FROM Mining_Eval_Orders held_out "
+    "WHERE held_out.order_id = orders.order_id)"
+)
+
+
+def eval_orders_table_present(engine: Engine) -> bool:
+    discovered = {name.casefold() for name in inspect(engine).get_table_names()}
+    return EVAL_ORDERS_TABLE.casefold() in discovered
+
+
+def build_eval_orders(engine: Engine, settings: Settings | None = None) -> int:
+    """Replace ``Mining_Eval_Orders`` with the train orders in orders.csv; return rows written."""
+    resolved = settings or get_settings()
+    require_source_files(resolved.csv_files, ["orders"])
+    rows = 0
+    with engine.begin() as connection:
+        connection.execute(text(f"DELETE FROM {EVAL_ORDERS_TABLE}"))
+        for chunk in pd.read_csv(
+            resolved.csv_files["orders"],
+            usecols=["order_id", "user_id", "eval_set"],
+            chunksize=resolved.chunk_size,
+        ):
+            train = chunk.loc[chunk["eval_set"].eq("train"), ["order_id", "user_id"]]
+            if train.empty:
+                continue
+            connection.execute(
+                text(
+                    f"INSERT INTO {EVAL_ORDERS_TABLE} (order_id, user_id) "
+                    "VALUES (:order_id, :user_id)"
+                ),
+                train.astype("int64").to_dict("records"),
+            )
+            rows += len(train)
+    return rows
+
+
+def held_out_order_ids(engine: Engine) -> np.ndarray | None:
+    """Sorted held-out order IDs, or ``None`` when no train orders are recorded."""
+    try:
+        with engine.connect() as connection:
+            order_ids = connection.execute(
+                text(f"SELECT order_id FROM {EVAL_ORDERS_TABLE} ORDER BY order_id")
+            ).scalars()
+            held_out = np.fromiter(order_ids, dtype=np.int64)
+    except DBAPIError:
+        return None
+    return held_out if len(held_out) else None
+
+
+def main() -> int:
+    settings = get_settings()
+    engine = get_engine(settings)
+    if not eval_orders_table_present(engine):
+        print(f"{EVAL_ORDERS_TABLE} is missing. Run `make schema` first.")
+        return 1
+    rows = build_eval_orders(engine, settings)
+    print(f"Held-out train orders recorded: {rows:,}.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
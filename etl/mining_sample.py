@@ -0,0 +1,76 @@
+"""Persist seeded order rankings so bounded mining samples become range reads."""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+from .config import get_engine, get_settings
+
+SAMPLE_TABLES = ("Mining_Order_Sample", "Mining_Sample_Seeds")
+# Mining reads the first N ranks; keep this expression identical to the
+# fallback sort in ``mining.market_basket`` so both paths select the same orders.
+SAMPLE_ORDERING = "CRC32(CONCAT(CAST(order_id AS CHAR), ':', :seed)), order_id"
+
+
+def sample_tables_present(engine: Engine) -> bool:
+    discovered = {name.casefold() for name in inspect(engine).get_table_names()}
+    return all(table.casefold() in discovered for table in SAMPLE_TABLES)
+
+
+def _rank_orders(connection: Connection, seed: int) -> int:
+    result = connection.execute(
+        text(
+            f"""
+            INSERT INTO Mining_Order_Sample (seed, sample_rank, order_id)
+            SELECT
+                :seed,
+                ROW_NUMBER() OVER (ORDER BY {SAMPLE_ORDERING}) - 1,
+                order_id
+            FROM Fact_Orders
+            """
+        ),
+        {"seed": seed},
+    )
+    orders = max(result.rowcount or 0, 0)
+    connection.execute(
+        text("INSERT INTO Mining_Sample_Seeds (seed, orders) VALUES (:seed, :orders)"),
+        {"seed": seed, "orders": orders},
+    )
+    return orders
+
+
+def build_order_samples(engine: Engine, seeds: Iterable[int]) -> int:
+    """Replace every persisted ranking with one per seed; return rows written.
+
+    Earlier seeds are dropped as well, because their ranks describe a previous
+    load.  Each seed is committed with its ``Mining_Sample_Seeds`` row, which
+    readers treat as the marker that the ranking is complete.
+    """
+    unique_seeds = sorted(set(seeds))
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM Mining_Sample_Seeds"))
+        connection.execute(text("DELETE FROM Mining_Order_Sample"))
+    rows = 0
+    for seed in unique_seeds:
+        with engine.begin() as connection:
+            rows += _rank_orders(connection, seed)
+    return rows
+
+
+def main() -> int:
+    settings = get_settings()
+    engine = get_engine(settings)
+    if not sample_tables_present(engine):
+        print("Mining sample tables are missing. Run `make schema` first.")
+        return 1
+    rows = build_order_samples(engine, settings.mining_sample_seeds)
+    seeds = ", ".join(map(str, settings.mining_sample_seeds))
+    print(f"Mining samples complete: {rows:,} ranked orders for seeds {seeds}.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
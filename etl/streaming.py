@@ -0,0 +1,49 @@
+"""Chunked warehouse reads that never buffer a whole result set on the client."""
+
+from __future__ import annotations
+
+from collections.abc import Iterator, Mapping
+from typing import Any
+
+import pandas as pd
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql.elements import TextClause
+
+
+def stream_frames(
+    engine: Engine,
+    query: TextClause,
+    *,
+    chunk_size: int,
+    params: Mapping[str, Any] | None = None,
+) -> Iterator[pd.DataFrame]:
+    """Yield ``query`` results as frames of at most ``chunk_size`` rows.
+
+    PyMySQL's default cursor reads the entire result when the statement
+    executes, so ``pd.read_sql(chunksize=...)`` alone only slices a full
+    client-side buffer.  ``stream_results`` switches to an unbuffered
+    server-side cursor and ``max_row_buffer`` caps SQLAlchemy's prefetch at one
+    chunk.  The connection stays busy until the generator is exhausted or closed.
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    with engine.connect() as connection:
+        streaming = connection.execution_options(
+            stream_results=True,
+            max_row_buffer=chunk_size,
+        )
+        yield from pd.read_sql(query, streaming, params=params, chunksize=chunk_size)
+
+
+def read_frame(
+    engine: Engine,
+    query: TextClause,
+    *,
+    chunk_size: int,
+    params: Mapping[str, Any] | None = None,
+) -> pd.DataFrame:
+    """Return one frame, holding raw rows for at most one chunk while it is built."""
+    return pd.concat(
+        stream_frames(engine, query, chunk_size=chunk_size, params=params),
+        ignore_index=True,
+    )
@@ -2,7 +2,12 @@
 
 from __future__ import annotations
 
+import hashlib
 import json
+import os
+import shutil
+import tempfile
+import uuid
 from collections.abc import Iterable, Mapping
 from datetime import UTC, datetime
 from pathlib import Path
@@ -24,6 +29,15 @@ def utc_timestamp() -> str:
     return datetime.now(UTC).isoformat()
 
 
+def file_digest(path: Path | str) -> str:
+    """SHA-256 of a file's bytes, read in 1 MiB blocks."""
+    digest = hashlib.sha256()
+    with Path(path).open("rb") as handle:
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
 def itemset_to_json(items: Iterable[object]) -> str:
     """Serialize an itemset without ambiguous comma-delimited parsing."""
     normalized = sorted((str(item) for item in items), key=str.casefold)
@@ -52,6 +66,41 @@ def write_json(path: Path, payload: Mapping[str, Any]) -> Path:
     return path
 
 
+def staging_directory(destination: Path) -> Path:
+    """A new hidden version directory next to ``destination`` for :func:`publish_directory`."""
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    return Path(tempfile.mkdtemp(prefix=f".{destination.name}.version-", dir=destination.parent))
+
+
+def publish_directory(staging: Path, destination: Path) -> Path:
+    """Point the ``destination`` symlink at the complete ``staging`` directory.
+
+    The link is replaced with one ``os.replace``, so readers always find either
+    the previous version or the new one.  The previous version is kept for
+    readers that opened it just before the swap; older versions are removed.
+    A plain directory left by an earlier layout is moved aside first.
+    """
+    if destination.is_symlink():
+        previous = destination.resolve()
+    elif destination.exists():
+        previous = staging_directory(destination)
+        os.replace(destination, previous)
+    else:
+        previous = None
+    link = destination.with_name(f".{destination.name}.link-{uuid.uuid4().hex}")
+    os.symlink(staging.name, link, target_is_directory=True)
+    try:
+        os.replace(link, destination)
+    except BaseException:
+        link.unlink(missing_ok=True)
+        raise
+    keep = {staging.resolve(), previous}
+    for version in destination.parent.glob(f".{destination.name}.version-*"):
+        if not version.is_symlink() and version.resolve() not in keep:
+            shutil.rmtree(version, ignore_errors=True)
+    return destination
+
+
 def dump_joblib(path: Path, value: object) -> Path:
     path.parent.mkdir(parents=True, exist_ok=True)
     joblib.dump(value, path)
@@ -0,0 +1,187 @@
+"""Memory-mapped on-disk basket store shared by market-basket runs.
+
+Extracting baskets means a sampling JOIN over ``Fact_Order_Details`` on every
+run, even when only mining thresholds change.  The store writes the extracted
+CSR arrays and per-order attributes as ``.npy`` files once per warehouse load,
+keyed by the ETL ``loaded_run_id``, the sampling seed, and the order limit.
+Later runs open them with ``mmap_mode="r"``, so parameter sweeps start mining
+immediately and concurrent processes share the same page cache.
+"""
+
+from __future__ import annotations
+
+import json
+import shutil
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+
+from mining.artifacts import (
+    DEFAULT_RESULTS_DIR,
+    publish_directory,
+    staging_directory,
+    utc_timestamp,
+    write_json,
+)
+
+BASKET_STORE_SCHEMA_VERSION = 1
+DEFAULT_STORE_DIR = DEFAULT_RESULTS_DIR / "basket_store"
+MANIFEST_NAME = "manifest.json"
+_CORE_ARRAYS = ("order_ids", "indptr", "indices")
+# Per-order columns carried alongside each basket, with their array dtypes.
+ORDER_ATTRIBUTES = {
+    "user_id": np.int32,
+    "order_dow": np.int8,
+    "order_hour": np.int8,
+    "days_since_prior_order": np.float32,
+}
+
+
+@dataclass(frozen=True, slots=True)
+class BasketArrays:
+    """Complete baskets in CSR layout: basket ``i`` holds ``indices[indptr[i]:indptr[i + 1]]``.
+
+    ``indices`` are integer product IDs in add-to-cart order and ``order_ids``
+    identifies each basket.  ``attributes`` holds optional per-basket order
+    columns from :data:`ORDER_ATTRIBUTES`, aligned with ``order_ids``.
+    """
+
+    order_ids: np.ndarray
+    indptr: np.ndarray
+    indices: np.ndarray
+    attributes: Mapping[str, np.ndarray] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.order_ids)
+
+    def to_lists(self) -> list[list[str]]:
+        """Return the baskets as lists of string product IDs."""
+        items = self.indices.astype(str).tolist()
+        bounds = self.indptr.tolist()
+        return [items[start:stop] for start, stop in zip(bounds[:-1], bounds[1:], strict=True)]
+
+    def select(self, mask: np.ndarray) -> BasketArrays:
+        """Return the baskets where ``mask`` is true, keeping their order."""
+        lengths = np.diff(self.indptr)
+        if mask.all():
+            return self
+        indptr = np.concatenate(([0], np.cumsum(lengths[mask]))).astype(self.indptr.dtype)
+        return BasketArrays(
+            order_ids=self.order_ids[mask],
+            indptr=indptr,
+            indices=self.indices[np.repeat(mask, lengths)],
+            attributes={name: values[mask] for name, values in self.attributes.items()},
+        )
+
+    def with_min_items(self, min_items: int) -> BasketArrays:
+        """Return only baskets with at least ``min_items`` lines."""
+        if min_items < 1:
+            raise ValueError("min_items must be at least 1")
+        return self.select(np.diff(self.indptr) >= min_items)
+
+
+def loaded_run_id(report_path: Path, engine: Engine | None = None) -> str | None:
+    """Return the run ID of the last successful warehouse load in ``report_path``.
+
+    With ``engine``, the ID is returned only while ``Fact_Orders`` still holds
+    the row count the report recorded.  A load whose report went to another
+    path has replaced the data since, so this report no longer describes it.
+    """
+    try:
+        report = json.loads(report_path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return None
+    run_id = report.get("loaded_run_id") if isinstance(report, dict) else None
+    if not run_id:
+        return None
+    if engine is not None:
+        counts = report.get("table_counts")
+        recorded = counts.get("Fact_Orders") if isinstance(counts, dict) else None
+        try:
+            with engine.connect() as connection:
+                live = connection.execute(text("SELECT COUNT(*) FROM Fact_Orders")).scalar_one()
+        except DBAPIError:
+            return None
+        if recorded is None or int(recorded) != int(live):
+            return None
+    return str(run_id)
+
+
+def store_key(run_id: str, random_state: int, order_limit: int | None) -> str:
+    """Directory name for one extraction; sample and full runs never collide."""
+    if not run_id or not run_id.replace("-", "").isalnum():
+        raise ValueError("run_id must be a non-empty alphanumeric/UUID string")
+    sample = "full" if order_limit is None else f"limit{order_limit}"
+    return f"{run_id}-seed{random_state}-{sample}"
+
+
+def save_baskets(
+    baskets: BasketArrays,
+    directory: Path,
+    *,
+    key_fields: dict[str, Any],
+) -> Path:
+    """Write ``baskets`` as ``.npy`` arrays plus a manifest, then swap ``directory`` to them."""
+    staging = staging_directory(directory)
+    try:
+        arrays = {
+            "order_ids": baskets.order_ids,
+            "indptr": baskets.indptr,
+            "indices": baskets.indices,
+            **{f"attribute_{name}": values for name, values in baskets.attributes.items()},
+        }
+        for name, values in arrays.items():
+            np.save(staging / f"{name}.npy", np.ascontiguousarray(values), allow_pickle=False)
+        write_json(
+            staging / MANIFEST_NAME,
+            {
+                "basket_store_schema_version": BASKET_STORE_SCHEMA_VERSION,
+                "created_at": utc_timestamp(),
+                "baskets": len(baskets),
+                "lines": int(baskets.indptr[-1]),
+                "attributes": sorted(baskets.attributes),
+                **key_fields,
+            },
+        )
+        publish_directory(staging, directory)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return directory
+
+
+def load_baskets(directory: Path, *, mmap: bool = True) -> BasketArrays | None:
+    """Open a stored extraction read-only; ``None`` when absent or incompatible."""
+    try:
+        manifest = json.loads((directory / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return None
+    if manifest.get("basket_store_schema_version") != BASKET_STORE_SCHEMA_VERSION:
+        return None
+    mode = "r" if mmap else None
+    try:
+        core = {
+            name: np.load(directory / f"{name}.npy", mmap_mode=mode, allow_pickle=False)
+            for name in _CORE_ARRAYS
+        }
+        attributes = {
+            name: np.load(
+                directory / f"attribute_{name}.npy", mmap_mode=mode, allow_pickle=False
+            )
+            for name in manifest.get("attributes", [])
+            if name in ORDER_ATTRIBUTES
+        }
+    except (OSError, ValueError):
+        return None
+    if len(core["indptr"]) != len(core["order_ids"]) + 1 or core["indptr"][-1] != len(
+        core["indices"]
+    ):
+        return None
+    return BasketArrays(**core, attributes=attributes)
+
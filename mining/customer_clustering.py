@@ -3,22 +3,38 @@
 from __future__ import annotations
 
 import argparse
+import os
 from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
+from time import perf_counter
 
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import seaborn as sns
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from sklearn.decomposition import PCA
 from sklearn.metrics import davies_bouldin_score, silhouette_score
 from sklearn.preprocessing import StandardScaler
-from sqlalchemy import text
+from sqlalchemy import inspect, text
 from sqlalchemy.engine import Engine
+from threadpoolctl import threadpool_limits
 
 from etl.config import Settings, get_engine, get_settings
-from mining.artifacts import dump_joblib, ensure_results_dir, utc_timestamp, write_json
+from etl.eval_orders import EXCLUDE_EVAL_ORDERS, held_out_order_ids
+from etl.streaming import read_frame
+from mining.artifacts import (
+    dump_joblib,
+    ensure_results_dir,
+    file_digest,
+    utc_timestamp,
+    write_json,
+)
+from mining.basket_store import loaded_run_id
+from mining.registry import DEFAULT_REGISTRY_DIR, ArtifactRegistry
 
 FEATURE_COLUMNS = (
     "total_orders",
@@ -27,6 +43,14 @@ FEATURE_COLUMNS = (
     "avg_days_between_orders",
 )
 DEFAULT_SILHOUETTE_SAMPLE_SIZE = 10_000
+CLUSTER_TABLES = ("Mining_User_Cluster", "Mining_Cluster_Popularity")
+DEFAULT_POPULARITY_DEPTH = 200
+# ``full`` fits every K on every user; ``minibatch`` and ``subsample`` sweep
+# cheaply and refine only the selected K on the full data.
+SWEEP_STRATEGIES = ("full", "minibatch", "subsample")
+DEFAULT_SWEEP_SAMPLE_SIZE = 20_000
+MINIBATCH_SIZE = 4_096
+_LABEL_BATCH_SIZE = 5_000
 
 sns.set_style("whitegrid")
 
@@ -40,14 +64,21 @@ def extract_features(
     *,
     min_orders: int = 3,
     settings: Settings | None = None,
+    exclude_train: bool = False,
 ) -> pd.DataFrame:
-    """Extract user features directly from Dim_User and Fact_Orders."""
+    """Extract user features directly from Dim_User and Fact_Orders.
+
+    With ``exclude_train`` the held-out train orders in ``Mining_Eval_Orders``
+    are left out, so the features describe only the users' prior orders.
+    """
     if min_orders < 2:
         raise ValueError("min_orders must be at least 2")
     resolved = settings or get_settings()
     warehouse_engine = engine or get_engine(resolved)
+    if exclude_train:
+        _require_held_out_orders(warehouse_engine)
     query = text(
-        """
+        f"""
         SELECT
             users.user_id,
             COUNT(*) AS total_orders,
@@ -56,18 +87,30 @@ def extract_features(
             AVG(orders.days_since_prior_order) AS avg_days_between_orders
         FROM Dim_User users
         JOIN Fact_Orders orders ON users.user_id = orders.user_id
-        WHERE orders.total_items > 0
+        WHERE orders.total_items > 0{f" AND {EXCLUDE_EVAL_ORDERS}" if exclude_train else ""}
         GROUP BY users.user_id
         HAVING COUNT(*) >= :min_orders
         ORDER BY users.user_id
         """
     )
-    with warehouse_engine.connect() as connection:
-        features = pd.read_sql(query, connection, params={"min_orders": min_orders})
+    features = read_frame(
+        warehouse_engine,
+        query,
+        chunk_size=resolved.chunk_size,
+        params={"min_orders": min_orders},
+    )
     _feature_matrix(features)
     return features
 
 
+def _require_held_out_orders(engine: Engine) -> None:
+    if held_out_order_ids(engine) is None:
+        raise ClusteringDataError(
+            "--exclude-train needs the held-out orders in Mining_Eval_Orders; "
+            "run `make schema`, then reload with instacart-etl"
+        )
+
+
 def _feature_matrix(frame: pd.DataFrame) -> pd.DataFrame:
     missing = [column for column in ("user_id", *FEATURE_COLUMNS) if column not in frame]
     if missing:
@@ -127,49 +170,166 @@ def _bounded_silhouette(
     return float(silhouette_score(values[indices], labels[indices]))
 
 
-def find_optimal_k(
+@dataclass(frozen=True, slots=True)
+class KCandidate:
+    """One swept K with its fitted model and how long fitting and scoring took."""
+
+    k: int
+    inertia: float
+    silhouette: float
+    seconds: float
+    model: KMeans | MiniBatchKMeans
+
+
+@dataclass(frozen=True, slots=True)
+class KSweep:
+    """Every candidate K of one sweep and the K with the best bounded silhouette."""
+
+    candidates: tuple[KCandidate, ...]
+    optimal_k: int
+    strategy: str
+    workers: int
+    wall_seconds: float
+
+    def candidate(self, k: int) -> KCandidate | None:
+        return next((candidate for candidate in self.candidates if candidate.k == k), None)
+
+
+def _fit_candidate(
+    k: int,
+    X_scaled: np.ndarray,
+    *,
+    random_state: int,
+    silhouette_sample_size: int,
+    strategy: str,
+    sample_size: int,
+    threads: int | None,
+) -> KCandidate:
+    started = perf_counter()
+    with threadpool_limits(limits=threads):
+        if strategy == "minibatch":
+            model = MiniBatchKMeans(
+                n_clusters=k,
+                random_state=random_state,
+                batch_size=MINIBATCH_SIZE,
+                n_init=3,
+            ).fit(X_scaled)
+        else:
+            rows = X_scaled
+            if strategy == "subsample" and sample_size < len(X_scaled):
+                rng = np.random.default_rng(random_state)
+                rows = X_scaled[np.sort(rng.choice(len(X_scaled), sample_size, replace=False))]
+            model = KMeans(n_clusters=k, random_state=random_state, n_init=10, max_iter=300)
+            model.fit(rows)
+        # Sampled and mini-batch models are scored on every user, like a full fit.
+        if strategy == "full":
+            labels, inertia = model.labels_, float(model.inertia_)
+        else:
+            labels, inertia = model.predict(X_scaled), -float(model.score(X_scaled))
+        silhouette = _bounded_silhouette(
+            X_scaled,
+            labels,
+            sample_size=silhouette_sample_size,
+            random_state=random_state,
+        )
+    return KCandidate(k, inertia, silhouette, perf_counter() - started, model)
+
+
+def sweep_k(
     X_scaled: np.ndarray,
     max_k: int = 10,
     *,
     random_state: int = 42,
     silhouette_sample_size: int = DEFAULT_SILHOUETTE_SAMPLE_SIZE,
-    output_dir: Path | str | None = None,
-) -> tuple[list[float], list[float], int]:
-    """Select K by a deterministic, bounded silhouette score."""
+    strategy: str = "full",
+    sample_size: int = DEFAULT_SWEEP_SAMPLE_SIZE,
+    workers: int | None = 1,
+) -> KSweep:
+    """Fit every candidate K, in a process pool when ``workers`` exceeds one.
+
+    ``workers=None`` uses every CPU.  Each worker's BLAS/OpenMP threads are
+    capped at its share of the CPUs, so concurrent fits do not oversubscribe
+    the machine.  ``subsample`` fits on ``sample_size`` seeded rows; both it
+    and ``minibatch`` report inertia and silhouette over every row.
+    """
+    if strategy not in SWEEP_STRATEGIES:
+        raise ValueError(f"strategy must be one of: {', '.join(SWEEP_STRATEGIES)}")
+    if sample_size < 2:
+        raise ValueError("sample_size must be at least 2")
     if len(X_scaled) < 3:
         raise ClusteringDataError("At least three rows are required to select K")
     largest_k = min(max_k, len(X_scaled) - 1)
     if largest_k < 2:
         raise ClusteringDataError("No valid K candidates are available")
+    if strategy == "subsample":
+        largest_k = min(largest_k, sample_size - 1)
 
     candidate_k = list(range(2, largest_k + 1))
-    inertias: list[float] = []
-    silhouette_scores: list[float] = []
-    for k in candidate_k:
-        model = KMeans(n_clusters=k, random_state=random_state, n_init=10, max_iter=300)
-        labels = model.fit_predict(X_scaled)
-        inertias.append(float(model.inertia_))
-        silhouette_scores.append(
-            _bounded_silhouette(
-                X_scaled,
-                labels,
-                sample_size=silhouette_sample_size,
-                random_state=random_state,
-            )
-        )
+    cpus = os.cpu_count() or 1
+    pool_size = max(1, min(len(candidate_k), workers or cpus))
+    fit = partial(
+        _fit_candidate,
+        X_scaled=X_scaled,
+        random_state=random_state,
+        silhouette_sample_size=silhouette_sample_size,
+        strategy=strategy,
+        sample_size=sample_size,
+        threads=None if pool_size == 1 else max(1, cpus // pool_size),
+    )
+    started = perf_counter()
+    if pool_size == 1:
+        candidates = tuple(map(fit, candidate_k))
+    else:
+        with ProcessPoolExecutor(max_workers=pool_size) as pool:
+            candidates = tuple(pool.map(fit, candidate_k))
+    best = int(np.argmax([candidate.silhouette for candidate in candidates]))
+    return KSweep(
+        candidates=candidates,
+        optimal_k=candidates[best].k,
+        strategy=strategy,
+        workers=pool_size,
+        wall_seconds=perf_counter() - started,
+    )
+
 
-    optimal_k = candidate_k[int(np.argmax(silhouette_scores))]
+def plot_k_selection(sweep: KSweep, output_dir: Path | str | None = None) -> Path:
+    destination = ensure_results_dir(output_dir) / "cluster_selection.png"
+    candidate_k = [candidate.k for candidate in sweep.candidates]
+    figure, (inertia_axis, silhouette_axis) = plt.subplots(1, 2, figsize=(14, 5))
+    inertia_axis.plot(candidate_k, [candidate.inertia for candidate in sweep.candidates], "o-")
+    inertia_axis.set(title="K-Means inertia", xlabel="K", ylabel="Inertia")
+    silhouette_axis.plot(
+        candidate_k, [candidate.silhouette for candidate in sweep.candidates], "o-"
+    )
+    silhouette_axis.set(title="Bounded silhouette score", xlabel="K", ylabel="Score")
+    figure.tight_layout()
+    figure.savefig(destination, dpi=200, bbox_inches="tight")
+    plt.close(figure)
+    return destination
+
+
+def find_optimal_k(
+    X_scaled: np.ndarray,
+    max_k: int = 10,
+    *,
+    random_state: int = 42,
+    silhouette_sample_size: int = DEFAULT_SILHOUETTE_SAMPLE_SIZE,
+    output_dir: Path | str | None = None,
+) -> tuple[list[float], list[float], int]:
+    """Select K by a deterministic, bounded silhouette score."""
+    sweep = sweep_k(
+        X_scaled,
+        max_k,
+        random_state=random_state,
+        silhouette_sample_size=silhouette_sample_size,
+    )
     if output_dir is not None:
-        destination = ensure_results_dir(output_dir) / "cluster_selection.png"
-        figure, (inertia_axis, silhouette_axis) = plt.subplots(1, 2, figsize=(14, 5))
-        inertia_axis.plot(candidate_k, inertias, "o-")
-        inertia_axis.set(title="K-Means inertia", xlabel="K", ylabel="Inertia")
-        silhouette_axis.plot(candidate_k, silhouette_scores, "o-")
-        silhouette_axis.set(title="Bounded silhouette score", xlabel="K", ylabel="Score")
-        figure.tight_layout()
-        figure.savefig(destination, dpi=200, bbox_inches="tight")
-        plt.close(figure)
-    return inertias, silhouette_scores, optimal_k
+        plot_k_selection(sweep, output_dir)
+    return (
+        [candidate.inertia for candidate in sweep.candidates],
+        [candidate.silhouette for candidate in sweep.candidates],
+        sweep.optimal_k,
+    )
 
 
 def train_kmeans(
@@ -178,21 +338,34 @@ def train_kmeans(
     *,
     random_state: int = 42,
     silhouette_sample_size: int = DEFAULT_SILHOUETTE_SAMPLE_SIZE,
+    candidate: KMeans | MiniBatchKMeans | None = None,
 ) -> tuple[pd.DataFrame, KMeans, StandardScaler, np.ndarray]:
-    """Fit the selected K and return labels plus reusable preprocessing artifacts."""
+    """Fit the selected K and return labels plus reusable preprocessing artifacts.
+
+    ``candidate`` is a sweep model for this K on the same standardized
+    features.  A full-data ``KMeans`` is reused as is; a mini-batch or
+    subsample model seeds a single full-data ``KMeans`` run from its centres.
+    """
     matrix = _feature_matrix(frame)
     if not 2 <= n_clusters < len(matrix):
         raise ValueError("n_clusters must be between 2 and number_of_users - 1")
+    if candidate is not None and candidate.n_clusters != n_clusters:
+        raise ValueError("candidate model must have n_clusters clusters")
     scaler = StandardScaler()
     scaled = scaler.fit_transform(matrix)
-    model = KMeans(
-        n_clusters=n_clusters,
-        random_state=random_state,
-        n_init=10,
-        max_iter=300,
-    )
     clustered = frame.copy()
-    clustered["cluster"] = model.fit_predict(scaled)
+    if isinstance(candidate, KMeans) and len(candidate.labels_) == len(scaled):
+        model = candidate
+    else:
+        model = KMeans(
+            n_clusters=n_clusters,
+            random_state=random_state,
+            init="k-means++" if candidate is None else candidate.cluster_centers_,
+            n_init=10 if candidate is None else 1,
+            max_iter=300,
+        )
+        model.fit(scaled)
+    clustered["cluster"] = model.labels_
     model.training_metrics_ = {
         "silhouette": _bounded_silhouette(
             scaled,
@@ -297,6 +470,114 @@ def save_cluster_labels(
     return path
 
 
+def cluster_tables_present(engine: Engine) -> bool:
+    discovered = {name.casefold() for name in inspect(engine).get_table_names()}
+    return all(table.casefold() in discovered for table in CLUSTER_TABLES)
+
+
+def publish_cluster_popularity(
+    engine: Engine,
+    frame: pd.DataFrame,
+    *,
+    depth: int = DEFAULT_POPULARITY_DEPTH,
+    exclude_train: bool = False,
+) -> pd.DataFrame:
+    """Replace the warehouse cluster labels and rank each cluster's top ``depth`` products.
+
+    Labels and rankings are committed together, so readers never see the
+    labels of one run with the popularity of another.  Products are ranked by
+    distinct cluster orders, then reorder rate, then product ID; the returned
+    frame is the stored ranking with product names.  ``exclude_train`` counts
+    only orders outside ``Mining_Eval_Orders``.
+    """
+    if depth < 1:
+        raise ValueError("depth must be at least 1")
+    if exclude_train:
+        _require_held_out_orders(engine)
+    held_out_filter = f"WHERE {EXCLUDE_EVAL_ORDERS}" if exclude_train else ""
+    missing = {"user_id", "cluster"}.difference(frame.columns)
+    if missing:
+        raise ClusteringDataError(f"Missing label columns: {', '.join(sorted(missing))}")
+    records = [
+        {"user_id": int(user_id), "cluster_id": int(cluster)}
+        for user_id, cluster in zip(frame["user_id"], frame["cluster"], strict=True)
+    ]
+    statement = text(
+        "INSERT INTO Mining_User_Cluster (user_id, cluster_id) VALUES (:user_id, :cluster_id)"
+    )
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM Mining_Cluster_Popularity"))
+        connection.execute(text("DELETE FROM Mining_User_Cluster"))
+        for start in range(0, len(records), _LABEL_BATCH_SIZE):
+            connection.execute(statement, records[start : start + _LABEL_BATCH_SIZE])
+        connection.execute(
+            text(
+                f"""
+                INSERT INTO Mining_Cluster_Popularity
+                    (cluster_id, popularity_rank, product_id, order_count, reorder_rate)
+                SELECT cluster_id, popularity_rank, product_id, order_count, reorder_rate
+                FROM (
+                    SELECT
+                        counts.*,
+                        ROW_NUMBER() OVER (
+                            PARTITION BY cluster_id
+                            ORDER BY order_count DESC, reorder_rate DESC, product_id
+                        ) AS popularity_rank
+                    FROM (
+                        SELECT
+                            labels.cluster_id,
+                            details.product_id,
+                            COUNT(DISTINCT details.order_id) AS order_count,
+                            AVG(details.reordered) AS reorder_rate
+                        FROM Mining_User_Cluster labels
+                        JOIN Fact_Orders orders ON labels.user_id = orders.user_id
+                        JOIN Fact_Order_Details details ON orders.order_id = details.order_id
+                        {held_out_filter}
+                        GROUP BY labels.cluster_id, details.product_id
+                    ) counts
+                ) ranked
+                WHERE popularity_rank <= :depth
+                """
+            ),
+            {"depth": depth},
+        )
+        return pd.read_sql(
+            text(
+                """
+                SELECT
+                    popularity.cluster_id AS cluster,
+                    popularity.popularity_rank,
+                    popularity.product_id,
+                    products.product_name,
+                    popularity.order_count,
+                    popularity.reorder_rate
+                FROM Mining_Cluster_Popularity popularity
+                JOIN Dim_Product products ON popularity.product_id = products.product_id
+                ORDER BY popularity.cluster_id, popularity.popularity_rank
+                """
+            ),
+            connection,
+        )
+
+
+def save_cluster_popularity(
+    popularity: pd.DataFrame,
+    *,
+    output_dir: Path | str | None = None,
+    labels_digest: str | None = None,
+) -> Path:
+    """Write the popularity rankings, stamped with the digest of the labels they rank.
+
+    :func:`~mining.recommendation.load_cluster_popularity` refuses a file whose
+    ``labels_digest`` does not match the labels it is served with.
+    """
+    path = ensure_results_dir(output_dir) / "cluster_popularity.csv"
+    if labels_digest is not None:
+        popularity = popularity.assign(labels_digest=labels_digest)
+    popularity.to_csv(path, index=False)
+    return path
+
+
 def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument("--min-orders", type=int, default=3)
@@ -304,33 +585,105 @@ def build_parser() -> argparse.ArgumentParser:
     parser.add_argument("--clusters", type=int, help="Explicit K override; default uses selected K")
     parser.add_argument("--silhouette-sample-size", type=int, default=10_000)
     parser.add_argument("--seed", type=int, help="Override MINING_RANDOM_STATE")
+    parser.add_argument(
+        "--exclude-train",
+        action="store_true",
+        help="leave out the held-out train orders so instacart-evaluate can score the clusters",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="process-pool size for the K sweep (default: CPU count)",
+    )
+    parser.add_argument(
+        "--sweep-strategy",
+        choices=SWEEP_STRATEGIES,
+        default="full",
+        help=(
+            "minibatch sweeps with MiniBatchKMeans and subsample fits a seeded sample; "
+            "both refine the selected K on every user"
+        ),
+    )
+    parser.add_argument(
+        "--sweep-sample-size",
+        type=int,
+        default=DEFAULT_SWEEP_SAMPLE_SIZE,
+        help="users fitted per K with --sweep-strategy subsample",
+    )
+    parser.add_argument(
+        "--popularity-depth",
+        type=int,
+        default=DEFAULT_POPULARITY_DEPTH,
+        help="products ranked per cluster for cluster recommendations",
+    )
     parser.add_argument("--output-dir", type=Path)
     parser.add_argument("--no-plots", action="store_true")
+    parser.add_argument(
+        "--etl-report",
+        type=Path,
+        help="instacart-etl load report recorded with the run (default: ETL_REPORT_PATH)",
+    )
+    registry = parser.add_mutually_exclusive_group()
+    registry.add_argument(
+        "--registry",
+        type=Path,
+        default=DEFAULT_REGISTRY_DIR,
+        help="content-addressed registry that keeps a copy of every run",
+    )
+    registry.add_argument(
+        "--no-registry", action="store_true", help="do not register this run"
+    )
     return parser
 
 
 def main(argv: Sequence[str] | None = None) -> int:
-    args = build_parser().parse_args(argv)
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.popularity_depth < 1:
+        parser.error("--popularity-depth must be at least 1")
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.sweep_sample_size < 2:
+        parser.error("--sweep-sample-size must be at least 2")
     settings = get_settings()
     random_state = settings.mining_random_state if args.seed is None else args.seed
     output_dir = ensure_results_dir(args.output_dir)
-    features = extract_features(min_orders=args.min_orders, settings=settings)
+    engine = get_engine(settings)
+    features = extract_features(
+        engine, min_orders=args.min_orders, settings=settings, exclude_train=args.exclude_train
+    )
     scaler_for_selection = StandardScaler()
     scaled_for_selection = scaler_for_selection.fit_transform(_feature_matrix(features))
-    inertias, silhouette_scores, optimal_k = find_optimal_k(
+    sweep = sweep_k(
         scaled_for_selection,
         max_k=args.max_k,
         random_state=random_state,
         silhouette_sample_size=args.silhouette_sample_size,
-        output_dir=None if args.no_plots else output_dir,
+        strategy=args.sweep_strategy,
+        sample_size=args.sweep_sample_size,
+        workers=args.workers,
     )
-    selected_k = args.clusters if args.clusters is not None else optimal_k
+    print(
+        f"Swept K={sweep.candidates[0].k}..{sweep.candidates[-1].k} ({sweep.strategy}) "
+        f"with {sweep.workers} worker(s) in {sweep.wall_seconds:.1f}s"
+    )
+    if not args.no_plots:
+        plot_k_selection(sweep, output_dir)
+    selected_k = args.clusters if args.clusters is not None else sweep.optimal_k
+    candidate = sweep.candidate(selected_k)
+    final_started = perf_counter()
     clustered, model, scaler, scaled = train_kmeans(
         features,
         n_clusters=selected_k,
         random_state=random_state,
         silhouette_sample_size=args.silhouette_sample_size,
+        candidate=None if candidate is None else candidate.model,
     )
+    final_seconds = perf_counter() - final_started
+    if candidate is None:
+        final_fit = "full"
+    else:
+        final_fit = "reused_candidate" if candidate.model is model else "refined_candidate"
     pca_metrics = (
         {}
         if args.no_plots
@@ -345,36 +698,97 @@ def main(argv: Sequence[str] | None = None) -> int:
     labels_path = save_cluster_labels(clustered, output_dir=output_dir)
     model_path = dump_joblib(output_dir / "kmeans_model.joblib", model)
     scaler_path = dump_joblib(output_dir / "standard_scaler.joblib", scaler)
+    labels_digest = file_digest(labels_path)
+    popularity_path = None
+    if cluster_tables_present(engine):
+        popularity = publish_cluster_popularity(
+            engine, clustered, depth=args.popularity_depth, exclude_train=args.exclude_train
+        )
+        popularity_path = save_cluster_popularity(
+            popularity, output_dir=output_dir, labels_digest=labels_digest
+        )
+    else:
+        # A popularity file from an earlier run ranks the old clusters.
+        (output_dir / "cluster_popularity.csv").unlink(missing_ok=True)
+        print(
+            "Mining cluster tables are missing; run `make schema` to precompute "
+            "cluster popularity. Cluster recommendations will query the warehouse live."
+        )
 
-    candidate_k = list(range(2, 2 + len(inertias)))
     metadata = {
         "artifact_schema_version": 1,
         "created_at": utc_timestamp(),
         "feature_columns": list(FEATURE_COLUMNS),
         "min_orders": args.min_orders,
+        "excludes_train_orders": args.exclude_train,
         "n_users": len(clustered),
         "random_state": random_state,
         "silhouette_sample_size": min(args.silhouette_sample_size, len(clustered)),
         "selected_k": selected_k,
         "selected_k_source": "cli_override" if args.clusters is not None else "silhouette",
         "selection": [
-            {"k": k, "inertia": inertia, "silhouette": score}
-            for k, inertia, score in zip(candidate_k, inertias, silhouette_scores, strict=True)
+            {
+                "k": candidate.k,
+                "inertia": candidate.inertia,
+                "silhouette": candidate.silhouette,
+                "seconds": candidate.seconds,
+            }
+            for candidate in sweep.candidates
         ],
+        "sweep": {
+            "strategy": sweep.strategy,
+            "sample_size": (
+                min(args.sweep_sample_size, len(clustered))
+                if sweep.strategy == "subsample"
+                else None
+            ),
+            "workers": sweep.workers,
+            "wall_seconds": sweep.wall_seconds,
+            "final_fit": final_fit,
+            "final_fit_seconds": final_seconds,
+        },
         "training_metrics": model.training_metrics_,
         "pca_metrics": pca_metrics,
         "cluster_profiles": profiles.to_dict(orient="records"),
+        "popularity_depth": None if popularity_path is None else args.popularity_depth,
+        "labels_digest": labels_digest,
         "artifacts": {
             "model": model_path.name,
             "scaler": scaler_path.name,
             "labels": labels_path.name,
+            "popularity": None if popularity_path is None else popularity_path.name,
         },
     }
-    write_json(output_dir / "clustering_metadata.json", metadata)
+    metadata_path = write_json(output_dir / "clustering_metadata.json", metadata)
     print(
         f"Clustered {len(clustered):,} users with K={selected_k}; "
         f"silhouette={model.training_metrics_['silhouette']:.3f}. Artifacts: {output_dir}"
     )
+    if not args.no_registry:
+        registered = ArtifactRegistry(args.registry).register(
+            "clusters",
+            {
+                "labels": labels_path,
+                "popularity": popularity_path,
+                "model": model_path,
+                "scaler": scaler_path,
+                "metadata": metadata_path,
+            },
+            parameters={
+                name: metadata[name]
+                for name in (
+                    "min_orders",
+                    "excludes_train_orders",
+                    "random_state",
+                    "selected_k",
+                    "selected_k_source",
+                    "silhouette_sample_size",
+                    "popularity_depth",
+                )
+            },
+            etl_run_id=loaded_run_id(args.etl_report or settings.etl_report_path, engine),
+        )
+        print(f"Registered clusters run {registered.digest[:12]} in {args.registry}")
     return 0
 
 
@@ -0,0 +1,477 @@
+"""Offline ranking evaluation of hybrid recommendations on held-out train orders.
+
+Instacart's ``train`` eval set holds each evaluated user's final order.  The
+train order is replayed as a shopping session: its first ``cart_fraction`` of
+items, in add-to-cart order, form the cart, and the remaining items are the
+products the recommender should surface.  Every request is scored with
+hit-rate@k, MAP@k and catalogue coverage, and its latency is recorded.  Users
+are sharded across a process pool whose workers load the artifacts once each.
+
+The warehouse loads train orders alongside prior ones, so rules and clusters
+mined from it have seen the held-out items.  Only artifacts mined with
+``--exclude-train``, which leaves out the orders in ``Mining_Eval_Orders``,
+describe prior history alone; :func:`evaluate_offline` refuses any other
+artifacts unless ``allow_train_leakage`` is set, and the report lists them.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from time import perf_counter
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.engine import Engine
+
+from etl.config import Settings, get_engine, get_settings
+from etl.quality import require_source_files
+from mining.artifacts import (
+    DEFAULT_RESULTS_DIR,
+    ensure_results_dir,
+    file_digest,
+    utc_timestamp,
+    write_json,
+)
+from mining.recommendation import (
+    ClusterIndex,
+    RuleIndex,
+    hybrid_recommend,
+    load_cluster_index,
+    load_cluster_popularity,
+    load_rule_index,
+)
+from mining.rule_store import default_rules_path
+
+DEFAULT_KS = (5, 10, 20)
+DEFAULT_CART_FRACTION = 0.5
+SHARDS_PER_WORKER = 4
+LATENCY_PERCENTILES = (50, 90, 95, 99)
+
+
+class TrainLeakageError(ValueError):
+    """Raised when evaluated artifacts may have been mined from the held-out train orders."""
+
+
+@dataclass(frozen=True, slots=True)
+class EvaluationCase:
+    """One replayed train order: the cart shown to the recommender and the held-out items."""
+
+    user_id: int
+    order_id: int
+    cart: tuple[str, ...]
+    targets: frozenset[str]
+
+
+@dataclass(frozen=True, slots=True)
+class ShardResult:
+    """Per-request scores of one shard; ``hits``/``average_precision`` have one column per k."""
+
+    hits: np.ndarray
+    average_precision: np.ndarray
+    latency_ms: np.ndarray
+    recommended: list[set[str]]
+
+
+def split_train_orders(
+    orders: pd.DataFrame,
+    details: pd.DataFrame,
+    *,
+    cart_fraction: float = DEFAULT_CART_FRACTION,
+) -> list[EvaluationCase]:
+    """Split every ``train`` order into a cart prefix and held-out targets.
+
+    The cart holds ``floor(size * cart_fraction)`` items, at least one; orders
+    without at least one held-out item are skipped.
+    """
+    if not 0 < cart_fraction < 1:
+        raise ValueError("cart_fraction must be in (0, 1)")
+    train = orders.loc[orders["eval_set"].eq("train"), ["order_id", "user_id"]]
+    lines = details.loc[:, ["order_id", "product_id", "add_to_cart_order"]].merge(
+        train, on="order_id"
+    )
+    lines = lines.sort_values(["order_id", "add_to_cart_order"], kind="stable")
+    size = lines.groupby("order_id")["product_id"].transform("size")
+    position = lines.groupby("order_id").cumcount()
+    cart_size = np.maximum(np.floor(size * cart_fraction), 1)
+    lines = lines.assign(product_id=lines["product_id"].astype(str), in_cart=position < cart_size)
+    lines = lines.loc[size > 1]
+    carts = lines.loc[lines["in_cart"]].groupby("order_id")["product_id"].agg(tuple)
+    targets = lines.loc[~lines["in_cart"]].groupby("order_id")["product_id"].agg(frozenset)
+    users = lines.drop_duplicates("order_id").set_index("order_id")["user_id"]
+    return [
+        EvaluationCase(int(user_id), int(order_id), cart, held_out)
+        for order_id, user_id, cart, held_out in zip(
+            targets.index,
+            users.reindex(targets.index),
+            carts.reindex(targets.index),
+            targets,
+            strict=True,
+        )
+    ]
+
+
+def load_train_cases(
+    settings: Settings | None = None,
+    *,
+    cart_fraction: float = DEFAULT_CART_FRACTION,
+    sample_users: int | None = None,
+    random_state: int | None = None,
+) -> list[EvaluationCase]:
+    """Replay cases for the ``train`` orders in the source CSV files."""
+    resolved = settings or get_settings()
+    require_source_files(resolved.csv_files, ["orders", "order_products_train"])
+    orders = pd.read_csv(
+        resolved.csv_files["orders"], usecols=["order_id", "user_id", "eval_set"]
+    )
+    details = pd.read_csv(
+        resolved.csv_files["order_products_train"],
+        usecols=["order_id", "product_id", "add_to_cart_order"],
+    )
+    cases = split_train_orders(orders, details, cart_fraction=cart_fraction)
+    if sample_users is not None and sample_users < len(cases):
+        seed = resolved.mining_random_state if random_state is None else random_state
+        chosen = np.random.default_rng(seed).choice(len(cases), size=sample_users, replace=False)
+        cases = [cases[position] for position in np.sort(chosen)]
+    return cases
+
+
+def score_ranking(
+    recommended: Sequence[str], targets: frozenset[str], ks: Sequence[int]
+) -> tuple[np.ndarray, np.ndarray]:
+    """Hit indicator and average precision of one ranking at every k."""
+    relevant = np.fromiter((product in targets for product in recommended), dtype=bool)
+    precision = np.cumsum(relevant) / np.arange(1, len(relevant) + 1)
+    hits = np.zeros(len(ks))
+    average_precision = np.zeros(len(ks))
+    for column, k in enumerate(ks):
+        top = relevant[:k]
+        hits[column] = float(top.any())
+        if targets:
+            average_precision[column] = precision[:k][top].sum() / min(len(targets), k)
+    return hits, average_precision
+
+
+@dataclass(frozen=True, slots=True)
+class _WorkerArtifacts:
+    rules: RuleIndex
+    clusters: ClusterIndex
+    popularity: pd.DataFrame | None
+    engine: Engine | None
+
+
+_WORKER: list[_WorkerArtifacts] = []
+
+
+def _init_worker(
+    rules_path: Path,
+    clusters_path: Path,
+    popularity_path: Path | None,
+    settings: Settings | None,
+) -> None:
+    _WORKER[:] = [
+        _WorkerArtifacts(
+            rules=load_rule_index(rules_path),
+            clusters=load_cluster_index(clusters_path),
+            popularity=(
+                None
+                if popularity_path is None
+                else load_cluster_popularity(popularity_path, labels_path=clusters_path)
+            ),
+            # Each worker owns its connection pool; only the live cluster
+            # query needs one.
+            engine=get_engine(settings or get_settings()) if popularity_path is None else None,
+        )
+    ]
+
+
+def _evaluate_shard(
+    cases: Sequence[EvaluationCase], ks: tuple[int, ...], options: dict[str, object]
+) -> ShardResult:
+    artifacts = _WORKER[0]
+    hits = np.zeros((len(cases), len(ks)))
+    average_precision = np.zeros((len(cases), len(ks)))
+    latency_ms = np.zeros(len(cases))
+    recommended: list[set[str]] = [set() for _ in ks]
+    for row, case in enumerate(cases):
+        started = perf_counter()
+        ranked = hybrid_recommend(
+            case.user_id,
+            case.cart,
+            artifacts.rules,
+            artifacts.clusters,
+            max(ks),
+            engine=artifacts.engine,
+            popularity=artifacts.popularity,
+            **options,
+        )
+        latency_ms[row] = (perf_counter() - started) * 1000
+        products = [product for product, _ in ranked]
+        hits[row], average_precision[row] = score_ranking(products, case.targets, ks)
+        for column, k in enumerate(ks):
+            recommended[column].update(products[:k])
+    return ShardResult(hits, average_precision, latency_ms, recommended)
+
+
+def _metadata(path: Path) -> dict[str, Any]:
+    try:
+        payload = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return payload if isinstance(payload, dict) else {}
+
+
+def train_order_sources(
+    rules_path: Path | str,
+    clusters_path: Path | str,
+    popularity_path: Path | str | None,
+) -> list[str]:
+    """Artifacts that may include the held-out train orders; empty when all exclude them.
+
+    Rules and clusters count as prior-only when the metadata written next to
+    them records ``excludes_train_orders`` and still describes the same files.
+    Live cluster popularity always ranks every warehouse order.
+    """
+    rules_path, clusters_path = Path(rules_path), Path(clusters_path)
+    rules_metadata = _metadata(rules_path.parent / "market_basket_metadata.json")
+    clusters_metadata = _metadata(clusters_path.parent / "clustering_metadata.json")
+    sources = []
+    if not (
+        rules_metadata.get("excludes_train_orders") is True
+        and rules_path.name in rules_metadata.get("artifacts", {}).values()
+    ):
+        sources.append(f"rules {rules_path} were not mined with --exclude-train")
+    labels_digest = clusters_metadata.get("labels_digest")
+    labels_current = labels_digest is None or (
+        clusters_path.is_file() and file_digest(clusters_path) == labels_digest
+    )
+    if not (clusters_metadata.get("excludes_train_orders") is True and labels_current):
+        sources.append(f"clusters {clusters_path} were not mined with --exclude-train")
+    if popularity_path is None:
+        sources.append("live cluster popularity ranks every warehouse order")
+    return sources
+
+
+def evaluate_offline(
+    cases: Sequence[EvaluationCase],
+    *,
+    rules_path: Path | str,
+    clusters_path: Path | str,
+    popularity_path: Path | str | None = None,
+    ks: Sequence[int] = DEFAULT_KS,
+    catalogue_size: int | None = None,
+    workers: int | None = None,
+    settings: Settings | None = None,
+    rule_weight: float = 0.6,
+    cluster_weight: float = 0.4,
+    rrf_k: int = 60,
+    allow_train_leakage: bool = False,
+) -> dict[str, Any]:
+    """Score every case in a process pool and summarize ranking quality and latency.
+
+    Artifacts listed by :func:`train_order_sources` raise
+    :class:`TrainLeakageError`; with ``allow_train_leakage`` they are scored
+    anyway and named under ``train_order_sources`` in the report.
+
+    Cases are split into ``SHARDS_PER_WORKER`` contiguous shards per worker so
+    a slow shard does not idle the rest of the pool.  ``coverage`` is the share
+    of ``catalogue_size`` products recommended at least once; without a
+    catalogue size it is omitted and only the distinct-product count is kept.
+    """
+    ks = tuple(sorted(set(ks)))
+    if not ks or ks[0] < 1:
+        raise ValueError("ks must be positive")
+    if not cases:
+        raise ValueError("no evaluation cases")
+    leaks = train_order_sources(rules_path, clusters_path, popularity_path)
+    if leaks and not allow_train_leakage:
+        raise TrainLeakageError(
+            "Evaluation targets may be in the artifacts: " + "; ".join(leaks) + ". "
+            "Mine with --exclude-train, or pass --allow-train-leakage to score them anyway."
+        )
+    pool_size = max(1, min(len(cases), workers or os.cpu_count() or 1))
+    bounds = np.linspace(0, len(cases), min(len(cases), pool_size * SHARDS_PER_WORKER) + 1)
+    bounds = bounds.astype(np.int64)
+    shards = [list(cases[start:stop]) for start, stop in zip(bounds[:-1], bounds[1:], strict=True)]
+    options = {
+        "rule_weight": rule_weight,
+        "cluster_weight": cluster_weight,
+        "rrf_k": rrf_k,
+        "item_space": "id",
+    }
+    started = perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=pool_size,
+        initializer=_init_worker,
+        initargs=(
+            Path(rules_path),
+            Path(clusters_path),
+            None if popularity_path is None else Path(popularity_path),
+            settings,
+        ),
+    ) as pool:
+        results = list(
+            pool.map(_evaluate_shard, shards, [ks] * len(shards), [options] * len(shards))
+        )
+    wall_seconds = perf_counter() - started
+
+    hits = np.concatenate([result.hits for result in results])
+    average_precision = np.concatenate([result.average_precision for result in results])
+    latency_ms = np.concatenate([result.latency_ms for result in results])
+    metrics = {}
+    for column, k in enumerate(ks):
+        distinct = len(set().union(*(result.recommended[column] for result in results)))
+        metrics[str(k)] = {
+            "hit_rate": float(hits[:, column].mean()),
+            "map": float(average_precision[:, column].mean()),
+            "distinct_products": distinct,
+            "coverage": None if not catalogue_size else distinct / catalogue_size,
+        }
+    return {
+        "requests": len(cases),
+        "users": len({case.user_id for case in cases}),
+        "workers": pool_size,
+        "shards": len(shards),
+        "wall_seconds": wall_seconds,
+        "requests_per_second": len(cases) / wall_seconds if wall_seconds else None,
+        "catalogue_size": catalogue_size,
+        "train_order_sources": leaks,
+        "metrics": metrics,
+        "latency_ms": {
+            **{
+                f"p{percentile}": float(np.percentile(latency_ms, percentile))
+                for percentile in LATENCY_PERCENTILES
+            },
+            "mean": float(latency_ms.mean()),
+            "max": float(latency_ms.max()),
+        },
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rules", type=Path)
+    parser.add_argument("--clusters", type=Path)
+    parser.add_argument(
+        "--popularity",
+        type=Path,
+        help=(
+            "cluster_popularity.csv from instacart-cluster (default: next to the cluster "
+            "labels when present, otherwise ranked live in the warehouse)"
+        ),
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        help="report directory (default: the directory holding the rules)",
+    )
+    parser.add_argument("--k", type=int, nargs="+", default=list(DEFAULT_KS), dest="ks")
+    parser.add_argument(
+        "--cart-fraction",
+        type=float,
+        default=DEFAULT_CART_FRACTION,
+        help="share of each train order, in add-to-cart order, given as the cart",
+    )
+    parser.add_argument(
+        "--sample-users",
+        type=int,
+        help="evaluate a seeded random sample of train users instead of all of them",
+    )
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--workers", type=int, help="process-pool size (default: CPU count)")
+    parser.add_argument("--rule-weight", type=float, default=0.6)
+    parser.add_argument("--cluster-weight", type=float, default=0.4)
+    parser.add_argument("--rrf-k", type=int, default=60)
+    parser.add_argument(
+        "--allow-train-leakage",
+        action="store_true",
+        help="score artifacts mined without --exclude-train; the report flags them",
+    )
+    return parser
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if any(k < 1 for k in args.ks):
+        parser.error("--k values must be positive")
+    if not 0 < args.cart_fraction < 1:
+        parser.error("--cart-fraction must be in (0, 1)")
+    if args.sample_users is not None and args.sample_users < 1:
+        parser.error("--sample-users must be at least 1")
+    settings = get_settings()
+    rules_path = args.rules or default_rules_path()
+    clusters_path = args.clusters or DEFAULT_RESULTS_DIR / "cluster_labels.csv"
+    popularity_path = args.popularity or clusters_path.parent / "cluster_popularity.csv"
+    if args.popularity is None and not popularity_path.is_file():
+        popularity_path = None
+    leaks = train_order_sources(rules_path, clusters_path, popularity_path)
+    if leaks and not args.allow_train_leakage:
+        print("Refusing to score artifacts that may contain the held-out train orders:")
+        for leak in leaks:
+            print(f"  - {leak}")
+        print("Mine with --exclude-train, or pass --allow-train-leakage to score them anyway.")
+        return 1
+    for leak in leaks:
+        print(f"WARNING: train-order leakage inflates these scores: {leak}")
+    random_state = settings.mining_random_state if args.seed is None else args.seed
+    cases = load_train_cases(
+        settings,
+        cart_fraction=args.cart_fraction,
+        sample_users=args.sample_users,
+        random_state=random_state,
+    )
+    catalogue = pd.read_csv(settings.csv_files["products"], usecols=["product_id"])
+    report = evaluate_offline(
+        cases,
+        rules_path=rules_path,
+        clusters_path=clusters_path,
+        popularity_path=popularity_path,
+        ks=args.ks,
+        catalogue_size=int(catalogue["product_id"].nunique()),
+        workers=args.workers,
+        settings=settings,
+        rule_weight=args.rule_weight,
+        cluster_weight=args.cluster_weight,
+        rrf_k=args.rrf_k,
+        allow_train_leakage=args.allow_train_leakage,
+    )
+    output_dir = ensure_results_dir(args.output_dir or rules_path.parent)
+    report_path = write_json(
+        output_dir / "recommendation_evaluation.json",
+        {
+            "artifact_schema_version": 1,
+            "created_at": utc_timestamp(),
+            "cart_fraction": args.cart_fraction,
+            "sample_users": args.sample_users,
+            "random_state": random_state,
+            "rule_weight": args.rule_weight,
+            "cluster_weight": args.cluster_weight,
+            "rrf_k": args.rrf_k,
+            "artifacts": {
+                "rules": str(rules_path),
+                "clusters": str(clusters_path),
+                "popularity": None if popularity_path is None else str(popularity_path),
+            },
+            **report,
+        },
+    )
+    latency = report["latency_ms"]
+    for k, values in report["metrics"].items():
+        print(f"@{k:>3}: hit-rate={values['hit_rate']:.4f} MAP={values['map']:.4f}")
+    print(
+        f"Evaluated {report['requests']:,} train orders on {report['workers']} workers in "
+        f"{report['wall_seconds']:.1f}s; latency p50={latency['p50']:.2f}ms "
+        f"p95={latency['p95']:.2f}ms. Report: {report_path}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
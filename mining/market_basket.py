@@ -3,28 +3,116 @@
 from __future__ import annotations
 
 import argparse
-from collections import Counter
-from collections.abc import Iterator, Sequence
+import warnings
+from collections.abc import Iterator, Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
 from pathlib import Path
 from time import perf_counter
 
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
-from mlxtend.frequent_patterns import apriori, association_rules, fpgrowth
-from mlxtend.preprocessing import TransactionEncoder
+from mlxtend.frequent_patterns import apriori, fpgrowth
+from scipy import sparse
 from sqlalchemy import text
 from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
 
 from etl.config import Settings, get_engine, get_settings
+from etl.eval_orders import held_out_order_ids
+from etl.mining_sample import SAMPLE_ORDERING
+from etl.streaming import stream_frames
 from mining.artifacts import ensure_results_dir, itemset_to_json, utc_timestamp, write_json
+from mining.basket_store import (
+    DEFAULT_STORE_DIR,
+    ORDER_ATTRIBUTES,
+    BasketArrays,
+    load_baskets,
+    loaded_run_id,
+    save_baskets,
+    store_key,
+)
+from mining.pair_sketch import (
+    DEFAULT_HEAVY_HITTERS,
+    DEFAULT_SKETCH_DEPTH,
+    DEFAULT_SKETCH_MEMORY_MB,
+    count_pairs_streaming,
+)
+from mining.registry import DEFAULT_REGISTRY_DIR, ArtifactRegistry
+from mining.rule_store import RULE_STORE_DIRNAME, save_rule_store
 
 DEFAULT_TOP_PRODUCTS = 2_000
+# Grocery rules are dominated by pairs and triples; longer sets need FP-Growth.
+MAX_COUNTED_ITEMSET_LENGTH = 3
+RULE_METRICS = ("support", "confidence", "lift", "leverage", "conviction")
+COMPACTION_MODES = ("closed", "maximal")
+# Lowest support --target-rules may choose; below it FP-Growth output explodes.
+DEFAULT_SUPPORT_FLOOR = 0.001
+# Metadata fields recorded as the parameters of a registered rules run.
+REGISTRY_PARAMETERS = (
+    "mode",
+    "requested_order_limit",
+    "random_state",
+    "excludes_train_orders",
+    "min_items",
+    "top_products",
+    "algorithm",
+    "min_support",
+    "min_confidence",
+    "min_lift",
+    "top_k_consequents",
+)
 
 
 class BasketDataError(ValueError):
     """Raised when transaction extraction or rule mining has no valid input."""
 
 
+# Sampled orders are ranked in the same order the ETL persists them, so the
+# indexed range read and the sort fallback return identical memberships.
+_PERSISTED_SAMPLE = """
+    SELECT orders.order_id, orders.user_id, orders.time_id, orders.days_since_prior_order
+    FROM Mining_Order_Sample ranked
+    JOIN Fact_Orders orders
+        ON ranked.order_id = orders.order_id
+    WHERE ranked.seed = :seed AND ranked.sample_rank < :order_limit
+"""
+_SORTED_SAMPLE = f"""
+    SELECT order_id, user_id, time_id, days_since_prior_order
+    FROM Fact_Orders
+    ORDER BY {SAMPLE_ORDERING}
+    LIMIT :order_limit
+"""
+
+
+def persisted_sample_size(engine: Engine, random_state: int) -> int | None:
+    """Orders ranked for ``random_state`` by the ETL, or ``None`` when not usable.
+
+    A ranking is usable only while its order count still equals the live
+    ``Fact_Orders`` count; a ranking left over from an earlier load would
+    join stale order IDs against the new facts and return a short sample.
+    """
+    try:
+        with engine.connect() as connection:
+            row = connection.execute(
+                text(
+                    """
+                    SELECT seeds.orders, (SELECT COUNT(*) FROM Fact_Orders) AS live_orders
+                    FROM Mining_Sample_Seeds seeds
+                    WHERE seeds.seed = :seed
+                    """
+                ),
+                {"seed": random_state},
+            ).one_or_none()
+    except DBAPIError:
+        # Warehouses created before the sample tables existed keep the sort path.
+        return None
+    if row is None or int(row.orders) != int(row.live_orders):
+        return None
+    return int(row.orders)
+
+
 def _transaction_chunks(
     engine: Engine,
     *,
@@ -33,19 +121,21 @@ def _transaction_chunks(
     chunk_size: int,
 ) -> Iterator[pd.DataFrame]:
     if limit is not None:
+        persisted = persisted_sample_size(engine, random_state) is not None
         query = text(
-            """
+            f"""
             SELECT
                 details.order_id,
-                details.product_id
-            FROM (
-                SELECT order_id
-                FROM Fact_Orders
-                ORDER BY CRC32(CONCAT(CAST(order_id AS CHAR), ':', :seed)), order_id
-                LIMIT :order_limit
-            ) sampled_orders
+                details.product_id,
+                sampled_orders.user_id,
+                order_time.order_dow,
+                order_time.order_hour,
+                sampled_orders.days_since_prior_order
+            FROM ({_PERSISTED_SAMPLE if persisted else _SORTED_SAMPLE}) sampled_orders
             JOIN Fact_Order_Details details
                 ON sampled_orders.order_id = details.order_id
+            JOIN Dim_Time order_time
+                ON sampled_orders.time_id = order_time.time_id
             ORDER BY details.order_id, details.add_to_cart_order
             """
         )
@@ -53,23 +143,27 @@ def _transaction_chunks(
     else:
         query = text(
             """
-            SELECT order_id, product_id
-            FROM Fact_Order_Details
-            ORDER BY order_id, add_to_cart_order
+            SELECT
+                details.order_id,
+                details.product_id,
+                orders.user_id,
+                order_time.order_dow,
+                order_time.order_hour,
+                orders.days_since_prior_order
+            FROM Fact_Order_Details details
+            JOIN Fact_Orders orders
+                ON details.order_id = orders.order_id
+            JOIN Dim_Time order_time
+                ON orders.time_id = order_time.time_id
+            ORDER BY details.order_id, details.add_to_cart_order
             """
         )
         parameters = None
 
-    with engine.connect() as connection:
-        yield from pd.read_sql(
-            query,
-            connection,
-            params=parameters,
-            chunksize=chunk_size,
-        )
+    yield from stream_frames(engine, query, chunk_size=chunk_size, params=parameters)
 
 
-def extract_transactions(
+def extract_basket_arrays(
     limit: int | None = None,
     min_items: int = 2,
     *,
@@ -77,8 +171,13 @@ def extract_transactions(
     random_state: int | None = None,
     chunk_size: int | None = None,
     settings: Settings | None = None,
-) -> list[list[str]]:
-    """Extract complete ordered baskets; a non-NULL limit is a deterministic sample."""
+) -> BasketArrays:
+    """Extract complete ordered baskets as CSR arrays; a non-NULL limit is a deterministic sample.
+
+    Basket boundaries are run-length changes of ``order_id`` within each chunk.
+    The last run of a chunk may continue in the next one, so it is carried over
+    and only emitted once a later row, or the end of the stream, closes it.
+    """
     if limit is not None and limit <= 0:
         raise ValueError("limit must be positive or None for explicit full mode")
     if min_items < 1:
@@ -90,10 +189,21 @@ def extract_transactions(
         raise ValueError("chunk_size must be positive")
     warehouse_engine = engine or get_engine(resolved)
 
-    transactions: list[list[str]] = []
-    current_order_id: int | None = None
-    current_basket: list[str] = []
+    length_parts: list[np.ndarray] = []
+    product_parts: list[np.ndarray] = []
+    basket_parts: dict[str, list[np.ndarray]] = {}
+    carry: dict[str, np.ndarray] = {}
     extracted_rows = 0
+
+    def emit(columns: Mapping[str, np.ndarray], starts: np.ndarray) -> None:
+        lengths = np.diff(np.append(starts, len(columns["order_id"])))
+        keep = lengths >= min_items
+        length_parts.append(lengths[keep])
+        product_parts.append(columns["product_id"][np.repeat(keep, lengths)])
+        for name, values in columns.items():
+            if name != "product_id":
+                basket_parts.setdefault(name, []).append(values[starts[keep]])
+
     for chunk in _transaction_chunks(
         warehouse_engine,
         limit=limit,
@@ -106,27 +216,62 @@ def extract_transactions(
             raise BasketDataError(f"Transaction query missing columns: {', '.join(missing)}")
         if chunk.loc[:, ["order_id", "product_id"]].isna().any().any():
             raise BasketDataError("Transaction query returned NULL order_id or product_id")
+        if chunk.empty:
+            continue
+
+        extracted_rows += len(chunk)
+        dtypes = {"order_id": np.int64, "product_id": np.int32} | {
+            name: dtype for name, dtype in ORDER_ATTRIBUTES.items() if name in chunk.columns
+        }
+        columns = {name: chunk[name].to_numpy(dtype=dtype) for name, dtype in dtypes.items()}
+        if carry:
+            columns = {name: np.concatenate((carry[name], columns[name])) for name in columns}
+        orders = columns["order_id"]
+        starts = np.flatnonzero(orders[1:] != orders[:-1]) + 1
+        last_start = int(starts[-1]) if len(starts) else 0
+        if last_start:
+            emit(
+                {name: values[:last_start] for name, values in columns.items()},
+                np.insert(starts[:-1], 0, 0),
+            )
+        carry = {name: values[last_start:] for name, values in columns.items()}
 
-        for row in chunk.itertuples(index=False):
-            order_id = int(row.order_id)
-            product_id = str(int(row.product_id))
-            extracted_rows += 1
-            if current_order_id is None:
-                current_order_id = order_id
-            if order_id != current_order_id:
-                if len(current_basket) >= min_items:
-                    transactions.append(current_basket)
-                current_order_id = order_id
-                current_basket = []
-            current_basket.append(product_id)
-
-    if current_order_id is not None and len(current_basket) >= min_items:
-        transactions.append(current_basket)
+    if carry:
+        emit(carry, np.zeros(1, dtype=np.int64))
     if extracted_rows == 0:
         raise BasketDataError("No order details were extracted")
-    if not transactions:
+    lengths = np.concatenate(length_parts)
+    if not len(lengths):
         raise BasketDataError(f"No baskets satisfy min_items={min_items}")
-    return transactions
+    indptr = np.concatenate(([0], np.cumsum(lengths)))
+    index_dtype = np.int32 if indptr[-1] <= np.iinfo(np.int32).max else np.int64
+    per_basket = {name: np.concatenate(parts) for name, parts in basket_parts.items()}
+    return BasketArrays(
+        order_ids=per_basket.pop("order_id"),
+        indptr=indptr.astype(index_dtype),
+        indices=np.concatenate(product_parts),
+        attributes=per_basket,
+    )
+
+
+def extract_transactions(
+    limit: int | None = None,
+    min_items: int = 2,
+    *,
+    engine: Engine | None = None,
+    random_state: int | None = None,
+    chunk_size: int | None = None,
+    settings: Settings | None = None,
+) -> list[list[str]]:
+    """Extract complete ordered baskets; a non-NULL limit is a deterministic sample."""
+    return extract_basket_arrays(
+        limit,
+        min_items,
+        engine=engine,
+        random_state=random_state,
+        chunk_size=chunk_size,
+        settings=settings,
+    ).to_lists()
 
 
 def load_product_catalog(engine: Engine) -> dict[str, str]:
@@ -143,6 +288,51 @@ def load_product_catalog(engine: Engine) -> dict[str, str]:
     }
 
 
+def encode_baskets(
+    indptr: np.ndarray,
+    codes: np.ndarray,
+    n_items: int,
+    top_n_products: int = DEFAULT_TOP_PRODUCTS,
+) -> tuple[sparse.csr_matrix, np.ndarray]:
+    """Encode CSR-style baskets of integer item codes as a boolean basket matrix.
+
+    ``codes`` holds item codes in ``[0, n_items)`` for every basket line and
+    ``indptr`` the basket boundaries, as in :class:`scipy.sparse.csr_matrix`.
+    Code order is the frequency tie-break and the column order.  Returns the
+    matrix restricted to the ``top_n_products`` most frequent items and the
+    codes of its columns.  Every basket keeps its row, including baskets left
+    without a selected item, so supports use the full transaction denominator.
+    """
+    if top_n_products <= 0:
+        raise ValueError("top_n_products must be positive")
+    indptr = np.asarray(indptr, dtype=np.int64)
+    codes = np.asarray(codes, dtype=np.int32)
+    n_baskets = len(indptr) - 1
+    if n_baskets < 1:
+        raise BasketDataError("At least one transaction is required")
+    if indptr[0] != 0 or indptr[-1] != len(codes) or np.any(np.diff(indptr) < 0):
+        raise BasketDataError("Basket offsets do not describe the item codes")
+    if len(codes) and (codes.min() < 0 or codes.max() >= n_items):
+        raise BasketDataError("Basket item codes are outside the item dictionary")
+
+    # CSR construction sums duplicate (basket, item) lines, so each stored entry
+    # is one distinct item per basket and column counts are basket frequencies.
+    matrix = sparse.csr_matrix(
+        (np.ones(len(codes), dtype=np.int32), codes, indptr),
+        shape=(n_baskets, n_items),
+    )
+    matrix.sum_duplicates()
+    frequencies = np.bincount(matrix.indices, minlength=n_items)
+    ranked = np.lexsort((np.arange(n_items), -frequencies))
+    selected = np.sort(ranked[frequencies[ranked] > 0][:top_n_products])
+    if not len(selected):
+        raise BasketDataError("No products are available for basket encoding")
+    encoded = matrix[:, selected].astype(bool)
+    if encoded.shape[0] != n_baskets:
+        raise BasketDataError("Basket encoding changed the transaction denominator")
+    return encoded, selected
+
+
 def create_basket_matrix(
     transactions: list[list[str]],
     top_n_products: int = DEFAULT_TOP_PRODUCTS,
@@ -153,29 +343,34 @@ def create_basket_matrix(
     if top_n_products <= 0:
         raise ValueError("top_n_products must be positive")
 
-    frequencies = Counter(item for basket in transactions for item in set(basket))
-    selected = [
-        item
-        for item, _ in sorted(frequencies.items(), key=lambda pair: (-pair[1], pair[0]))[
-            :top_n_products
-        ]
-    ]
-    if not selected:
-        raise BasketDataError("No products are available for basket encoding")
-    selected_set = set(selected)
-    filtered = [[item for item in basket if item in selected_set] for basket in transactions]
+    lengths = np.fromiter(map(len, transactions), dtype=np.int64, count=len(transactions))
+    indptr = np.concatenate(([0], np.cumsum(lengths)))
+    items = [str(item) for basket in transactions for item in basket]
+    # Sorted string labels reproduce the previous tie-break and column order.
+    codes, labels = pd.factorize(pd.Series(items, dtype=object), sort=True)
+    encoded, selected = encode_baskets(indptr, codes, len(labels), top_n_products)
+    return basket_frame(encoded, labels[selected])
 
-    encoder = TransactionEncoder()
-    encoded = encoder.fit(filtered).transform(filtered, sparse=True).tocsc()
-    matrix = pd.DataFrame(
-        {
-            product: pd.arrays.SparseArray.from_spmatrix(encoded.getcol(index))
-            for index, product in enumerate(encoder.columns_)
-        }
-    )
-    if len(matrix) != len(transactions):
-        raise BasketDataError("Basket encoding changed the transaction denominator")
-    return matrix
+
+def basket_frame(matrix: sparse.spmatrix, columns: Sequence[object]) -> pd.DataFrame:
+    """Wrap a boolean basket matrix as the sparse frame mlxtend miners accept.
+
+    The frame is built in one call from the CSC matrix; a dense or per-cell
+    intermediate would cost more than mining a bounded sample.
+    """
+    csc = sparse.csc_matrix(matrix, dtype=bool)
+    csc.sum_duplicates()
+    if csc.shape[1] != len(columns):
+        raise BasketDataError("Basket matrix columns do not match their labels")
+    with warnings.catch_warnings():
+        # pandas 2.x gives boolean sparse columns the fill value 0 rather than
+        # False; the two compare equal and mlxtend treats the columns as bool.
+        warnings.filterwarnings(
+            "ignore", "Allowing arbitrary scalar fill_value", category=FutureWarning
+        )
+        return pd.DataFrame.sparse.from_spmatrix(
+            csc, index=pd.RangeIndex(csc.shape[0]), columns=[str(label) for label in columns]
+        )
 
 
 def run_fpgrowth(df_basket: pd.DataFrame, min_support: float = 0.01) -> pd.DataFrame:
@@ -212,27 +407,552 @@ def run_apriori(df_basket: pd.DataFrame, min_support: float = 0.01) -> pd.DataFr
     return itemsets.sort_values(["support", "length"], ascending=[False, True])
 
 
+def run_counts(
+    df_basket: pd.DataFrame,
+    min_support: float = 0.01,
+    *,
+    max_len: int = MAX_COUNTED_ITEMSET_LENGTH,
+) -> pd.DataFrame:
+    """Count frequent itemsets of up to three items with sparse matrix products.
+
+    Pair supports come from ``X.T @ X`` over the frequent-item columns.  Triples
+    are counted only for extensions of a frequent pair whose other two pairs are
+    also frequent, using one product of the pair-indicator matrix with ``X``.
+    The frame matches :func:`run_fpgrowth` restricted to ``max_len`` items.
+    """
+    if not 0 < min_support <= 1:
+        raise ValueError("min_support must be in (0, 1]")
+    if not 1 <= max_len <= MAX_COUNTED_ITEMSET_LENGTH:
+        raise ValueError(f"max_len must be between 1 and {MAX_COUNTED_ITEMSET_LENGTH}")
+    if df_basket.empty or df_basket.shape[1] == 0:
+        raise BasketDataError("Basket matrix is empty")
+
+    n_baskets = len(df_basket)
+    basket = (
+        df_basket.sparse.to_coo()
+        if all(isinstance(dtype, pd.SparseDtype) for dtype in df_basket.dtypes)
+        else sparse.coo_matrix(df_basket.to_numpy(dtype=bool))
+    )
+    matrix = sparse.csc_matrix(basket, dtype=np.int32)
+    matrix.data[:] = 1
+
+    def frequent(counts: np.ndarray) -> np.ndarray:
+        return counts / n_baskets >= min_support
+
+    item_counts = np.asarray(matrix.sum(axis=0)).ravel()
+    items = np.flatnonzero(frequent(item_counts))
+    supports = [item_counts[items] / n_baskets]
+    members = [items.reshape(-1, 1)]
+    if len(items) and max_len >= 2:
+        # Column positions below are within the frequent-item submatrix.
+        frequent_matrix = matrix[:, items].tocsc()
+        pair_counts = sparse.triu(frequent_matrix.T @ frequent_matrix, k=1).tocoo()
+        keep = frequent(pair_counts.data)
+        first, second, counts = pair_counts.row[keep], pair_counts.col[keep], pair_counts.data[keep]
+        supports.append(counts / n_baskets)
+        members.append(np.column_stack((items[first], items[second])))
+
+        if len(first) and max_len >= 3:
+            frequent_pair = np.zeros((len(items), len(items)), dtype=bool)
+            frequent_pair[first, second] = True
+            pair_baskets = frequent_matrix[:, first].multiply(frequent_matrix[:, second])
+            triple_counts = (sparse.csc_matrix(pair_baskets).T @ frequent_matrix).tocoo()
+            pair_index, third = triple_counts.row, triple_counts.col
+            keep = (
+                (third > second[pair_index])
+                & frequent_pair[first[pair_index], third]
+                & frequent_pair[second[pair_index], third]
+                & frequent(triple_counts.data)
+            )
+            supports.append(triple_counts.data[keep] / n_baskets)
+            members.append(
+                np.column_stack(
+                    (
+                        items[first[pair_index[keep]]],
+                        items[second[pair_index[keep]]],
+                        items[third[keep]],
+                    )
+                )
+            )
+
+    columns = df_basket.columns.to_numpy()
+    itemsets = pd.DataFrame(
+        {
+            "support": np.concatenate(supports),
+            "itemsets": [
+                frozenset(columns[row].tolist()) for group in members for row in group
+            ],
+        }
+    )
+    if itemsets.empty:
+        raise BasketDataError("Sparse counting found no itemsets; lower min_support")
+    itemsets["length"] = itemsets["itemsets"].map(len)
+    return itemsets.sort_values(["support", "length"], ascending=[False, True])
+
+
+@dataclass(frozen=True, slots=True)
+class ShardStats:
+    """Work done for one partition of a SON run."""
+
+    shard: int
+    baskets: int
+    local_itemsets: int
+    mine_seconds: float
+    count_seconds: float
+    peak_rss_mb: float | None
+
+
+def _peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:  # Not available on Windows.
+        return None
+    # Linux reports the high-water mark of the worker process in KiB.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _mine_shard(
+    shard: sparse.csr_matrix, algorithm: str, min_support: float
+) -> tuple[list[tuple[int, ...]], float, float | None]:
+    started = perf_counter()
+    frame = basket_frame(shard, [str(column) for column in range(shard.shape[1])])
+    try:
+        itemsets = MINING_FUNCTIONS[algorithm](frame, min_support)["itemsets"]
+    except BasketDataError:
+        itemsets = pd.Series([], dtype=object)
+    candidates = [tuple(sorted(int(item) for item in itemset)) for itemset in itemsets]
+    return candidates, perf_counter() - started, _peak_rss_mb()
+
+
+def _count_shard(
+    shard: sparse.csr_matrix, membership: sparse.csc_matrix, lengths: np.ndarray
+) -> tuple[np.ndarray, float, float | None]:
+    started = perf_counter()
+    # Each entry is how many of a candidate's items a basket holds; the basket
+    # contains the candidate when that equals the candidate's length.
+    hits = (sparse.csr_matrix(shard, dtype=np.int32) @ membership).tocoo()
+    contained = hits.data == lengths[hits.col]
+    counts = np.bincount(hits.col[contained], minlength=len(lengths))
+    return counts, perf_counter() - started, _peak_rss_mb()
+
+
+def run_partitioned(
+    matrix: sparse.spmatrix,
+    columns: Sequence[object],
+    min_support: float = 0.01,
+    *,
+    partitions: int,
+    algorithm: str = "fpgrowth",
+    workers: int | None = None,
+) -> tuple[pd.DataFrame, list[ShardStats]]:
+    """Mine exact frequent itemsets with the two-pass SON algorithm in a process pool.
+
+    Rows are split into ``partitions`` contiguous shards.  Every globally
+    frequent itemset is frequent in at least one shard at the same relative
+    support, so the union of locally frequent itemsets is a complete candidate
+    set.  A second parallel pass counts every candidate exactly across all
+    shards, and only candidates meeting ``min_support`` overall are kept.
+    """
+    if not 0 < min_support <= 1:
+        raise ValueError("min_support must be in (0, 1]")
+    if partitions < 1:
+        raise ValueError("partitions must be at least 1")
+    if algorithm not in MINING_FUNCTIONS:
+        raise ValueError(f"algorithm must be one of: {', '.join(MINING_FUNCTIONS)}")
+    basket = sparse.csr_matrix(matrix, dtype=bool)
+    n_baskets, n_items = basket.shape
+    if n_baskets == 0 or n_items == 0:
+        raise BasketDataError("Basket matrix is empty")
+    if n_items != len(columns):
+        raise BasketDataError("Basket matrix columns do not match their labels")
+    bounds = np.linspace(0, n_baskets, min(partitions, n_baskets) + 1).astype(np.int64)
+    shards = [basket[start:stop] for start, stop in zip(bounds[:-1], bounds[1:], strict=True)]
+    # A hair below the global threshold so float rounding cannot drop a
+    # candidate that is exactly at min_support in some shard.
+    local_support = min_support * (1 - 1e-9)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        mined = list(
+            pool.map(
+                _mine_shard,
+                shards,
+                [algorithm] * len(shards),
+                [local_support] * len(shards),
+            )
+        )
+        candidates = sorted(
+            set().union(*(local for local, _, _ in mined)), key=lambda items: (len(items), items)
+        )
+        if not candidates:
+            raise BasketDataError("No shard found frequent itemsets; lower min_support")
+        lengths = np.fromiter(map(len, candidates), dtype=np.int32, count=len(candidates))
+        membership = sparse.csc_matrix(
+            (
+                np.ones(int(lengths.sum()), dtype=np.int32),
+                np.fromiter(
+                    (item for items in candidates for item in items),
+                    dtype=np.int32,
+                    count=int(lengths.sum()),
+                ),
+                np.concatenate(([0], np.cumsum(lengths))),
+            ),
+            shape=(n_items, len(candidates)),
+        )
+        counted = list(
+            pool.map(
+                _count_shard,
+                shards,
+                [membership] * len(shards),
+                [lengths] * len(shards),
+            )
+        )
+
+    supports = np.sum([counts for counts, _, _ in counted], axis=0) / n_baskets
+    keep = np.flatnonzero(supports >= min_support)
+    if not len(keep):
+        raise BasketDataError("Partitioned mining found no itemsets; lower min_support")
+    labels = list(columns)
+    itemsets = pd.DataFrame(
+        {
+            "support": supports[keep],
+            "itemsets": [frozenset(labels[item] for item in candidates[index]) for index in keep],
+        }
+    )
+    itemsets["length"] = itemsets["itemsets"].map(len)
+    stats = [
+        ShardStats(
+            shard=index,
+            baskets=shard.shape[0],
+            local_itemsets=len(local),
+            mine_seconds=mine_seconds,
+            count_seconds=count_seconds,
+            peak_rss_mb=max(
+                (value for value in (mine_rss, count_rss) if value is not None), default=None
+            ),
+        )
+        for index, (shard, (local, mine_seconds, mine_rss), (_, count_seconds, count_rss))
+        in enumerate(zip(shards, mined, counted, strict=True))
+    ]
+    return itemsets.sort_values(["support", "length"], ascending=[False, True]), stats
+
+
+@dataclass(frozen=True, slots=True)
+class SupportSearch:
+    """Outcome of choosing ``min_support`` for a target rule count."""
+
+    target_rules: int
+    min_support: float
+    estimated_rules: int
+    candidate_rules: int
+    evaluations: int
+    elapsed_seconds: float
+    support_floor: float
+    reached_target: bool
+
+
+def search_min_support(
+    matrix: sparse.spmatrix,
+    target_rules: int,
+    *,
+    min_confidence: float,
+    min_lift: float | None = None,
+    top_k: int | None = None,
+    min_count: int = 2,
+    support_floor: float = DEFAULT_SUPPORT_FLOOR,
+) -> SupportSearch:
+    """Binary-search the highest support whose pair rules number at least ``target_rules``.
+
+    Item and pair counts come from one ``X.T @ X`` product.  Pair-rule
+    confidence and lift do not depend on the support threshold, so the rules
+    that pass them are fixed and the estimate at threshold ``t`` counts those
+    with support >= ``t`` (capped at ``top_k`` per antecedent).  The estimate
+    ignores longer itemsets, so the mined rule count can be somewhat higher.
+    Pairs seen in fewer than ``min_count`` baskets, or below ``support_floor``,
+    are never candidates.  When even the lowest candidate threshold falls short
+    of ``target_rules``, the search returns it with ``reached_target=False``.
+    """
+    if target_rules < 1:
+        raise ValueError("target_rules must be at least 1")
+    if not 0 <= support_floor <= 1:
+        raise ValueError("support_floor must be between 0 and 1")
+    started = perf_counter()
+    basket = sparse.csc_matrix(matrix, dtype=np.int32)
+    basket.data[:] = 1
+    n_baskets = basket.shape[0]
+    if n_baskets == 0 or basket.shape[1] == 0:
+        raise BasketDataError("Basket matrix is empty")
+    item_counts = np.asarray(basket.sum(axis=0)).ravel()
+    pairs = sparse.triu(basket.T @ basket, k=1).tocoo()
+    floor_count = max(min_count, int(np.ceil(round(support_floor * n_baskets, 9))))
+    frequent = pairs.data >= floor_count
+    first, second, counts = pairs.row[frequent], pairs.col[frequent], pairs.data[frequent]
+    antecedents = np.concatenate((first, second))
+    consequents = np.concatenate((second, first))
+    rule_counts = np.concatenate((counts, counts))
+    confidence = rule_counts / item_counts[antecedents]
+    qualified = confidence >= min_confidence
+    if min_lift is not None:
+        qualified &= confidence / (item_counts[consequents] / n_baskets) >= min_lift
+    antecedents, rule_counts = antecedents[qualified], rule_counts[qualified]
+    if not len(rule_counts):
+        raise BasketDataError(
+            f"No pair rules reach confidence>={min_confidence} at support>={support_floor}; "
+            "lower --min-confidence or --min-support-floor"
+        )
+
+    def estimate(threshold: int) -> int:
+        passing = rule_counts >= threshold
+        if top_k is None:
+            return int(passing.sum())
+        per_antecedent = np.bincount(antecedents[passing], minlength=basket.shape[1])
+        return int(np.minimum(per_antecedent, top_k).sum())
+
+    # Candidate thresholds, highest first; the estimate grows along this axis.
+    thresholds = np.unique(rule_counts)[::-1]
+    low, high = 0, len(thresholds) - 1
+    evaluations = 0
+    while low < high:
+        middle = (low + high) // 2
+        evaluations += 1
+        if estimate(int(thresholds[middle])) >= target_rules:
+            high = middle
+        else:
+            low = middle + 1
+    chosen = int(thresholds[low])
+    estimated = estimate(chosen)
+    return SupportSearch(
+        target_rules=target_rules,
+        min_support=chosen / n_baskets,
+        estimated_rules=estimated,
+        candidate_rules=len(rule_counts),
+        evaluations=evaluations + 1,
+        elapsed_seconds=perf_counter() - started,
+        support_floor=support_floor,
+        reached_target=estimated >= target_rules,
+    )
+
+
+def _split_rows(rows: np.ndarray, length: int, mask: int, pad: int) -> tuple[np.ndarray, ...]:
+    """Antecedent and consequent rows for one bit ``mask`` over ``length``-item rows."""
+    chosen = np.array([(mask >> bit) & 1 for bit in range(length)], dtype=bool)
+    parts = []
+    for columns in (chosen, ~chosen):
+        part = np.full((len(rows), pad), np.iinfo(rows.dtype).max, dtype=rows.dtype)
+        part[:, : int(columns.sum())] = rows[:, columns]
+        parts.append(part)
+    return tuple(parts)
+
+
+def _row_keys(blocks: Sequence[np.ndarray], n_items: int) -> list[np.ndarray]:
+    """One integer key per sorted, padded item row, equal exactly for equal rows.
+
+    Rows are packed as base-``n_items + 1`` digits when that fits in ``int64``
+    and padding contributes zero; wider rows fall back to ranking by ``np.unique``.
+    """
+    width = blocks[0].shape[1]
+    if (n_items + 1) ** width <= np.iinfo(np.int64).max:
+        powers = (n_items + 1) ** np.arange(width, dtype=np.int64)
+        return [np.where(block < n_items, block + 1, 0) @ powers for block in blocks]
+    _, inverse = np.unique(np.concatenate(blocks), axis=0, return_inverse=True)
+    bounds = np.cumsum([0, *(len(block) for block in blocks)])
+    inverse = inverse.reshape(-1)
+    return [inverse[start:stop] for start, stop in zip(bounds[:-1], bounds[1:], strict=True)]
+
+
+def _itemset_rows(frequent_itemsets: pd.DataFrame) -> tuple[np.ndarray, np.ndarray, pd.Index]:
+    """Sorted item-code rows padded with the ``int64`` maximum, their lengths and item labels."""
+    itemsets = frequent_itemsets["itemsets"].tolist()
+    lengths = np.fromiter(map(len, itemsets), dtype=np.int64, count=len(itemsets))
+    codes, labels = pd.factorize(
+        pd.Series([item for itemset in itemsets for item in itemset], dtype=object)
+    )
+    width = int(lengths.max())
+    rows = np.full((len(itemsets), width), np.iinfo(np.int64).max, dtype=np.int64)
+    rows[np.arange(width) < lengths[:, None]] = codes
+    rows.sort(axis=1)
+    return rows, lengths, labels
+
+
+def compact_itemsets(frequent_itemsets: pd.DataFrame, mode: str = "closed") -> pd.DataFrame:
+    """Keep only closed, or maximal, frequent itemsets.
+
+    An itemset is closed when no proper superset has the same support and
+    maximal when no proper superset is frequent.  Frequent itemsets are closed
+    under subsets, so comparing every ``k``-itemset with its ``k - 1``-subsets
+    decides both: each subset is one dropped column and one key lookup.
+    """
+    if mode not in COMPACTION_MODES:
+        raise ValueError(f"mode must be one of: {', '.join(COMPACTION_MODES)}")
+    if frequent_itemsets.empty:
+        raise BasketDataError("Frequent itemsets are empty")
+    rows, lengths, labels = _itemset_rows(frequent_itemsets)
+    width = rows.shape[1]
+    pad = np.iinfo(np.int64).max
+    support = frequent_itemsets["support"].to_numpy(dtype=float)
+    subset_parts: list[np.ndarray] = []
+    superset_parts: list[np.ndarray] = []
+    for length in range(2, width + 1):
+        members = np.flatnonzero(lengths == length)
+        if not len(members):
+            continue
+        block = rows[members, :length]
+        for dropped in range(length):
+            subset = np.full((len(members), width), pad, dtype=np.int64)
+            subset[:, : length - 1] = np.delete(block, dropped, axis=1)
+            subset_parts.append(subset)
+            superset_parts.append(members)
+    if not subset_parts:
+        return frequent_itemsets.reset_index(drop=True)
+
+    superset = np.concatenate(superset_parts)
+    itemset_keys, subset_keys = _row_keys((rows, np.concatenate(subset_parts)), len(labels))
+    by_key = np.argsort(itemset_keys)
+    positions = np.minimum(
+        np.searchsorted(itemset_keys[by_key], subset_keys), len(itemset_keys) - 1
+    )
+    found = itemset_keys[by_key[positions]] == subset_keys
+    subset = by_key[positions[found]]
+    superset = superset[found]
+    if mode == "closed":
+        # Supports of equal counts are computed identically; the tolerance only
+        # absorbs miners that sum boolean columns in a different order.
+        equal = np.isclose(support[subset], support[superset], rtol=1e-12, atol=0)
+        subset = subset[equal]
+    redundant = np.zeros(len(rows), dtype=bool)
+    redundant[subset] = True
+    return frequent_itemsets.loc[~redundant].reset_index(drop=True)
+
+
 def generate_rules(
     frequent_itemsets: pd.DataFrame,
     metric: str = "confidence",
     min_threshold: float = 0.3,
+    *,
+    min_lift: float | None = None,
+    top_k: int | None = None,
+    bases: pd.DataFrame | None = None,
 ) -> pd.DataFrame:
+    """Derive rules from every antecedent/consequent split with NumPy arrays.
+
+    Items are factorized to integer codes and each itemset becomes a sorted,
+    padded row with one integer key, so every support lookup is a single
+    ``np.searchsorted`` over the sorted itemset keys.  Each (length, split) pair
+    is a column selection over all itemsets of that length.  ``min_lift`` drops
+    weak rules and ``top_k`` keeps the best consequents per antecedent, ranked
+    like the output by lift, confidence, then support.  With ``bases``, such as
+    :func:`compact_itemsets` output, only those itemsets are split into rules;
+    ``frequent_itemsets`` still supplies every subset support.
+    """
     if frequent_itemsets.empty:
         raise BasketDataError("Frequent itemsets are empty")
-    rules = association_rules(
-        frequent_itemsets,
-        metric=metric,
-        min_threshold=min_threshold,
-        support_only=False,
+    if metric not in RULE_METRICS:
+        raise ValueError(f"metric must be one of: {', '.join(RULE_METRICS)}")
+    if top_k is not None and top_k < 1:
+        raise ValueError("top_k must be at least 1")
+
+    rows, lengths, labels = _itemset_rows(frequent_itemsets)
+    width = rows.shape[1]
+    pad = np.iinfo(np.int64).max
+    is_base = (
+        np.ones(len(rows), dtype=bool)
+        if bases is None
+        else frequent_itemsets["itemsets"].isin(set(bases["itemsets"])).to_numpy()
     )
-    if rules.empty:
+
+    antecedent_parts: list[np.ndarray] = []
+    consequent_parts: list[np.ndarray] = []
+    source_parts: list[np.ndarray] = []
+    for length in range(2, width + 1):
+        members = np.flatnonzero((lengths == length) & is_base)
+        if not len(members):
+            continue
+        block = rows[members, :length]
+        for mask in range(1, 2**length - 1):
+            antecedent, consequent = _split_rows(block, length, mask, width)
+            antecedent_parts.append(antecedent)
+            consequent_parts.append(consequent)
+            source_parts.append(members)
+    if not source_parts:
+        raise BasketDataError("Rules need frequent itemsets with at least two items")
+
+    antecedent_rows = np.concatenate(antecedent_parts)
+    consequent_rows = np.concatenate(consequent_parts)
+    source = np.concatenate(source_parts)
+    itemset_keys, antecedent_keys, consequent_keys = _row_keys(
+        (rows, antecedent_rows, consequent_rows), len(labels)
+    )
+    by_key = np.argsort(itemset_keys)
+    sorted_keys = itemset_keys[by_key]
+    itemset_support = frequent_itemsets["support"].to_numpy(dtype=float)
+
+    def support_of(keys: np.ndarray) -> np.ndarray:
+        positions = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+        if (sorted_keys[positions] != keys).any():
+            raise BasketDataError("Frequent itemsets are missing the support of a rule subset")
+        return itemset_support[by_key[positions]]
+
+    antecedent_support = support_of(antecedent_keys)
+    consequent_support = support_of(consequent_keys)
+    support = itemset_support[source]
+    confidence = support / antecedent_support
+    lift = confidence / consequent_support
+    with np.errstate(divide="ignore"):
+        conviction = np.where(
+            confidence >= 1, np.inf, (1 - consequent_support) / (1 - confidence)
+        )
+    metrics = {
+        "antecedent support": antecedent_support,
+        "consequent support": consequent_support,
+        "support": support,
+        "confidence": confidence,
+        "lift": lift,
+        "leverage": support - antecedent_support * consequent_support,
+        "conviction": conviction,
+    }
+
+    keep = metrics[metric] >= min_threshold
+    if min_lift is not None:
+        keep &= lift >= min_lift
+    order = np.lexsort((-support, -confidence, -lift))
+    order = order[keep[order]]
+    if top_k is not None and len(order):
+        grouped = np.argsort(antecedent_keys[order], kind="stable")
+        group_ids = antecedent_keys[order][grouped]
+        starts = np.flatnonzero(np.r_[True, group_ids[1:] != group_ids[:-1]])
+        ranks = np.arange(len(grouped)) - np.repeat(starts, np.diff(np.r_[starts, len(grouped)]))
+        selected = np.zeros(len(order), dtype=bool)
+        selected[grouped[ranks < top_k]] = True
+        order = order[selected]
+    if not len(order):
+        lift_rule = "" if min_lift is None else f" and lift>={min_lift}"
         raise BasketDataError(
-            f"No association rules satisfy {metric}>={min_threshold}; lower the threshold"
+            f"No association rules satisfy {metric}>={min_threshold}{lift_rule}; "
+            "lower the threshold"
         )
-    return rules.sort_values(
-        ["lift", "confidence", "support"],
-        ascending=[False, False, False],
-    ).reset_index(drop=True)
+
+    items = np.asarray(labels, dtype=object)
+
+    def frozensets(keys: np.ndarray, key_rows: np.ndarray) -> np.ndarray:
+        # Rules share few distinct sides, so each frozenset is built only once.
+        distinct, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        built = np.empty(len(distinct), dtype=object)
+        built[:] = [frozenset(items[row[row != pad]]) for row in key_rows[first]]
+        return built[inverse]
+
+    return pd.DataFrame(
+        {
+            "antecedents": frozensets(antecedent_keys[order], antecedent_rows[order]),
+            "consequents": frozensets(consequent_keys[order], consequent_rows[order]),
+            **{name: values[order] for name, values in metrics.items()},
+        }
+    )
+
+
+MINING_FUNCTIONS = {
+    "fpgrowth": run_fpgrowth,
+    "apriori": run_apriori,
+    "counts": run_counts,
+}
 
 
 def _display_items(items: object, catalog: dict[str, str] | None) -> str:
@@ -291,7 +1011,11 @@ def save_rules(
     *,
     catalog: dict[str, str] | None = None,
 ) -> Path:
-    """Save exact ID and display-name itemsets as JSON arrays inside CSV cells."""
+    """Export exact ID and display-name itemsets as JSON arrays inside CSV cells.
+
+    This is the human-readable export; :func:`mining.rule_store.save_rule_store`
+    writes the binary artifact the recommenders load.
+    """
     if rules.empty:
         raise BasketDataError("Cannot save empty rules")
     path = (
@@ -356,51 +1080,357 @@ def build_parser() -> argparse.ArgumentParser:
     mode.add_argument("--full", action="store_true", help="Explicitly process every order")
     parser.add_argument("--seed", type=int, help="Override MINING_RANDOM_STATE")
     parser.add_argument("--min-items", type=int, default=2)
+    parser.add_argument(
+        "--exclude-train",
+        action="store_true",
+        help="leave out the held-out train orders so instacart-evaluate can score the rules",
+    )
     parser.add_argument("--top-products", type=int, default=DEFAULT_TOP_PRODUCTS)
-    parser.add_argument("--min-support", type=float, default=0.01)
+    support = parser.add_mutually_exclusive_group()
+    support.add_argument("--min-support", type=float, default=0.01)
+    support.add_argument(
+        "--target-rules",
+        type=int,
+        help="choose min-support from item and pair counts to yield about N rules",
+    )
+    parser.add_argument(
+        "--min-support-floor",
+        type=float,
+        default=DEFAULT_SUPPORT_FLOOR,
+        help="lowest min-support --target-rules may choose (default: %(default)s)",
+    )
     parser.add_argument("--min-confidence", type=float, default=0.3)
-    parser.add_argument("--algorithm", choices=("fpgrowth", "apriori"), default="fpgrowth")
+    parser.add_argument("--min-lift", type=float, help="drop rules with a lower lift")
+    parser.add_argument(
+        "--top-k-consequents",
+        type=int,
+        help="keep only the K best consequents per antecedent",
+    )
+    parser.add_argument(
+        "--algorithm",
+        choices=tuple(MINING_FUNCTIONS),
+        default="fpgrowth",
+        help=(
+            "counts finds itemsets of up to "
+            f"{MAX_COUNTED_ITEMSET_LENGTH} items with sparse pair/triple counting"
+        ),
+    )
+    parser.add_argument(
+        "--compact",
+        choices=COMPACTION_MODES,
+        help="write only closed or maximal itemsets and derive rules from them alone",
+    )
+    parser.add_argument(
+        "--compaction-report",
+        action="store_true",
+        help="with --compact, also mine the full rules and time recommendations on both",
+    )
+    parser.add_argument(
+        "--partitions",
+        type=int,
+        help="mine K row shards in a process pool with the exact two-pass SON algorithm",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="process-pool size for --partitions (default: CPU count)",
+    )
+    parser.add_argument(
+        "--sketch-pairs",
+        action="store_true",
+        help=(
+            "count pairs over every product with a fixed-memory Count-Min sketch and "
+            "verify the heavy hitters exactly; ignores --top-products and --algorithm"
+        ),
+    )
+    parser.add_argument(
+        "--sketch-memory-mb",
+        type=float,
+        default=DEFAULT_SKETCH_MEMORY_MB,
+        help="memory cap for the sketch counters",
+    )
+    parser.add_argument(
+        "--sketch-depth",
+        type=int,
+        default=DEFAULT_SKETCH_DEPTH,
+        help="sketch rows; estimates hold with probability 1 - exp(-depth)",
+    )
+    parser.add_argument(
+        "--heavy-hitters",
+        type=int,
+        default=DEFAULT_HEAVY_HITTERS,
+        help="candidate pairs kept for exact verification",
+    )
+    parser.add_argument(
+        "--etl-report",
+        type=Path,
+        help="instacart-etl load report that keys the basket store (default: ETL_REPORT_PATH)",
+    )
+    parser.add_argument(
+        "--basket-store",
+        type=Path,
+        default=DEFAULT_STORE_DIR,
+        help="directory of memory-mapped baskets keyed by ETL load, seed and order limit",
+    )
+    store = parser.add_mutually_exclusive_group()
+    store.add_argument(
+        "--no-basket-store",
+        action="store_true",
+        help="always extract from the warehouse and do not write the store",
+    )
+    store.add_argument(
+        "--rebuild-basket-store",
+        action="store_true",
+        help="re-extract and replace the stored baskets for this key",
+    )
     parser.add_argument("--output-dir", type=Path)
     parser.add_argument("--no-plot", action="store_true")
+    parser.add_argument(
+        "--export-csv",
+        action="store_true",
+        help="also write association_rules.csv next to the binary rule store",
+    )
+    registry = parser.add_mutually_exclusive_group()
+    registry.add_argument(
+        "--registry",
+        type=Path,
+        default=DEFAULT_REGISTRY_DIR,
+        help="content-addressed registry that keeps a copy of every run",
+    )
+    registry.add_argument(
+        "--no-registry", action="store_true", help="do not register this run"
+    )
     return parser
 
 
-def main(argv: Sequence[str] | None = None) -> int:
-    args = build_parser().parse_args(argv)
-    settings = get_settings()
+@dataclass(frozen=True, slots=True)
+class RunBaskets:
+    """Baskets for one CLI run and where they came from."""
+
+    baskets: BasketArrays
+    random_state: int
+    order_limit: int | None
+    basket_source: str
+    basket_store: str | None
+    sample_source: str | None
+    held_out_baskets: int | None = None
+    etl_run_id: str | None = None
+
+
+def validate_arguments(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    if args.partitions is not None and args.partitions < 1:
+        parser.error("--partitions must be at least 1")
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.top_k_consequents is not None and args.top_k_consequents < 1:
+        parser.error("--top-k-consequents must be at least 1")
+    if args.target_rules is not None and args.target_rules < 1:
+        parser.error("--target-rules must be at least 1")
+    if args.compaction_report and args.compact is None:
+        parser.error("--compaction-report requires --compact")
+    if not 0 <= args.min_support_floor <= 1:
+        parser.error("--min-support-floor must be between 0 and 1")
+    if args.sketch_pairs and (args.partitions is not None or args.target_rules is not None):
+        parser.error("--sketch-pairs cannot be combined with --partitions or --target-rules")
+    if args.sketch_memory_mb <= 0 or args.sketch_depth < 1 or args.heavy_hitters < 1:
+        parser.error("sketch memory, depth and heavy hitters must be positive")
+
+
+def load_run_baskets(args: argparse.Namespace, settings: Settings, engine: Engine) -> RunBaskets:
+    """Resolve the sample, then read baskets from the store or the warehouse."""
     random_state = settings.mining_random_state if args.seed is None else args.seed
     order_limit = None if args.full else (args.order_limit or settings.mining_order_limit)
     if order_limit is not None and order_limit <= 0:
         raise ValueError("order limit must be positive")
-    output_dir = ensure_results_dir(args.output_dir)
-    engine = get_engine(settings)
     mode_label = "FULL DATASET (explicit)" if order_limit is None else (
         f"deterministic sample of at most {order_limit:,} orders (seed={random_state})"
     )
     print(f"Market-basket input: {mode_label}")
 
-    started = perf_counter()
-    transactions = extract_transactions(
-        order_limit,
-        args.min_items,
-        engine=engine,
+    sample_source = None
+    etl_run_id = loaded_run_id(args.etl_report or settings.etl_report_path, engine)
+    run_id = None if args.no_basket_store else etl_run_id
+    store_dir = (
+        None
+        if run_id is None
+        else args.basket_store / store_key(run_id, random_state, order_limit)
+    )
+    if run_id is None and not args.no_basket_store:
+        print(
+            "No successful ETL load matching the warehouse is recorded in the ETL report; "
+            "extracting without the basket store."
+        )
+    stored = None if store_dir is None or args.rebuild_basket_store else load_baskets(store_dir)
+    if stored is None:
+        if order_limit is not None:
+            sample_source = (
+                "sorted" if persisted_sample_size(engine, random_state) is None else "persisted"
+            )
+        # Store every basket so later runs can change --min-items without re-extracting.
+        stored = extract_basket_arrays(
+            order_limit,
+            1,
+            engine=engine,
+            random_state=random_state,
+            chunk_size=settings.chunk_size,
+            settings=settings,
+        )
+        basket_source = "warehouse"
+        if store_dir is not None:
+            save_baskets(
+                stored,
+                store_dir,
+                key_fields={
+                    "etl_run_id": run_id,
+                    "random_state": random_state,
+                    "order_limit": order_limit,
+                },
+            )
+    else:
+        basket_source = "basket_store"
+        print(f"Reusing memory-mapped baskets from {store_dir}")
+    held_out_baskets = None
+    if args.exclude_train:
+        held_out = held_out_order_ids(engine)
+        if held_out is None:
+            raise BasketDataError(
+                "--exclude-train needs the held-out orders in Mining_Eval_Orders; "
+                "run `make schema`, then reload with instacart-etl"
+            )
+        prior = ~np.isin(stored.order_ids, held_out)
+        held_out_baskets = int(len(prior) - prior.sum())
+        stored = stored.select(prior)
+        print(f"Left out {held_out_baskets:,} held-out train baskets")
+    baskets = stored.with_min_items(args.min_items)
+    if not len(baskets):
+        raise BasketDataError(f"No baskets satisfy min_items={args.min_items}")
+    return RunBaskets(
+        baskets=baskets,
         random_state=random_state,
-        chunk_size=settings.chunk_size,
-        settings=settings,
+        order_limit=order_limit,
+        basket_source=basket_source,
+        basket_store=None if store_dir is None else store_dir.name,
+        sample_source=sample_source,
+        held_out_baskets=held_out_baskets,
+        etl_run_id=etl_run_id,
     )
-    matrix = create_basket_matrix(transactions, args.top_products)
-    mining_function = run_fpgrowth if args.algorithm == "fpgrowth" else run_apriori
-    itemsets = mining_function(matrix, args.min_support)
-    rules = generate_rules(itemsets, min_threshold=args.min_confidence)
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    validate_arguments(parser, args)
+    settings = get_settings()
+    output_dir = ensure_results_dir(args.output_dir)
+    engine = get_engine(settings)
+
+    started = perf_counter()
+    run = load_run_baskets(args, settings, engine)
+    baskets = run.baskets
+    support_search = None
+    sketch_stats = None
+    min_support = args.min_support
+    shard_stats: list[ShardStats] = []
+    if args.sketch_pairs:
+        encoded = None
+        itemsets, sketch_stats = count_pairs_streaming(
+            baskets,
+            min_support,
+            memory_mb=args.sketch_memory_mb,
+            depth=args.sketch_depth,
+            capacity=args.heavy_hitters,
+            seed=run.random_state,
+        )
+        print(
+            f"Sketched {sketch_stats.pair_occurrences:,} pair occurrences in "
+            f"{sketch_stats.memory_mb:.1f} MiB; verified {sketch_stats.verified_pairs:,} "
+            f"of {sketch_stats.candidates:,} candidate pairs"
+        )
+        if not sketch_stats.complete:
+            print(
+                "Warning: the heavy-hitter set was full; pairs seen at most "
+                f"{sketch_stats.candidate_floor:,} times may be missing. "
+                "Raise --heavy-hitters for a complete result."
+            )
+    else:
+        encoded, product_ids = encode_baskets(
+            baskets.indptr, baskets.indices, int(baskets.indices.max()) + 1, args.top_products
+        )
+        if args.target_rules is not None:
+            support_search = search_min_support(
+                encoded,
+                args.target_rules,
+                min_confidence=args.min_confidence,
+                min_lift=args.min_lift,
+                top_k=args.top_k_consequents,
+                support_floor=args.min_support_floor,
+            )
+            min_support = support_search.min_support
+            print(
+                f"Chose min_support={min_support:.6f} for about {args.target_rules:,} rules "
+                f"({support_search.evaluations} estimates in "
+                f"{support_search.elapsed_seconds:.2f}s)"
+            )
+            if not support_search.reached_target:
+                print(
+                    f"Warning: only {support_search.estimated_rules:,} pair rules reach "
+                    f"support>={args.min_support_floor}; --target-rules "
+                    f"{args.target_rules:,} is not reachable. Lower --min-support-floor "
+                    "or --min-confidence."
+                )
+        if args.partitions is None:
+            itemsets = MINING_FUNCTIONS[args.algorithm](
+                basket_frame(encoded, product_ids), min_support
+            )
+        else:
+            itemsets, shard_stats = run_partitioned(
+                encoded,
+                [str(product_id) for product_id in product_ids],
+                min_support,
+                partitions=args.partitions,
+                algorithm=args.algorithm,
+                workers=args.workers,
+            )
+    rule_options = {
+        "min_threshold": args.min_confidence,
+        "min_lift": args.min_lift,
+        "top_k": args.top_k_consequents,
+    }
+    compaction = None
+    if args.compact is None:
+        rules = generate_rules(itemsets, **rule_options)
+        saved_itemsets = itemsets
+    else:
+        saved_itemsets = compact_itemsets(itemsets, args.compact)
+        rules = generate_rules(itemsets, bases=saved_itemsets, **rule_options)
+        compaction = {
+            "itemsets_before": len(itemsets),
+            "itemsets_after": len(saved_itemsets),
+            "itemset_reduction": 1 - len(saved_itemsets) / len(itemsets),
+            "rules_after": len(rules),
+        }
+        if args.compaction_report:
+            from mining.compaction_benchmark import compaction_report
+
+            compaction = compaction_report(
+                itemsets, saved_itemsets, generate_rules(itemsets, **rule_options), rules, baskets
+            )
+        compaction["mode"] = args.compact
+        print(
+            f"{args.compact.capitalize()} compaction kept {len(saved_itemsets):,} of "
+            f"{len(itemsets):,} itemsets and produced {len(rules):,} rules"
+        )
     catalog = load_product_catalog(engine)
     display_top_rules(rules, catalog=catalog)
-    rules_path = save_rules(
-        rules,
-        output_dir / "association_rules.csv",
-        catalog=catalog,
-    )
+    rules_path = save_rule_store(rules, output_dir / RULE_STORE_DIRNAME, catalog=catalog)
+    rules_csv_path: Path | None = None
+    if args.export_csv:
+        rules_csv_path = save_rules(rules, output_dir / "association_rules.csv", catalog=catalog)
+    else:
+        # A CSV left by an earlier --export-csv run would no longer match the rule store.
+        (output_dir / "association_rules.csv").unlink(missing_ok=True)
     itemsets_path = save_frequent_itemsets(
-        itemsets,
+        saved_itemsets,
         output_dir / "frequent_itemsets.csv",
         catalog=catalog,
     )
@@ -408,31 +1438,66 @@ def main(argv: Sequence[str] | None = None) -> int:
     metadata = {
         "artifact_schema_version": 1,
         "created_at": utc_timestamp(),
-        "mode": "full" if order_limit is None else "deterministic_sample",
-        "requested_order_limit": order_limit,
-        "random_state": random_state,
+        "mode": "full" if run.order_limit is None else "deterministic_sample",
+        "requested_order_limit": run.order_limit,
+        "random_state": run.random_state,
         "min_items": args.min_items,
-        "transactions": len(transactions),
+        "basket_source": run.basket_source,
+        "basket_store": run.basket_store,
+        "sample_source": run.sample_source,
+        "excludes_train_orders": args.exclude_train,
+        "held_out_baskets": run.held_out_baskets,
+        "transactions": len(baskets),
         "top_products": args.top_products,
-        "basket_matrix_rows": int(matrix.shape[0]),
-        "basket_matrix_columns": int(matrix.shape[1]),
-        "algorithm": args.algorithm,
-        "min_support": args.min_support,
+        "basket_matrix_rows": None if encoded is None else int(encoded.shape[0]),
+        "basket_matrix_columns": None if encoded is None else int(encoded.shape[1]),
+        "algorithm": "sketch_pairs" if args.sketch_pairs else args.algorithm,
+        "max_itemset_length": (
+            MAX_COUNTED_ITEMSET_LENGTH if args.algorithm == "counts" else None
+        ),
+        "min_support": min_support,
+        "support_search": None if support_search is None else asdict(support_search),
         "min_confidence": args.min_confidence,
-        "frequent_itemsets": len(itemsets),
+        "min_lift": args.min_lift,
+        "top_k_consequents": args.top_k_consequents,
+        "partitioning": None
+        if args.partitions is None
+        else {
+            "method": "son",
+            "partitions": len(shard_stats),
+            "workers": args.workers,
+            "shards": [asdict(stats) for stats in shard_stats],
+        },
+        "pair_sketch": None if sketch_stats is None else asdict(sketch_stats),
+        "compaction": compaction,
+        "frequent_itemsets": len(saved_itemsets),
         "association_rules": len(rules),
         "elapsed_seconds": perf_counter() - started,
         "artifacts": {
             "rules": rules_path.name,
+            "rules_csv": None if rules_csv_path is None else rules_csv_path.name,
             "itemsets": itemsets_path.name,
             "plot": None if plot_path is None else plot_path.name,
         },
     }
-    write_json(output_dir / "market_basket_metadata.json", metadata)
+    metadata_path = write_json(output_dir / "market_basket_metadata.json", metadata)
     print(
-        f"Mined {len(rules):,} rules from {len(transactions):,} baskets in "
+        f"Mined {len(rules):,} rules from {len(baskets):,} baskets in "
         f"{metadata['elapsed_seconds']:.1f}s. Artifacts: {output_dir}"
     )
+    if not args.no_registry:
+        registered = ArtifactRegistry(args.registry).register(
+            "rules",
+            {
+                "rules": rules_path,
+                "rules_csv": rules_csv_path,
+                "itemsets": itemsets_path,
+                "metadata": metadata_path,
+            },
+            parameters={name: metadata[name] for name in REGISTRY_PARAMETERS},
+            etl_run_id=run.etl_run_id,
+        )
+        print(f"Registered rules run {registered.digest[:12]} in {args.registry}")
     return 0
 
 
@@ -0,0 +1,231 @@
+"""Fixed-memory frequent-pair mining over every product with a Count-Min sketch.
+
+The exact pair counters cannot hold all products at once: a sparse pair matrix
+over the ~50k-product catalogue can exceed memory on the full dataset, and
+cutting to the most frequent products drops long-tail associations.  This
+module streams baskets twice instead:
+
+1. every within-basket pair updates a Count-Min sketch of ``depth`` rows by
+   ``width`` counters, and a heavy-hitter set keeps the ``capacity`` pairs with
+   the largest estimates seen so far;
+2. the surviving candidates are counted exactly, so reported supports are exact.
+
+With ``width = 2**k`` counters per row, each estimate exceeds the true count by
+at most ``e / width * N`` with probability ``1 - exp(-depth)``, where ``N`` is
+the number of pair occurrences streamed.  Estimates never undercount, so a pair
+is only missed when ``capacity`` candidates all have estimates at least its
+true count; :attr:`SketchStats.complete` reports whether that can affect pairs
+at the requested support.
+"""
+
+from __future__ import annotations
+
+import math
+from collections.abc import Iterator
+from dataclasses import dataclass
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from mining.basket_store import BasketArrays
+
+DEFAULT_SKETCH_MEMORY_MB = 64
+DEFAULT_SKETCH_DEPTH = 4
+DEFAULT_HEAVY_HITTERS = 200_000
+DEFAULT_CHUNK_BASKETS = 50_000
+_COUNTER_DTYPE = np.uint32
+
+
+@dataclass(frozen=True, slots=True)
+class SketchStats:
+    """Sizes, error bounds and completeness of one streaming pair count."""
+
+    width: int
+    depth: int
+    memory_mb: float
+    epsilon: float
+    delta: float
+    pair_occurrences: int
+    max_overcount: float
+    candidates: int
+    candidate_floor: int
+    min_pair_count: int
+    verified_pairs: int
+    complete: bool
+    sketch_seconds: float
+    verify_seconds: float
+
+
+class CountMinSketch:
+    """Count-Min sketch over ``int64`` keys using multiply-shift hashing."""
+
+    def __init__(self, width: int, depth: int, *, seed: int = 0) -> None:
+        if width < 2 or width & (width - 1):
+            raise ValueError("width must be a power of two of at least 2")
+        if depth < 1:
+            raise ValueError("depth must be at least 1")
+        rng = np.random.default_rng(seed)
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self._shift = np.uint64(64 - int(math.log2(width)))
+        self._multipliers = rng.integers(1, 2**63, size=depth, dtype=np.uint64) | np.uint64(1)
+        self._offsets = rng.integers(0, 2**63, size=depth, dtype=np.uint64)
+        self._table = np.zeros((depth, width), dtype=_COUNTER_DTYPE)
+
+    @classmethod
+    def for_memory(cls, memory_mb: float, depth: int, *, seed: int = 0) -> CountMinSketch:
+        """Largest power-of-two width whose ``depth`` rows fit in ``memory_mb``."""
+        counters = int(memory_mb * 2**20) // (depth * np.dtype(_COUNTER_DTYPE).itemsize)
+        if counters < 2:
+            raise ValueError("memory cap is too small for one sketch row")
+        return cls(2 ** int(math.log2(counters)), depth, seed=seed)
+
+    @property
+    def nbytes(self) -> int:
+        return self._table.nbytes
+
+    @property
+    def epsilon(self) -> float:
+        return math.e / self.width
+
+    @property
+    def delta(self) -> float:
+        return math.exp(-self.depth)
+
+    def _buckets(self, keys: np.ndarray, row: int) -> np.ndarray:
+        hashed = keys.astype(np.uint64) * self._multipliers[row] + self._offsets[row]
+        return (hashed >> self._shift).astype(np.intp)
+
+    def add(self, keys: np.ndarray) -> None:
+        for row in range(self.depth):
+            counts = np.bincount(self._buckets(keys, row), minlength=self.width)
+            self._table[row] += counts.astype(_COUNTER_DTYPE)
+        self.total += len(keys)
+
+    def estimate(self, keys: np.ndarray) -> np.ndarray:
+        estimates = self._table[0, self._buckets(keys, 0)].astype(np.int64)
+        for row in range(1, self.depth):
+            np.minimum(estimates, self._table[row, self._buckets(keys, row)], out=estimates)
+        return estimates
+
+
+def iter_basket_chunks(baskets: BasketArrays, chunk_baskets: int) -> Iterator[BasketArrays]:
+    """Yield consecutive basket slices; memory-mapped arrays are paged in one slice at a time."""
+    if chunk_baskets < 1:
+        raise ValueError("chunk_baskets must be at least 1")
+    for start in range(0, len(baskets), chunk_baskets):
+        stop = min(start + chunk_baskets, len(baskets))
+        low, high = int(baskets.indptr[start]), int(baskets.indptr[stop])
+        yield BasketArrays(
+            order_ids=baskets.order_ids[start:stop],
+            indptr=np.asarray(baskets.indptr[start : stop + 1], dtype=np.int64) - low,
+            indices=np.asarray(baskets.indices[low:high]),
+        )
+
+
+def basket_pair_keys(indptr: np.ndarray, indices: np.ndarray, n_items: int) -> np.ndarray:
+    """Key ``low * n_items + high`` for every unordered pair of items within each basket."""
+    lengths = np.diff(indptr)
+    position = np.arange(len(indices)) - np.repeat(indptr[:-1], lengths)
+    partners = np.repeat(lengths, lengths) - position - 1
+    first = np.repeat(np.arange(len(indices)), partners)
+    offset = np.arange(len(first)) - np.repeat(np.cumsum(partners) - partners, partners)
+    left = indices[first].astype(np.int64)
+    right = indices[first + 1 + offset].astype(np.int64)
+    return np.minimum(left, right) * n_items + np.maximum(left, right)
+
+
+def _top_candidates(keys: np.ndarray, estimates: np.ndarray, capacity: int) -> np.ndarray:
+    if len(keys) <= capacity:
+        return keys
+    return keys[np.argpartition(estimates, len(keys) - capacity)[-capacity:]]
+
+
+def count_pairs_streaming(
+    baskets: BasketArrays,
+    min_support: float,
+    *,
+    memory_mb: float = DEFAULT_SKETCH_MEMORY_MB,
+    depth: int = DEFAULT_SKETCH_DEPTH,
+    capacity: int = DEFAULT_HEAVY_HITTERS,
+    chunk_baskets: int = DEFAULT_CHUNK_BASKETS,
+    seed: int = 0,
+) -> tuple[pd.DataFrame, SketchStats]:
+    """Frequent items and pairs over all products, in the :func:`run_fpgrowth` frame layout.
+
+    Itemsets hold product IDs as strings, like :func:`basket_frame` columns.
+    Item supports are exact ``np.bincount`` totals.  Pair supports are exact
+    second-pass counts of the heavy-hitter candidates; only pairs reaching
+    ``min_support`` are returned.
+    """
+    if not 0 < min_support <= 1:
+        raise ValueError("min_support must be in (0, 1]")
+    if capacity < 1:
+        raise ValueError("capacity must be at least 1")
+    n_baskets = len(baskets)
+    if n_baskets == 0:
+        raise ValueError("baskets are empty")
+    n_items = int(np.max(baskets.indices)) + 1
+    min_count = math.ceil(min_support * n_baskets - 1e-9 * n_baskets)
+    sketch = CountMinSketch.for_memory(memory_mb, depth, seed=seed)
+
+    started = perf_counter()
+    item_counts = np.zeros(n_items, dtype=np.int64)
+    candidates = np.empty(0, dtype=np.int64)
+    for chunk in iter_basket_chunks(baskets, chunk_baskets):
+        item_counts += np.bincount(chunk.indices, minlength=n_items)
+        keys = basket_pair_keys(chunk.indptr, chunk.indices, n_items)
+        sketch.add(keys)
+        # Estimates only grow, so a pair evicted after its last occurrence already
+        # had an estimate of at least its true count: the final floor bounds misses.
+        pool = np.union1d(candidates, keys)
+        candidates = _top_candidates(pool, sketch.estimate(pool), capacity)
+    estimates = sketch.estimate(candidates)
+    candidate_floor = int(estimates.min()) if len(candidates) >= capacity else 0
+    candidates = np.sort(candidates[estimates >= min_count])
+    sketch_seconds = perf_counter() - started
+
+    started = perf_counter()
+    exact = np.zeros(len(candidates), dtype=np.int64)
+    if len(candidates):
+        for chunk in iter_basket_chunks(baskets, chunk_baskets):
+            keys = basket_pair_keys(chunk.indptr, chunk.indices, n_items)
+            positions = np.minimum(np.searchsorted(candidates, keys), len(candidates) - 1)
+            hits = positions[candidates[positions] == keys]
+            exact += np.bincount(hits, minlength=len(candidates))
+    verify_seconds = perf_counter() - started
+
+    frequent_items = np.flatnonzero(item_counts >= min_count)
+    frequent_pairs = exact >= min_count
+    pair_keys = candidates[frequent_pairs]
+    itemsets = pd.DataFrame(
+        {
+            "support": np.concatenate((item_counts[frequent_items], exact[frequent_pairs]))
+            / n_baskets,
+            "itemsets": [frozenset((str(item),)) for item in frequent_items]
+            + [
+                frozenset((str(low), str(high)))
+                for low, high in zip(pair_keys // n_items, pair_keys % n_items, strict=True)
+            ],
+        }
+    )
+    itemsets["length"] = itemsets["itemsets"].map(len)
+    stats = SketchStats(
+        width=sketch.width,
+        depth=sketch.depth,
+        memory_mb=sketch.nbytes / 2**20,
+        epsilon=sketch.epsilon,
+        delta=sketch.delta,
+        pair_occurrences=sketch.total,
+        max_overcount=sketch.epsilon * sketch.total,
+        candidates=len(candidates),
+        candidate_floor=candidate_floor,
+        min_pair_count=min_count,
+        verified_pairs=int(frequent_pairs.sum()),
+        complete=candidate_floor < min_count,
+        sketch_seconds=sketch_seconds,
+        verify_seconds=verify_seconds,
+    )
+    return itemsets, stats
@@ -3,18 +3,29 @@
 from __future__ import annotations
 
 import argparse
+import json
+import warnings
 from collections import defaultdict
 from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
+from scipy import sparse
 from sqlalchemy import text
 from sqlalchemy.engine import Connection, Engine
 
 from etl.config import Settings, get_engine, get_settings
-from mining.artifacts import DEFAULT_RESULTS_DIR, itemset_from_json
+from mining.artifacts import DEFAULT_RESULTS_DIR, file_digest, itemset_from_json
+from mining.registry import ArtifactRegistry, RunManifest
+from mining.rule_store import RuleArrays, default_rules_path, is_rule_store, load_rule_store
 
 TEMP_CLUSTER_TABLE = "tmp_instacart_cluster_members"
+# Registry cache names; bump the suffix when the cached structure changes.
+RULE_INDEX_CACHE = "rule_index-v1"
+CLUSTER_INDEX_CACHE = "cluster_index-v1"
+POPULARITY_CACHE = "cluster_popularity-v2"
 
 
 class RecommendationDataError(ValueError):
@@ -25,8 +36,22 @@ def _artifact_path(path: Path | str | None, default_name: str) -> Path:
     return Path(path) if path is not None else DEFAULT_RESULTS_DIR / default_name
 
 
+def _rules_path(path: Path | str | None) -> Path:
+    return Path(path) if path is not None else default_rules_path()
+
+
 def load_association_rules(path: Path | str | None = None) -> pd.DataFrame:
-    rules_path = _artifact_path(path, "association_rules.csv")
+    """Rules with decoded itemsets from a rule store directory or an exported CSV."""
+    rules_path = _rules_path(path)
+    if is_rule_store(rules_path):
+        arrays = load_rule_store(rules_path)
+        prepared = arrays.to_rules().rename(
+            columns={"antecedents": "antecedent_items", "consequents": "consequent_items"}
+        )
+        if arrays.names is not None:
+            prepared["antecedent_name_items"] = arrays.itemsets("antecedent", names=True)
+            prepared["consequent_name_items"] = arrays.itemsets("consequent", names=True)
+        return prepared
     if not rules_path.is_file():
         raise FileNotFoundError(
             f"Association rules not found at {rules_path}; run instacart-basket first"
@@ -62,6 +87,46 @@ def load_association_rules(path: Path | str | None = None) -> pd.DataFrame:
     return prepared
 
 
+def select_stratum_rules(
+    index_path: Path | str,
+    *,
+    user_segment: str | None = None,
+    order_dow: int | None = None,
+    order_hour: int | None = None,
+) -> Path | None:
+    """Return the rule file of the stratum matching the request context, if mined.
+
+    ``None`` means the caller should use the global rules: the context lacks a
+    stratified dimension, or its stratum was skipped or produced no rules.
+    """
+    path = Path(index_path)
+    index = json.loads(path.read_text(encoding="utf-8"))
+    context: dict[str, str] = {}
+    if user_segment is not None:
+        context["user_segment"] = user_segment
+    lookup = index.get("time_lookup")
+    if lookup is not None and order_dow is not None and order_hour is not None:
+        if not (0 <= order_dow <= 6 and 0 <= order_hour <= 23):
+            raise ValueError("order_dow must be 0-6 and order_hour 0-23")
+        slot = order_dow * 24 + order_hour
+        context["hour_range"] = lookup["hour_ranges"][slot]
+        context["weekend"] = "weekend" if lookup["weekend"][slot] else "weekday"
+    dimensions = index.get("dimensions", [])
+    if any(dimension not in context for dimension in dimensions):
+        return None
+    wanted = {dimension: context[dimension] for dimension in dimensions}
+    for stratum in index.get("strata", []):
+        if stratum.get("key") == wanted and stratum.get("path"):
+            return path.parent / stratum["path"]
+    return None
+
+
+def load_user_segment(engine: Engine, user_id: int) -> str | None:
+    query = text("SELECT user_segment FROM Dim_User WHERE user_id = :user_id")
+    with engine.connect() as connection:
+        return connection.execute(query, {"user_id": user_id}).scalar_one_or_none()
+
+
 def load_cluster_labels(path: Path | str | None = None) -> pd.DataFrame:
     labels_path = _artifact_path(path, "cluster_labels.csv")
     if not labels_path.is_file():
@@ -88,6 +153,44 @@ def load_cluster_labels(path: Path | str | None = None) -> pd.DataFrame:
     return prepared.drop_duplicates("user_id").sort_values("user_id").reset_index(drop=True)
 
 
+def load_cluster_popularity(
+    path: Path | str | None = None, *, labels_path: Path | str | None = None
+) -> pd.DataFrame:
+    """Precomputed per-cluster popularity rankings written by ``instacart-cluster``.
+
+    With ``labels_path``, the file's ``labels_digest`` must match those labels,
+    so popularity from one clustering run is never served with another's.
+    """
+    popularity_path = _artifact_path(path, "cluster_popularity.csv")
+    if not popularity_path.is_file():
+        raise FileNotFoundError(
+            f"Cluster popularity not found at {popularity_path}; run instacart-cluster first"
+        )
+    popularity = pd.read_csv(popularity_path)
+    required = {"cluster", "popularity_rank", "product_id", "product_name"}
+    missing = sorted(required.difference(popularity.columns))
+    if missing:
+        raise RecommendationDataError(f"Cluster popularity missing: {', '.join(missing)}")
+    if popularity.loc[:, sorted(required)].isna().any().any():
+        raise RecommendationDataError("Cluster popularity contains NULL values")
+    if labels_path is not None:
+        stamped = (
+            popularity["labels_digest"].unique().tolist()
+            if "labels_digest" in popularity.columns
+            else []
+        )
+        if stamped != [file_digest(labels_path)]:
+            raise RecommendationDataError(
+                f"Cluster popularity at {popularity_path} was not computed from the labels "
+                f"at {labels_path}; rerun instacart-cluster"
+            )
+    return (
+        popularity.drop(columns="labels_digest", errors="ignore")
+        .sort_values(["cluster", "popularity_rank"])
+        .reset_index(drop=True)
+    )
+
+
 def _prepare_rules(rules: pd.DataFrame) -> pd.DataFrame:
     if {"antecedent_items", "consequent_items"}.issubset(rules.columns):
         return rules
@@ -110,64 +213,262 @@ def _prepare_rules(rules: pd.DataFrame) -> pd.DataFrame:
     return prepared
 
 
-def _rule_item_columns(
-    cart: frozenset[str],
-    rules: pd.DataFrame,
-    item_space: str,
-) -> tuple[str, str]:
-    if item_space not in {"auto", "id", "name"}:
-        raise ValueError("item_space must be one of: auto, id, name")
-    has_names = {"antecedent_name_items", "consequent_name_items"}.issubset(
-        rules.columns
-    )
-    if item_space == "name":
-        if not has_names:
-            raise RecommendationDataError("Rules do not contain product-name itemsets")
-        return "antecedent_name_items", "consequent_name_items"
-    if item_space == "id" or not has_names:
-        return "antecedent_items", "consequent_items"
-
-    known_names: set[str] = set()
-    for values in rules["antecedent_name_items"]:
-        known_names.update(values)
-    for values in rules["consequent_name_items"]:
-        known_names.update(values)
-    if cart.intersection(known_names):
-        return "antecedent_name_items", "consequent_name_items"
-    return "antecedent_items", "consequent_items"
+def _ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Concatenated ``arange(start, start + length)`` for every pair."""
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(int(lengths.sum()))
+
+
+def _sorted_unique(values: np.ndarray) -> np.ndarray:
+    """``np.unique`` of integers by one sort, without its hashing pass."""
+    ordered = np.sort(values)
+    if not len(ordered):
+        return ordered
+    return ordered[np.concatenate(([True], ordered[1:] != ordered[:-1]))]
+
+
+@dataclass(frozen=True, slots=True)
+class ItemPostings:
+    """Rules of one item space as integer-coded CSR arrays.
+
+    Codes follow the sorted item labels, so sorting by code reproduces the
+    label tie-break of the original ranking.  ``item_indptr``/``item_rules``
+    list the rules whose antecedent contains each item;
+    ``consequent_indptr``/``consequent_codes`` list each rule's consequents.
+    """
+
+    labels: np.ndarray
+    codes: dict[str, int]
+    antecedent_sizes: np.ndarray
+    item_indptr: np.ndarray
+    item_rules: np.ndarray
+    consequent_indptr: np.ndarray
+    consequent_codes: np.ndarray
+
+    @classmethod
+    def build(
+        cls, antecedents: Sequence[frozenset[str]], consequents: Sequence[frozenset[str]]
+    ) -> ItemPostings:
+        labels = sorted(set().union(*antecedents, *consequents))
+        codes = {label: code for code, label in enumerate(labels)}
+        sizes = np.fromiter(map(len, antecedents), dtype=np.int64, count=len(antecedents))
+        antecedent_codes = np.fromiter(
+            (codes[item] for items in antecedents for item in items),
+            dtype=np.int64,
+            count=int(sizes.sum()),
+        )
+        rule_ids = np.repeat(np.arange(len(antecedents), dtype=np.int64), sizes)
+        by_item = np.argsort(antecedent_codes, kind="stable")
+        consequent_sizes = np.fromiter(map(len, consequents), dtype=np.int64)
+        return cls(
+            labels=np.asarray(labels, dtype=object),
+            codes=codes,
+            antecedent_sizes=sizes,
+            item_indptr=np.concatenate(
+                ([0], np.cumsum(np.bincount(antecedent_codes, minlength=len(labels))))
+            ),
+            item_rules=rule_ids[by_item],
+            consequent_indptr=np.concatenate(([0], np.cumsum(consequent_sizes))),
+            consequent_codes=np.fromiter(
+                (codes[item] for items in consequents for item in items),
+                dtype=np.int64,
+                count=int(consequent_sizes.sum()),
+            ),
+        )
+
+    @classmethod
+    def from_codes(
+        cls,
+        labels: np.ndarray,
+        antecedent_indptr: np.ndarray,
+        antecedent_codes: np.ndarray,
+        consequent_indptr: np.ndarray,
+        consequent_codes: np.ndarray,
+    ) -> ItemPostings:
+        """Postings from CSR rule arrays whose codes index the sorted ``labels``.
+
+        A code repeated within one rule, such as two product IDs sharing a
+        display name, counts once, as it does in an itemset.
+        """
+        n_labels = len(labels)
+        sides = []
+        for indptr, codes in (
+            (antecedent_indptr, antecedent_codes),
+            (consequent_indptr, consequent_codes),
+        ):
+            n_rules = len(indptr) - 1
+            rule_ids = np.repeat(np.arange(n_rules, dtype=np.int64), np.diff(indptr))
+            keys = _sorted_unique(rule_ids * n_labels + np.asarray(codes, dtype=np.int64))
+            rule_of, code_of = keys // n_labels, keys % n_labels
+            sides.append((rule_of, code_of, np.bincount(rule_of, minlength=n_rules)))
+        (rule_ids, antecedents, sizes), (_, consequents, consequent_sizes) = sides
+        by_item = np.argsort(antecedents, kind="stable")
+        return cls(
+            labels=np.asarray(labels, dtype=object),
+            codes={label: code for code, label in enumerate(labels.tolist())},
+            antecedent_sizes=sizes,
+            item_indptr=np.concatenate(
+                ([0], np.cumsum(np.bincount(antecedents, minlength=n_labels)))
+            ),
+            item_rules=rule_ids[by_item],
+            consequent_indptr=np.concatenate(([0], np.cumsum(consequent_sizes))),
+            consequent_codes=consequents,
+        )
+
+    def cart_codes(self, cart: Iterable[str]) -> np.ndarray:
+        return np.unique(
+            np.fromiter((self.codes[item] for item in cart if item in self.codes), dtype=np.int64)
+        )
+
+    def matching_rules(self, cart_codes: np.ndarray) -> np.ndarray:
+        """Ascending IDs of rules whose whole antecedent is in the cart.
+
+        Only the posting lists of cart items are read; a rule matches when
+        every one of its antecedent items was hit.
+        """
+        starts = self.item_indptr[cart_codes]
+        hits = self.item_rules[_ranges(starts, self.item_indptr[cart_codes + 1] - starts)]
+        rule_ids, counts = np.unique(hits, return_counts=True)
+        return rule_ids[counts == self.antecedent_sizes[rule_ids]]
+
+
+@dataclass(frozen=True, slots=True)
+class RuleIndex:
+    """Association rules indexed once for repeated cart lookups.
+
+    ``quality`` is each rule's ``support * confidence * max(lift, 0)`` weight.
+    Name postings exist only when the rules carry product-name itemsets.
+    """
+
+    quality: np.ndarray
+    ids: ItemPostings
+    names: ItemPostings | None
+
+    @classmethod
+    def from_rules(cls, rules: pd.DataFrame) -> RuleIndex:
+        prepared = _prepare_rules(rules)
+        numeric = {
+            column: pd.to_numeric(prepared[column], errors="raise").to_numpy(dtype=float)
+            for column in ("support", "confidence", "lift")
+        }
+        has_names = {"antecedent_name_items", "consequent_name_items"}.issubset(
+            prepared.columns
+        )
+        return cls(
+            quality=numeric["support"] * numeric["confidence"] * np.maximum(numeric["lift"], 0.0),
+            ids=ItemPostings.build(
+                prepared["antecedent_items"].tolist(), prepared["consequent_items"].tolist()
+            ),
+            names=ItemPostings.build(
+                prepared["antecedent_name_items"].tolist(),
+                prepared["consequent_name_items"].tolist(),
+            )
+            if has_names
+            else None,
+        )
+
+    @classmethod
+    def from_arrays(cls, arrays: RuleArrays) -> RuleIndex:
+        """Index a binary rule store without materializing per-rule itemsets."""
+        ids = _sorted_unique(np.concatenate((arrays.antecedent_items, arrays.consequent_items)))
+        id_labels = ids.astype(str)
+        order = np.argsort(id_labels, kind="stable")
+        id_codes = np.empty(len(ids), dtype=np.int64)
+        id_codes[order] = np.arange(len(ids))
+        positions = {
+            side: np.searchsorted(ids, getattr(arrays, f"{side}_items"))
+            for side in ("antecedent", "consequent")
+        }
+        names = None
+        if arrays.names is not None:
+            id_names = arrays.names.decode()[np.searchsorted(arrays.names.ids, ids)]
+            name_labels, name_codes = np.unique(id_names.astype(str), return_inverse=True)
+            names = ItemPostings.from_codes(
+                name_labels,
+                arrays.antecedent_indptr,
+                name_codes[positions["antecedent"]],
+                arrays.consequent_indptr,
+                name_codes[positions["consequent"]],
+            )
+        metrics = {
+            column: np.asarray(arrays.metrics[column], dtype=float)
+            for column in ("support", "confidence", "lift")
+        }
+        return cls(
+            quality=metrics["support"] * metrics["confidence"] * np.maximum(metrics["lift"], 0.0),
+            ids=ItemPostings.from_codes(
+                id_labels[order],
+                arrays.antecedent_indptr,
+                id_codes[positions["antecedent"]],
+                arrays.consequent_indptr,
+                id_codes[positions["consequent"]],
+            ),
+            names=names,
+        )
+
+    def __len__(self) -> int:
+        return len(self.quality)
+
+    def resolve_item_space(self, cart: frozenset[str], item_space: str = "auto") -> str:
+        """``id`` or ``name``; ``auto`` picks names when any cart item is a known name."""
+        if item_space not in {"auto", "id", "name"}:
+            raise ValueError("item_space must be one of: auto, id, name")
+        if item_space == "name":
+            if self.names is None:
+                raise RecommendationDataError("Rules do not contain product-name itemsets")
+            return "name"
+        if item_space == "id" or self.names is None:
+            return "id"
+        return "name" if any(item in self.names.codes for item in cart) else "id"
+
+    def recommend(
+        self, cart_items: Iterable[object], n: int = 5, *, item_space: str = "auto"
+    ) -> list[str]:
+        if n <= 0:
+            raise ValueError("n must be positive")
+        cart = frozenset(str(item) for item in cart_items)
+        if not cart or not len(self):
+            return []
+        postings = self.names if self.resolve_item_space(cart, item_space) == "name" else self.ids
+        cart_codes = postings.cart_codes(cart)
+        matched = postings.matching_rules(cart_codes)
+        starts = postings.consequent_indptr[matched]
+        lengths = postings.consequent_indptr[matched + 1] - starts
+        products = postings.consequent_codes[_ranges(starts, lengths)]
+        weights = np.repeat(self.quality[matched], lengths)
+        keep = ~np.isin(products, cart_codes)
+        # Rules are visited in file order, so bincount adds each product's
+        # weights in the same order as the original per-rule loop.
+        distinct, inverse = np.unique(products[keep], return_inverse=True)
+        scores = np.bincount(inverse, weights=weights[keep], minlength=len(distinct))
+        order = np.lexsort((distinct, -scores))[:n]
+        return postings.labels[distinct[order]].tolist()
+
+
+def load_rule_index(path: Path | str | None = None) -> RuleIndex:
+    """Index rules from a rule store, read as flat arrays, or from an exported CSV."""
+    rules_path = _rules_path(path)
+    if is_rule_store(rules_path):
+        return RuleIndex.from_arrays(load_rule_store(rules_path))
+    return RuleIndex.from_rules(load_association_rules(rules_path))
 
 
 def recommend_by_rules(
     cart_items: Iterable[object],
-    rules: pd.DataFrame,
+    rules: pd.DataFrame | RuleIndex,
     n: int = 5,
     *,
     item_space: str = "auto",
 ) -> list[str]:
-    """Apply a rule only when its complete antecedent is an exact cart subset."""
+    """Apply a rule only when its complete antecedent is an exact cart subset.
+
+    Pass a :class:`RuleIndex` when serving repeated requests; a rule frame is
+    indexed on every call.
+    """
     if n <= 0:
         raise ValueError("n must be positive")
-    prepared = _prepare_rules(rules)
-    if prepared.empty:
-        return []
-    cart = frozenset(str(item) for item in cart_items)
-    if not cart:
-        return []
-    antecedent_column, consequent_column = _rule_item_columns(cart, prepared, item_space)
-
-    scores: defaultdict[str, float] = defaultdict(float)
-    for row in prepared.itertuples(index=False):
-        antecedents = getattr(row, antecedent_column)
-        if not antecedents or not antecedents.issubset(cart):
-            continue
-        quality = float(row.support) * float(row.confidence) * max(float(row.lift), 0.0)
-        for product in getattr(row, consequent_column):
-            if product not in cart:
-                scores[product] += quality
-    return [
-        product
-        for product, _ in sorted(scores.items(), key=lambda pair: (-pair[1], pair[0]))[:n]
-    ]
+    index = rules if isinstance(rules, RuleIndex) else RuleIndex.from_rules(rules)
+    return index.recommend(cart_items, n, item_space=item_space)
 
 
 def _create_cluster_table(connection: Connection, members: pd.DataFrame) -> None:
@@ -194,59 +495,88 @@ def _create_cluster_table(connection: Connection, members: pd.DataFrame) -> None
         connection.execute(statement, records[start : start + 5_000])
 
 
+def query_cluster_popularity(
+    engine: Engine, members: pd.DataFrame, candidate_limit: int
+) -> pd.DataFrame:
+    """The ``candidate_limit`` most-ordered products of every cluster in ``members``.
+
+    Rows are ordered by cluster and then by distinct orders, reorder rate and
+    product ID, so each cluster's rows are its popularity ranking.  This is the
+    live fallback when no ``cluster_popularity.csv`` was precomputed.
+    """
+    query = text(
+        f"""
+        SELECT cluster_id AS cluster, product_id, product_name, order_count, reorder_rate
+        FROM (
+            SELECT
+                counts.*,
+                ROW_NUMBER() OVER (
+                    PARTITION BY cluster_id
+                    ORDER BY order_count DESC, reorder_rate DESC, product_id
+                ) AS popularity_rank
+            FROM (
+                SELECT
+                    members.cluster_id,
+                    products.product_id,
+                    products.product_name,
+                    COUNT(DISTINCT details.order_id) AS order_count,
+                    AVG(details.reordered) AS reorder_rate
+                FROM {TEMP_CLUSTER_TABLE} members
+                JOIN Fact_Orders orders ON members.user_id = orders.user_id
+                JOIN Fact_Order_Details details ON orders.order_id = details.order_id
+                JOIN Dim_Product products ON details.product_id = products.product_id
+                GROUP BY members.cluster_id, products.product_id, products.product_name
+            ) counts
+        ) ranked
+        WHERE popularity_rank <= :candidate_limit
+        ORDER BY cluster_id, popularity_rank
+        """
+    )
+    with engine.begin() as connection:
+        _create_cluster_table(connection, members)
+        try:
+            return pd.read_sql(
+                query, connection, params={"candidate_limit": candidate_limit}
+            )
+        finally:
+            connection.execute(text(f"DROP TEMPORARY TABLE IF EXISTS {TEMP_CLUSTER_TABLE}"))
+
+
 def recommend_by_cluster(
     user_id: int,
-    clusters: pd.DataFrame,
+    clusters: pd.DataFrame | ClusterIndex,
     n: int = 5,
     *,
     engine: Engine | None = None,
     settings: Settings | None = None,
     exclude_items: Iterable[object] = (),
     item_space: str = "name",
+    popularity: pd.DataFrame | None = None,
 ) -> list[str]:
-    """Rank products among users in the same cluster via a connection-local table."""
+    """Rank the products most ordered by the user's cluster, minus excluded items.
+
+    With precomputed ``popularity`` (see :func:`load_cluster_popularity`) this is
+    a top-N read; otherwise the ranking is queried live through a
+    connection-local member table.
+    """
     if n <= 0:
         raise ValueError("n must be positive")
     if item_space not in {"id", "name"}:
         raise ValueError("item_space must be one of: id, name")
-    labels = load_cluster_labels_from_frame(clusters)
-    user_rows = labels.loc[labels["user_id"].eq(int(user_id)), "cluster"]
-    if user_rows.empty:
+    labels = _cluster_index(clusters)
+    user_cluster = labels.clusters_of([int(user_id)]).iloc[0]
+    if pd.isna(user_cluster):
         return []
-    cluster_id = int(user_rows.iloc[0])
-    members = labels.loc[labels["cluster"].eq(cluster_id)]
+    cluster_id = int(user_cluster)
     excluded = frozenset(str(item) for item in exclude_items)
-    resolved = settings or get_settings()
-    warehouse_engine = engine or get_engine(resolved)
-    candidate_limit = max(50, n * 10)
-    query = text(
-        f"""
-        SELECT
-            products.product_id,
-            products.product_name,
-            COUNT(DISTINCT details.order_id) AS order_count,
-            AVG(details.reordered) AS reorder_rate
-        FROM {TEMP_CLUSTER_TABLE} members
-        JOIN Fact_Orders orders ON members.user_id = orders.user_id
-        JOIN Fact_Order_Details details ON orders.order_id = details.order_id
-        JOIN Dim_Product products ON details.product_id = products.product_id
-        WHERE members.cluster_id = :cluster_id
-        GROUP BY products.product_id, products.product_name
-        ORDER BY order_count DESC, reorder_rate DESC, products.product_id
-        LIMIT :candidate_limit
-        """
-    )
-
-    with warehouse_engine.begin() as connection:
-        _create_cluster_table(connection, members)
-        try:
-            candidates = pd.read_sql(
-                query,
-                connection,
-                params={"cluster_id": cluster_id, "candidate_limit": candidate_limit},
-            )
-        finally:
-            connection.execute(text(f"DROP TEMPORARY TABLE IF EXISTS {TEMP_CLUSTER_TABLE}"))
+    if popularity is not None:
+        candidates = popularity.loc[popularity["cluster"].eq(cluster_id)]
+    else:
+        candidates = query_cluster_popularity(
+            engine or get_engine(settings or get_settings()),
+            labels.members([cluster_id]),
+            cluster_candidate_limit(n),
+        )
     if candidates.empty:
         return []
     recommendations = []
@@ -259,6 +589,11 @@ def recommend_by_cluster(
     return recommendations[:n]
 
 
+def cluster_candidate_limit(n: int) -> int:
+    """Popular products fetched per cluster; extra rows absorb cart exclusions."""
+    return max(50, n * 10)
+
+
 def load_cluster_labels_from_frame(labels: pd.DataFrame) -> pd.DataFrame:
     required = {"user_id", "cluster"}
     missing = sorted(required.difference(labels.columns))
@@ -277,11 +612,112 @@ def load_cluster_labels_from_frame(labels: pd.DataFrame) -> pd.DataFrame:
     return prepared.drop_duplicates("user_id")
 
 
+@dataclass(frozen=True, slots=True)
+class ClusterIndex:
+    """Cluster labels validated once and keyed by user for repeated lookups."""
+
+    user_clusters: pd.Series
+
+    @classmethod
+    def from_labels(cls, labels: pd.DataFrame) -> ClusterIndex:
+        prepared = load_cluster_labels_from_frame(labels)
+        return cls(prepared.set_index("user_id")["cluster"].sort_index())
+
+    def __len__(self) -> int:
+        return len(self.user_clusters)
+
+    def clusters_of(self, user_ids: Sequence[int]) -> pd.Series:
+        """Cluster of every user in order, ``NaN`` for unlabelled users."""
+        return self.user_clusters.reindex(user_ids)
+
+    def members(self, cluster_ids: Iterable[int]) -> pd.DataFrame:
+        """``user_id``/``cluster`` rows of every user in ``cluster_ids``."""
+        labels = self.user_clusters
+        return labels[labels.isin(list(cluster_ids))].rename("cluster").reset_index()
+
+
+def load_cluster_index(path: Path | str | None = None) -> ClusterIndex:
+    return ClusterIndex.from_labels(load_cluster_labels(path))
+
+
+def _cluster_index(clusters: pd.DataFrame | ClusterIndex) -> ClusterIndex:
+    return clusters if isinstance(clusters, ClusterIndex) else ClusterIndex.from_labels(clusters)
+
+
+@dataclass(frozen=True, slots=True)
+class RegisteredArtifacts:
+    """Indexed rules, cluster labels and popularity of two matching registry runs."""
+
+    rules: RuleIndex
+    clusters: ClusterIndex
+    popularity: pd.DataFrame | None
+    rules_run: RunManifest
+    clusters_run: RunManifest
+
+
+def load_registered(
+    registry: ArtifactRegistry,
+    *,
+    rules_digest: str | None = None,
+    clusters_digest: str | None = None,
+    allow_unknown_load: bool = False,
+) -> RegisteredArtifacts:
+    """Current (or the given) rule and cluster runs, with indexes from the registry cache.
+
+    Runs mined from different warehouse loads are rejected, since their
+    product IDs and users need not line up.  A run without a recorded ETL
+    load cannot be checked, so it is rejected too unless ``allow_unknown_load``
+    is set, which pairs the runs with a warning.
+    """
+    rules_run = registry.resolve("rules", rules_digest)
+    clusters_run = registry.resolve("clusters", clusters_digest)
+    unknown = [run for run in (rules_run, clusters_run) if run.etl_run_id is None]
+    if unknown:
+        message = (
+            " and ".join(f"{run.kind} run {run.digest[:12]}" for run in unknown)
+            + " record no ETL load, so the runs cannot be shown to share one"
+        )
+        if not allow_unknown_load:
+            raise RecommendationDataError(f"{message}; pass --allow-unknown-load to pair them")
+        warnings.warn(message, RuntimeWarning, stacklevel=2)
+    elif rules_run.etl_run_id != clusters_run.etl_run_id:
+        raise RecommendationDataError(
+            f"Rules run {rules_run.digest[:12]} (ETL load {rules_run.etl_run_id}) and "
+            f"clusters run {clusters_run.digest[:12]} (ETL load {clusters_run.etl_run_id}) "
+            "come from different warehouse loads"
+        )
+    popularity = None
+    if "popularity" in clusters_run.files:
+        popularity = registry.cached(
+            clusters_run.digest,
+            POPULARITY_CACHE,
+            lambda: load_cluster_popularity(
+                registry.path(clusters_run, "popularity"),
+                labels_path=registry.path(clusters_run, "labels"),
+            ),
+        )
+    return RegisteredArtifacts(
+        rules=registry.cached(
+            rules_run.digest,
+            RULE_INDEX_CACHE,
+            lambda: load_rule_index(registry.path(rules_run, "rules")),
+        ),
+        clusters=registry.cached(
+            clusters_run.digest,
+            CLUSTER_INDEX_CACHE,
+            lambda: load_cluster_index(registry.path(clusters_run, "labels")),
+        ),
+        popularity=popularity,
+        rules_run=rules_run,
+        clusters_run=clusters_run,
+    )
+
+
 def hybrid_recommend(
     user_id: int,
     cart_items: Iterable[object],
-    rules: pd.DataFrame,
-    clusters: pd.DataFrame,
+    rules: pd.DataFrame | RuleIndex,
+    clusters: pd.DataFrame | ClusterIndex,
     n: int = 10,
     *,
     engine: Engine | None = None,
@@ -290,6 +726,7 @@ def hybrid_recommend(
     cluster_weight: float = 0.4,
     rrf_k: int = 60,
     item_space: str = "auto",
+    popularity: pd.DataFrame | None = None,
 ) -> list[tuple[str, float]]:
     """Fuse independent rankings with weighted reciprocal-rank fusion."""
     if n <= 0:
@@ -299,12 +736,11 @@ def hybrid_recommend(
     if rrf_k < 0:
         raise ValueError("rrf_k must be non-negative")
     cart = frozenset(str(item) for item in cart_items)
-    prepared_rules = _prepare_rules(rules)
-    antecedent_column, _ = _rule_item_columns(cart, prepared_rules, item_space)
-    resolved_item_space = "name" if antecedent_column.startswith("antecedent_name") else "id"
+    index = rules if isinstance(rules, RuleIndex) else RuleIndex.from_rules(rules)
+    resolved_item_space = index.resolve_item_space(cart, item_space)
     rule_ranking = recommend_by_rules(
         cart,
-        prepared_rules,
+        index,
         n=n * 3,
         item_space=resolved_item_space,
     )
@@ -316,6 +752,7 @@ def hybrid_recommend(
         settings=settings,
         exclude_items=cart,
         item_space=resolved_item_space,
+        popularity=popularity,
     )
 
     scores: defaultdict[str, float] = defaultdict(float)
@@ -328,6 +765,251 @@ def hybrid_recommend(
     return sorted(scores.items(), key=lambda pair: (-pair[1], pair[0]))[:n]
 
 
+@dataclass(frozen=True, slots=True)
+class RecommendationRequest:
+    user_id: int
+    cart_items: tuple[str, ...]
+
+
+def _ranked_within(
+    requests: np.ndarray, scores: np.ndarray, ties: np.ndarray, limit: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Positions and 0-based ranks of each request's ``limit`` best rows.
+
+    Rows are ordered by descending score, then by tie-break code.
+    """
+    order = np.lexsort((ties, -scores, requests))
+    starts = np.flatnonzero(np.r_[True, requests[order][1:] != requests[order][:-1]])
+    counts = np.diff(np.r_[starts, len(order)])
+    ranks = np.arange(len(order)) - np.repeat(starts, counts)
+    return order[ranks < limit], ranks[ranks < limit]
+
+
+def _batch_rule_rankings(
+    postings: ItemPostings,
+    quality: np.ndarray,
+    carts: Sequence[frozenset[str]],
+    limit: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Request positions, products and 0-based ranks of the rule rankings.
+
+    ``carts @ antecedents.T`` counts antecedent hits per cart and rule; rules
+    with every antecedent item hit carry their quality into
+    ``matched @ consequents``, which sums product scores in rule order.  That
+    product drops zero sums, so the products each cart reaches come from the
+    same product over the all-ones ``matched`` pattern; products reached only
+    by zero-quality rules keep a score of 0, as in :meth:`RuleIndex.recommend`.
+    """
+    n_items, n_rules = len(postings.labels), len(quality)
+    cart_rows, cart_codes = [], []
+    for row, cart in enumerate(carts):
+        codes = postings.cart_codes(cart)
+        cart_rows.append(np.full(len(codes), row, dtype=np.int64))
+        cart_codes.append(codes)
+    rows, codes = np.concatenate(cart_rows), np.concatenate(cart_codes)
+    cart_matrix = sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, codes)), shape=(len(carts), n_items)
+    )
+    antecedents = sparse.csr_matrix(
+        (np.ones(len(postings.item_rules)), postings.item_rules, postings.item_indptr),
+        shape=(n_items, n_rules),
+    )
+    hits = (cart_matrix @ antecedents).tocsr()
+    hits.sort_indices()
+    hit_rows = np.repeat(np.arange(len(carts)), np.diff(hits.indptr))
+    full = hits.data == postings.antecedent_sizes[hits.indices]
+    matched_rows, matched_rules = hit_rows[full], hits.indices[full]
+    matched = sparse.csr_matrix(
+        (quality[matched_rules], (matched_rows, matched_rules)), shape=(len(carts), n_rules)
+    )
+    matched.sort_indices()
+    consequents = sparse.csr_matrix(
+        (
+            np.ones(len(postings.consequent_codes)),
+            postings.consequent_codes,
+            postings.consequent_indptr,
+        ),
+        shape=(n_rules, n_items),
+    )
+    reach = (
+        sparse.csr_matrix(
+            (np.ones(len(matched_rules)), (matched_rows, matched_rules)),
+            shape=(len(carts), n_rules),
+        )
+        @ consequents
+    ).tocsr()
+    reach.sort_indices()
+    reached = reach.tocoo()
+    request = reached.row.astype(np.int64)
+    product = reached.col.astype(np.int64)
+    keys = request * n_items + product
+    scores = (matched @ consequents).tocoo()
+    score = np.zeros(len(keys))
+    score[np.searchsorted(keys, scores.row.astype(np.int64) * n_items + scores.col)] = (
+        scores.data
+    )
+    in_cart = np.isin(keys, rows * n_items + codes)
+    request, product, score = request[~in_cart], product[~in_cart], score[~in_cart]
+    kept, ranks = _ranked_within(request, score, product, limit)
+    return request[kept], postings.labels[product[kept]], ranks
+
+
+def _batch_cluster_rankings(
+    popularity: pd.DataFrame,
+    clusters: np.ndarray,
+    carts: Sequence[frozenset[str]],
+    spaces: Sequence[str],
+    limit: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Request positions, products and 0-based ranks of the cluster rankings.
+
+    Each request reads its cluster's popularity rows up to ``limit`` plus the
+    rows its cart excludes by product ID or name.
+    """
+    if popularity.empty:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, np.empty(0, dtype=object), empty
+    popularity = popularity.assign(
+        product_id=popularity["product_id"].astype(str),
+        product_name=popularity["product_name"].astype(str),
+        position=popularity.groupby("cluster").cumcount(),
+    )
+    cluster_ids = popularity["cluster"].to_numpy(dtype=np.int64)
+    boundaries = np.flatnonzero(np.r_[True, cluster_ids[1:] != cluster_ids[:-1]])
+    sizes = np.diff(np.r_[boundaries, len(cluster_ids)])
+    slot = np.searchsorted(cluster_ids[boundaries], clusters)
+    has_rows = (slot < len(boundaries)) & (
+        cluster_ids[boundaries][np.minimum(slot, len(boundaries) - 1)] == clusters
+    )
+    cart_pairs = pd.DataFrame(
+        [(row, item) for row, cart in enumerate(carts) for item in cart],
+        columns=["request", "item"],
+    ).assign(cluster=lambda frame: clusters[frame["request"].to_numpy(dtype=np.int64)])
+    excluded = pd.concat(
+        [
+            cart_pairs.merge(
+                popularity, left_on=["cluster", "item"], right_on=["cluster", column]
+            )
+            for column in ("product_id", "product_name")
+        ]
+    ).drop_duplicates(["request", "position"])
+    excluded_request = excluded["request"].to_numpy(dtype=np.int64)
+    excluded_position = excluded["position"].to_numpy(dtype=np.int64)
+    excluded_count = np.bincount(excluded_request, minlength=len(carts))
+    width = int(sizes.max()) if len(sizes) else 0
+
+    take = np.zeros(len(carts), dtype=np.int64)
+    take[has_rows] = np.minimum(sizes[slot[has_rows]], limit + excluded_count[has_rows])
+    starts = np.zeros(len(carts), dtype=np.int64)
+    starts[has_rows] = boundaries[slot[has_rows]]
+    rows = _ranges(starts, take)
+    request = np.repeat(np.arange(len(carts)), take)
+    position = rows - np.repeat(starts, take)
+    dropped = np.isin(
+        request * width + position,
+        excluded_request * width + excluded_position,
+    )
+    rows, request, position = rows[~dropped], request[~dropped], position[~dropped]
+    kept, ranks = _ranked_within(request, np.zeros(len(request)), position, limit)
+    use_names = np.asarray([space == "name" for space in spaces], dtype=bool)[request[kept]]
+    products = np.where(
+        use_names,
+        popularity["product_name"].to_numpy(dtype=object)[rows[kept]],
+        popularity["product_id"].to_numpy(dtype=object)[rows[kept]],
+    )
+    return request[kept], products, ranks
+
+
+def recommend_batch(
+    requests: Iterable[RecommendationRequest | tuple[int, Iterable[object]]],
+    rules: pd.DataFrame | RuleIndex,
+    clusters: pd.DataFrame | ClusterIndex,
+    n: int = 10,
+    *,
+    engine: Engine | None = None,
+    settings: Settings | None = None,
+    rule_weight: float = 0.6,
+    cluster_weight: float = 0.4,
+    rrf_k: int = 60,
+    item_space: str = "auto",
+    popularity: pd.DataFrame | None = None,
+) -> list[list[tuple[str, float]]]:
+    """:func:`hybrid_recommend` for many users with sparse products and one cluster query.
+
+    Carts are scored per item space as a sparse cart-by-item matrix against the
+    rule index, cluster popularity is read once for every requested cluster (or
+    taken from precomputed ``popularity``), and
+    the rank fusion runs over flat NumPy arrays.  Results are in request order
+    and equal the single-call results.
+    """
+    if n <= 0:
+        raise ValueError("n must be positive")
+    if rule_weight < 0 or cluster_weight < 0 or rule_weight + cluster_weight <= 0:
+        raise ValueError("rank-fusion weights must be non-negative with a positive sum")
+    if rrf_k < 0:
+        raise ValueError("rrf_k must be non-negative")
+    normalized = [
+        request
+        if isinstance(request, RecommendationRequest)
+        else RecommendationRequest(int(request[0]), tuple(str(item) for item in request[1]))
+        for request in requests
+    ]
+    if not normalized:
+        return []
+    index = rules if isinstance(rules, RuleIndex) else RuleIndex.from_rules(rules)
+    carts = [frozenset(str(item) for item in request.cart_items) for request in normalized]
+    spaces = [index.resolve_item_space(cart, item_space) for cart in carts]
+    limit = n * 3
+
+    parts: list[tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+    for space, postings in (("id", index.ids), ("name", index.names)):
+        members = np.flatnonzero([resolved == space for resolved in spaces])
+        if postings is None or not len(members) or not len(index):
+            continue
+        request, products, ranks = _batch_rule_rankings(
+            postings, index.quality, [carts[row] for row in members], limit
+        )
+        parts.append((members[request], products, rule_weight / (rrf_k + ranks + 1)))
+
+    labels = _cluster_index(clusters)
+    user_clusters = labels.clusters_of([request.user_id for request in normalized])
+    known = user_clusters.notna().to_numpy()
+    if known.any():
+        wanted = user_clusters[known].astype("int64").unique()
+        candidates = (
+            popularity.loc[popularity["cluster"].isin(wanted)]
+            if popularity is not None
+            else query_cluster_popularity(
+                engine or get_engine(settings or get_settings()),
+                labels.members(wanted),
+                cluster_candidate_limit(limit),
+            )
+        )
+        request, products, ranks = _batch_cluster_rankings(
+            candidates,
+            user_clusters.fillna(-1).astype("int64").to_numpy(),
+            carts,
+            spaces,
+            limit,
+        )
+        parts.append((request, products, cluster_weight / (rrf_k + ranks + 1)))
+
+    results: list[list[tuple[str, float]]] = [[] for _ in normalized]
+    if not parts:
+        return results
+    request = np.concatenate([part[0] for part in parts])
+    codes, products = pd.factorize(np.concatenate([part[1] for part in parts]), sort=True)
+    # Rule entries precede cluster entries, so each product's fused score is
+    # summed in the same order as the single-call dictionary.
+    keys, inverse = np.unique(request * len(products) + codes, return_inverse=True)
+    scores = np.bincount(inverse, weights=np.concatenate([part[2] for part in parts]))
+    fused_request, fused_code = keys // len(products), keys % len(products)
+    kept, _ = _ranked_within(fused_request, scores, fused_code, n)
+    for row, code, score in zip(fused_request[kept], fused_code[kept], scores[kept], strict=True):
+        results[row].append((str(products[code]), float(score)))
+    return results
+
+
 def evaluate_recommendations(rules: pd.DataFrame | None = None) -> dict[str, float | int]:
     prepared = load_association_rules() if rules is None else _prepare_rules(rules)
     antecedents: set[str] = set()
@@ -368,24 +1050,13 @@ def demo_recommendations(
     return recommendations
 
 
-def build_parser() -> argparse.ArgumentParser:
-    parser = argparse.ArgumentParser(description=__doc__)
-    parser.add_argument("--user-id", type=int, required=True)
-    parser.add_argument("--cart", nargs="+", required=True, help="Exact product names in the cart")
-    parser.add_argument("--top-n", type=int, default=10)
-    parser.add_argument("--rules", type=Path)
-    parser.add_argument("--clusters", type=Path)
-    parser.add_argument("--rule-weight", type=float, default=0.6)
-    parser.add_argument("--cluster-weight", type=float, default=0.4)
-    parser.add_argument("--rrf-k", type=int, default=60)
-    return parser
-
-
-def main(argv: Sequence[str] | None = None) -> int:
-    args = build_parser().parse_args(argv)
-    settings = get_settings()
-    rules = load_association_rules(args.rules)
-    clusters = load_cluster_labels(args.clusters)
+def _print_recommendations(
+    args: argparse.Namespace,
+    settings: Settings,
+    rules: RuleIndex,
+    clusters: ClusterIndex,
+    popularity: pd.DataFrame | None,
+) -> int:
     recommendations = hybrid_recommend(
         args.user_id,
         args.cart,
@@ -397,6 +1068,7 @@ def main(argv: Sequence[str] | None = None) -> int:
         cluster_weight=args.cluster_weight,
         rrf_k=args.rrf_k,
         item_space="name",
+        popularity=popularity,
     )
     if not recommendations:
         print("No recommendations matched the supplied user and cart.")
@@ -406,5 +1078,104 @@ def main(argv: Sequence[str] | None = None) -> int:
     return 0
 
 
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--cart", nargs="+", required=True, help="Exact product names in the cart")
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--rules", type=Path)
+    parser.add_argument("--clusters", type=Path)
+    parser.add_argument(
+        "--popularity",
+        type=Path,
+        help=(
+            "cluster_popularity.csv from instacart-cluster (default: next to the cluster "
+            "labels when present, otherwise ranked live in the warehouse)"
+        ),
+    )
+    parser.add_argument("--rule-weight", type=float, default=0.6)
+    parser.add_argument("--cluster-weight", type=float, default=0.4)
+    parser.add_argument("--rrf-k", type=int, default=60)
+    parser.add_argument(
+        "--strata-index",
+        type=Path,
+        help="index.json from instacart-basket-strata; picks rules for the user's stratum",
+    )
+    parser.add_argument("--order-dow", type=int, help="day of week (0-6) for time strata")
+    parser.add_argument("--order-hour", type=int, help="hour of day (0-23) for time strata")
+    parser.add_argument(
+        "--registry",
+        type=Path,
+        help=(
+            "artifact registry directory; loads the current rules and clusters runs with "
+            "cached indexes instead of --rules/--clusters/--popularity"
+        ),
+    )
+    parser.add_argument("--rules-run", help="rules run digest or prefix in --registry")
+    parser.add_argument("--clusters-run", help="clusters run digest or prefix in --registry")
+    parser.add_argument(
+        "--allow-unknown-load",
+        action="store_true",
+        help="pair --registry runs even when one records no ETL load",
+    )
+    return parser
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.registry is None and (args.rules_run or args.clusters_run or args.allow_unknown_load):
+        parser.error("--rules-run, --clusters-run and --allow-unknown-load require --registry")
+    if args.registry is not None and any(
+        option is not None
+        for option in (args.rules, args.clusters, args.popularity, args.strata_index)
+    ):
+        parser.error("--registry replaces --rules, --clusters, --popularity and --strata-index")
+    settings = get_settings()
+    if args.registry is not None:
+        registered = load_registered(
+            ArtifactRegistry(args.registry),
+            rules_digest=args.rules_run,
+            clusters_digest=args.clusters_run,
+            allow_unknown_load=args.allow_unknown_load,
+        )
+        print(
+            f"Using rules run {registered.rules_run.digest[:12]} and clusters run "
+            f"{registered.clusters_run.digest[:12]} from {args.registry}"
+        )
+        return _print_recommendations(
+            args,
+            settings,
+            registered.rules,
+            registered.clusters,
+            registered.popularity,
+        )
+    rules_path = args.rules
+    if args.strata_index is not None:
+        stratum_rules = select_stratum_rules(
+            args.strata_index,
+            user_segment=load_user_segment(get_engine(settings), args.user_id),
+            order_dow=args.order_dow,
+            order_hour=args.order_hour,
+        )
+        if stratum_rules is None:
+            print("No mined stratum matches this request; using the global rules.")
+        else:
+            rules_path = stratum_rules
+    rules = load_rule_index(rules_path)
+    clusters = load_cluster_index(args.clusters)
+    popularity_path = args.popularity or (
+        _artifact_path(args.clusters, "cluster_labels.csv").parent / "cluster_popularity.csv"
+    )
+    popularity = (
+        load_cluster_popularity(
+            popularity_path, labels_path=_artifact_path(args.clusters, "cluster_labels.csv")
+        )
+        if args.popularity is not None or popularity_path.is_file()
+        else None
+    )
+    return _print_recommendations(args, settings, rules, clusters, popularity)
+
+
 if __name__ == "__main__":
     raise SystemExit(main())
@@ -0,0 +1,380 @@
+"""Content-addressed registry of mining runs and their derived structures.
+
+The mining CLIs write fixed file names into ``mining/results/``, so a reader
+cannot tell which run produced the rules or the cluster labels it loaded.
+The registry keeps an immutable copy of every run under
+``runs/<digest>/``, where ``digest`` is the SHA-256 of the run kind, the
+ETL ``loaded_run_id`` and the bytes of its data artifacts, next to a manifest
+that records that load, the run parameters and the registry schema version.
+``refs.json`` names the current run of each kind.
+
+Structures derived from a run, such as a :class:`~mining.recommendation.RuleIndex`,
+are cached under ``cache/<digest>/`` as joblib files written atomically and
+reopened with ``mmap_mode="r"``.  A run's content never changes, so any
+process that resolves the same digest reuses the cached structure instead of
+re-deriving it.  :meth:`ArtifactRegistry.gc` removes runs that are neither
+current nor among the most recently used of their kind, with their caches.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections.abc import Callable, Iterator, Mapping, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+from time import time
+from typing import Any, TypeVar
+
+import joblib
+
+from mining.artifacts import DEFAULT_RESULTS_DIR, utc_timestamp, write_json
+
+REGISTRY_SCHEMA_VERSION = 1
+DEFAULT_REGISTRY_DIR = DEFAULT_RESULTS_DIR / "registry"
+MANIFEST_NAME = "manifest.json"
+REFS_NAME = "refs.json"
+DEFAULT_KEEP = 3
+_HASH_CHUNK_BYTES = 1 << 20
+
+T = TypeVar("T")
+
+
+class RegistryError(ValueError):
+    """Raised when a registry run is missing, ambiguous or of another schema version."""
+
+
+@dataclass(frozen=True, slots=True)
+class RunManifest:
+    """One registered run: ``files`` maps artifact names to paths inside the run."""
+
+    digest: str
+    kind: str
+    etl_run_id: str | None
+    created_at: str
+    files: Mapping[str, str] = field(default_factory=dict)
+    parameters: Mapping[str, Any] = field(default_factory=dict)
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "registry_schema_version": REGISTRY_SCHEMA_VERSION,
+            "digest": self.digest,
+            "kind": self.kind,
+            "etl_run_id": self.etl_run_id,
+            "created_at": self.created_at,
+            "files": dict(self.files),
+            "parameters": dict(self.parameters),
+        }
+
+    @classmethod
+    def from_json(cls, payload: Mapping[str, Any]) -> RunManifest:
+        return cls(
+            digest=str(payload["digest"]),
+            kind=str(payload["kind"]),
+            etl_run_id=payload.get("etl_run_id"),
+            created_at=str(payload["created_at"]),
+            files=dict(payload.get("files", {})),
+            parameters=dict(payload.get("parameters", {})),
+        )
+
+
+def _artifact_files(path: Path) -> Iterator[tuple[str, Path]]:
+    """Files of an artifact with their paths relative to it, in a stable order."""
+    if path.is_dir():
+        for child in sorted(path.rglob("*")):
+            if child.is_file():
+                yield child.relative_to(path).as_posix(), child
+    else:
+        yield "", path
+
+
+def content_digest(
+    kind: str, files: Mapping[str, Path], etl_run_id: str | None = None
+) -> str:
+    """SHA-256 over the run kind, its ETL load, artifact names and every data artifact byte.
+
+    JSON files, the run metadata and store manifests, are named but not read:
+    their ``created_at`` and timings differ between runs that mined identical data.
+    The ETL load is hashed so that identical artifacts mined after a reload
+    become a new run recording that load, not the earlier run's.
+    """
+    digest = hashlib.sha256(kind.encode("utf-8"))
+    digest.update(f"\0etl_run_id={etl_run_id or ''}\0".encode())
+    for name in sorted(files):
+        for relative, path in _artifact_files(Path(files[name])):
+            digest.update(f"\0{name}/{relative}\0".encode())
+            if path.suffix == ".json":
+                continue
+            with path.open("rb") as handle:
+                while chunk := handle.read(_HASH_CHUNK_BYTES):
+                    digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _replace_json(path: Path, payload: Mapping[str, Any]) -> None:
+    handle, staging = tempfile.mkstemp(prefix=f".{path.name}-", dir=path.parent)
+    os.close(handle)
+    try:
+        write_json(Path(staging), payload)
+        os.replace(staging, path)
+    except BaseException:
+        Path(staging).unlink(missing_ok=True)
+        raise
+
+
+class ArtifactRegistry:
+    """Immutable mining runs keyed by content digest, plus a shared derived cache."""
+
+    def __init__(self, root: Path | str | None = None) -> None:
+        self.root = Path(root) if root is not None else DEFAULT_REGISTRY_DIR
+        self.runs_dir = self.root / "runs"
+        self.cache_dir = self.root / "cache"
+
+    def register(
+        self,
+        kind: str,
+        files: Mapping[str, Path | str | None],
+        *,
+        parameters: Mapping[str, Any] | None = None,
+        etl_run_id: str | None = None,
+        make_current: bool = True,
+    ) -> RunManifest:
+        """Copy a run's artifacts under their digest; identical content of one load registers once.
+
+        ``None`` entries in ``files`` are skipped, so optional artifacts can be
+        passed as they are.  Re-registering content that already exists keeps
+        the first manifest and only moves the current reference.
+        """
+        if not kind.isidentifier():
+            raise RegistryError(f"Run kind must be an identifier, got {kind!r}")
+        artifacts = {name: Path(path) for name, path in files.items() if path is not None}
+        if not artifacts:
+            raise RegistryError("A run needs at least one artifact")
+        missing = sorted(name for name, path in artifacts.items() if not path.exists())
+        if missing:
+            raise FileNotFoundError(f"Run artifacts not found: {', '.join(missing)}")
+        stored_names = [path.name for path in artifacts.values()]
+        if len(set(stored_names)) != len(stored_names):
+            raise RegistryError("Run artifacts must have distinct file names")
+
+        digest = content_digest(kind, artifacts, etl_run_id)
+        destination = self.runs_dir / digest
+        if not (destination / MANIFEST_NAME).is_file():
+            self.runs_dir.mkdir(parents=True, exist_ok=True)
+            staging = Path(tempfile.mkdtemp(prefix=f".{digest[:12]}-", dir=self.runs_dir))
+            try:
+                for path in artifacts.values():
+                    if path.is_dir():
+                        shutil.copytree(path, staging / path.name)
+                    else:
+                        shutil.copy2(path, staging / path.name)
+                manifest = RunManifest(
+                    digest=digest,
+                    kind=kind,
+                    etl_run_id=etl_run_id,
+                    created_at=utc_timestamp(),
+                    files={name: path.name for name, path in artifacts.items()},
+                    parameters=dict(parameters or {}),
+                )
+                write_json(staging / MANIFEST_NAME, manifest.to_json())
+                try:
+                    os.replace(staging, destination)
+                except OSError:
+                    # Another process registered the same content first.
+                    if not (destination / MANIFEST_NAME).is_file():
+                        raise
+                    shutil.rmtree(staging, ignore_errors=True)
+            except BaseException:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+        manifest = self.manifest(digest)
+        self._touch(digest)
+        if make_current:
+            self.set_current(kind, digest)
+        return manifest
+
+    def manifest(self, digest: str) -> RunManifest:
+        path = self.runs_dir / digest / MANIFEST_NAME
+        try:
+            payload = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError as exc:
+            raise RegistryError(f"Run {digest} is not registered in {self.root}") from exc
+        except (OSError, json.JSONDecodeError) as exc:
+            raise RegistryError(f"Run manifest at {path} is unreadable") from exc
+        if payload.get("registry_schema_version") != REGISTRY_SCHEMA_VERSION:
+            raise RegistryError(f"Run {digest} uses an unsupported registry schema")
+        return RunManifest.from_json(payload)
+
+    def runs(self, kind: str | None = None) -> list[RunManifest]:
+        """Registered runs, most recently used first."""
+        if not self.runs_dir.is_dir():
+            return []
+        manifests = [
+            self.manifest(path.parent.name)
+            for path in self.runs_dir.glob(f"*/{MANIFEST_NAME}")
+            if not path.parent.name.startswith(".")
+        ]
+        return sorted(
+            (manifest for manifest in manifests if kind is None or manifest.kind == kind),
+            key=lambda manifest: (self.last_used(manifest.digest), manifest.digest),
+            reverse=True,
+        )
+
+    def refs(self) -> dict[str, str]:
+        """The current run digest of each kind."""
+        try:
+            refs = json.loads((self.root / REFS_NAME).read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+        except (OSError, json.JSONDecodeError) as exc:
+            raise RegistryError(f"Registry references in {self.root} are unreadable") from exc
+        return {str(kind): str(digest) for kind, digest in refs.items()}
+
+    def set_current(self, kind: str, digest: str) -> None:
+        manifest = self.manifest(digest)
+        if manifest.kind != kind:
+            raise RegistryError(f"Run {digest} is a {manifest.kind} run, not {kind}")
+        self.root.mkdir(parents=True, exist_ok=True)
+        _replace_json(self.root / REFS_NAME, self.refs() | {kind: digest})
+
+    def resolve(self, kind: str, digest: str | None = None) -> RunManifest:
+        """A run by digest or unique digest prefix, else the current run of ``kind``."""
+        if digest is None:
+            current = self.refs().get(kind)
+            if current is None:
+                raise RegistryError(f"No current {kind} run is registered in {self.root}")
+            manifest = self.manifest(current)
+        else:
+            matches = (
+                sorted(path.name for path in self.runs_dir.glob(f"{digest}*"))
+                if self.runs_dir.is_dir() and digest.isalnum()
+                else []
+            )
+            if len(matches) != 1:
+                problem = "matches no run" if not matches else "is ambiguous"
+                raise RegistryError(f"Digest {digest!r} {problem} in {self.root}")
+            manifest = self.manifest(matches[0])
+        if manifest.kind != kind:
+            raise RegistryError(f"Run {manifest.digest} is a {manifest.kind} run, not {kind}")
+        self._touch(manifest.digest)
+        return manifest
+
+    def path(self, manifest: RunManifest, name: str) -> Path:
+        try:
+            return self.runs_dir / manifest.digest / manifest.files[name]
+        except KeyError as exc:
+            raise RegistryError(f"Run {manifest.digest} has no {name} artifact") from exc
+
+    def cached(self, digest: str, name: str, build: Callable[[], T]) -> T:
+        """Load the structure ``name`` derived from run ``digest``, building it once.
+
+        Arrays in cached structures are memory-mapped read-only.  Unreadable
+        cache files are rebuilt, and writes are atomic, so concurrent
+        processes at worst build the same structure twice.
+        """
+        if not name.replace("-", "_").isidentifier():
+            raise RegistryError(f"Cache name must be an identifier, got {name!r}")
+        path = self.cache_dir / digest / f"{name}.joblib"
+        if path.is_file():
+            try:
+                return joblib.load(path, mmap_mode="r")
+            except Exception:
+                # Truncated pickles fail in many ways; the run can always rebuild it.
+                path.unlink(missing_ok=True)
+        value = build()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        handle, staging = tempfile.mkstemp(prefix=f".{name}-", dir=path.parent)
+        os.close(handle)
+        try:
+            joblib.dump(value, staging)
+            os.replace(staging, path)
+        except BaseException:
+            Path(staging).unlink(missing_ok=True)
+            raise
+        return value
+
+    def last_used(self, digest: str) -> float:
+        try:
+            return (self.runs_dir / digest).stat().st_mtime
+        except FileNotFoundError:
+            return 0.0
+
+    def _touch(self, digest: str) -> None:
+        now = time()
+        os.utime(self.runs_dir / digest, (now, now))
+
+    def gc(self, *, keep: int = DEFAULT_KEEP, dry_run: bool = False) -> list[str]:
+        """Remove runs outside the ``keep`` most recently used of each kind.
+
+        Current runs are always kept.  Cache directories of removed or
+        unknown runs are removed too.  Returns the removed run digests.
+        """
+        if keep < 0:
+            raise ValueError("keep must be non-negative")
+        current = set(self.refs().values())
+        by_kind: dict[str, list[RunManifest]] = {}
+        for manifest in self.runs():
+            by_kind.setdefault(manifest.kind, []).append(manifest)
+        removed = [
+            manifest.digest
+            for manifests in by_kind.values()
+            for manifest in manifests[keep:]
+            if manifest.digest not in current
+        ]
+        if dry_run:
+            return removed
+        for digest in removed:
+            shutil.rmtree(self.runs_dir / digest, ignore_errors=True)
+        if self.cache_dir.is_dir():
+            for cache in self.cache_dir.iterdir():
+                if not (self.runs_dir / cache.name / MANIFEST_NAME).is_file():
+                    shutil.rmtree(cache, ignore_errors=True)
+        return removed
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="List or garbage-collect registered mining runs.")
+    parser.add_argument("--registry", type=Path, default=DEFAULT_REGISTRY_DIR)
+    parser.add_argument("--gc", action="store_true", help="remove unused runs and their caches")
+    parser.add_argument(
+        "--keep",
+        type=int,
+        default=DEFAULT_KEEP,
+        help="most recently used runs kept per kind, besides the current one",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="report what --gc would remove")
+    return parser
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.keep < 0:
+        parser.error("--keep must be non-negative")
+    registry = ArtifactRegistry(args.registry)
+    if args.gc:
+        removed = registry.gc(keep=args.keep, dry_run=args.dry_run)
+        verb = "Would remove" if args.dry_run else "Removed"
+        print(f"{verb} {len(removed)} run(s) from {registry.root}")
+        for digest in removed:
+            print(f"  {digest}")
+        return 0
+    current = set(registry.refs().values())
+    runs = registry.runs()
+    if not runs:
+        print(f"No runs are registered in {registry.root}")
+    for manifest in runs:
+        marker = "*" if manifest.digest in current else " "
+        print(
+            f"{marker} {manifest.digest[:12]}  {manifest.kind:<10} "
+            f"etl_run_id={manifest.etl_run_id}  created_at={manifest.created_at}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,279 @@
+"""Binary columnar association-rule artifacts, memory-mapped on load.
+
+``association_rules.csv`` stores itemsets as JSON text cells, so saving
+serializes every rule in Python and loading decodes every cell again.  The
+rule store keeps the same rules as flat ``.npy`` arrays in one directory:
+
+- ``antecedent_indptr``/``antecedent_items`` and ``consequent_indptr``/
+  ``consequent_items`` hold integer product IDs in CSR layout, where rule
+  ``i`` owns ``items[indptr[i]:indptr[i + 1]]`` in ascending ID order;
+- one ``float64`` array per metric column (``support``, ``confidence``, ...);
+- ``name_ids``, ``name_offsets`` and ``name_bytes`` form a dictionary of the
+  UTF-8 display name of every product the rules mention.
+
+Arrays are written and read as whole columns and opened with
+``mmap_mode="r"``, so loading costs a manifest read and a few ``mmap`` calls
+regardless of the rule count.  The CSV stays available as a human-readable
+export through :func:`mining.market_basket.save_rules`.
+"""
+
+from __future__ import annotations
+
+import json
+import shutil
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass, field
+from itertools import chain
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from mining.artifacts import (
+    DEFAULT_RESULTS_DIR,
+    publish_directory,
+    staging_directory,
+    utc_timestamp,
+    write_json,
+)
+
+RULE_STORE_SCHEMA_VERSION = 1
+RULE_STORE_DIRNAME = "association_rules"
+MANIFEST_NAME = "manifest.json"
+METRIC_COLUMNS = ("support", "confidence", "lift", "leverage", "conviction")
+REQUIRED_METRICS = ("support", "confidence", "lift")
+_SIDES = ("antecedent", "consequent")
+
+
+class RuleStoreError(ValueError):
+    """Raised when a rule store is missing, incomplete or of another schema version."""
+
+
+@dataclass(frozen=True, slots=True)
+class ProductNames:
+    """Display names of product IDs: name ``i`` is ``data[offsets[i]:offsets[i + 1]]``."""
+
+    ids: np.ndarray
+    offsets: np.ndarray
+    data: np.ndarray
+
+    @classmethod
+    def from_catalog(cls, ids: np.ndarray, catalog: Mapping[str, str]) -> ProductNames:
+        encoded = [catalog.get(str(item), f"product:{item}").encode("utf-8") for item in ids]
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        return cls(
+            ids=np.asarray(ids, dtype=np.int64),
+            offsets=np.concatenate(([0], np.cumsum(lengths))).astype(np.int64),
+            data=np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def decode(self) -> np.ndarray:
+        """Names aligned with :attr:`ids` as a string array."""
+        text = bytes(self.data)
+        bounds = self.offsets.tolist()
+        return np.asarray(
+            [
+                text[start:stop].decode("utf-8")
+                for start, stop in zip(bounds[:-1], bounds[1:], strict=True)
+            ],
+            dtype=object,
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class RuleArrays:
+    """Association rules as CSR item arrays, metric columns and an optional name dictionary."""
+
+    antecedent_indptr: np.ndarray
+    antecedent_items: np.ndarray
+    consequent_indptr: np.ndarray
+    consequent_items: np.ndarray
+    metrics: Mapping[str, np.ndarray] = field(default_factory=dict)
+    names: ProductNames | None = None
+
+    def __len__(self) -> int:
+        return len(self.antecedent_indptr) - 1
+
+    @classmethod
+    def from_rules(
+        cls, rules: pd.DataFrame, *, catalog: Mapping[str, str] | None = None
+    ) -> RuleArrays:
+        """Encode an ``antecedents``/``consequents`` rule frame with integer product IDs."""
+        sides = {}
+        for side in _SIDES:
+            itemsets = rules[f"{side}s"]
+            lengths = np.fromiter(map(len, itemsets), dtype=np.int64, count=len(itemsets))
+            try:
+                items = np.fromiter(
+                    map(int, chain.from_iterable(itemsets)),
+                    dtype=np.int64,
+                    count=int(lengths.sum()),
+                )
+            except ValueError as exc:
+                raise RuleStoreError("Rule items must be integer product IDs") from exc
+            rule_ids = np.repeat(np.arange(len(itemsets)), lengths)
+            sides[side] = (
+                np.concatenate(([0], np.cumsum(lengths))).astype(np.int64),
+                items[np.lexsort((items, rule_ids))],
+            )
+        metrics = {
+            column: pd.to_numeric(rules[column], errors="raise").to_numpy(dtype=np.float64)
+            for column in METRIC_COLUMNS
+            if column in rules.columns
+        }
+        names = None
+        if catalog is not None:
+            mentioned = np.union1d(sides["antecedent"][1], sides["consequent"][1])
+            names = ProductNames.from_catalog(mentioned, catalog)
+        return cls(
+            antecedent_indptr=sides["antecedent"][0],
+            antecedent_items=sides["antecedent"][1],
+            consequent_indptr=sides["consequent"][0],
+            consequent_items=sides["consequent"][1],
+            metrics=metrics,
+            names=names,
+        )
+
+    def itemsets(self, side: str, *, names: bool = False) -> list[frozenset[str]]:
+        """One frozenset per rule of string product IDs, or of display names."""
+        indptr = getattr(self, f"{side}_indptr")
+        items = np.asarray(getattr(self, f"{side}_items"))
+        if names:
+            if self.names is None:
+                raise RuleStoreError("Rule store has no product-name dictionary")
+            labels = self.names.decode()[np.searchsorted(self.names.ids, items)]
+        else:
+            labels = items.astype(str).astype(object)
+        bounds = np.asarray(indptr).tolist()
+        values = labels.tolist()
+        return [
+            frozenset(values[start:stop])
+            for start, stop in zip(bounds[:-1], bounds[1:], strict=True)
+        ]
+
+    def to_rules(self) -> pd.DataFrame:
+        """The rules as an ``antecedents``/``consequents`` frame of string product IDs."""
+        frame = pd.DataFrame(
+            {
+                "antecedents": self.itemsets("antecedent"),
+                "consequents": self.itemsets("consequent"),
+            }
+        )
+        for column, values in self.metrics.items():
+            frame[column] = np.asarray(values)
+        return frame
+
+    def catalog(self) -> dict[str, str] | None:
+        """The name dictionary as a product-ID-to-name mapping."""
+        if self.names is None:
+            return None
+        return dict(zip(self.names.ids.astype(str).tolist(), self.names.decode(), strict=True))
+
+
+def is_rule_store(path: Path | str) -> bool:
+    return (Path(path) / MANIFEST_NAME).is_file()
+
+
+def default_rules_path(directory: Path | str | None = None) -> Path:
+    """The rule store in ``directory`` when present, else its ``association_rules.csv``."""
+    base = Path(directory) if directory is not None else DEFAULT_RESULTS_DIR
+    store = base / RULE_STORE_DIRNAME
+    return store if is_rule_store(store) else base / "association_rules.csv"
+
+
+def save_rule_store(
+    rules: pd.DataFrame | RuleArrays,
+    directory: Path | str,
+    *,
+    catalog: Mapping[str, str] | None = None,
+) -> Path:
+    """Write rules as ``.npy`` columns plus a manifest, then swap ``directory`` to them."""
+    arrays = (
+        rules if isinstance(rules, RuleArrays) else RuleArrays.from_rules(rules, catalog=catalog)
+    )
+    if not len(arrays):
+        raise RuleStoreError("Cannot save empty rules")
+    missing = [column for column in REQUIRED_METRICS if column not in arrays.metrics]
+    if missing:
+        raise RuleStoreError(f"Rules missing metric columns: {', '.join(missing)}")
+    destination = Path(directory)
+    staging = staging_directory(destination)
+    try:
+        columns = {
+            f"{side}_{part}": getattr(arrays, f"{side}_{part}")
+            for side in _SIDES
+            for part in ("indptr", "items")
+        }
+        columns.update(arrays.metrics)
+        if arrays.names is not None:
+            columns.update(
+                name_ids=arrays.names.ids,
+                name_offsets=arrays.names.offsets,
+                name_bytes=arrays.names.data,
+            )
+        for name, values in columns.items():
+            np.save(staging / f"{name}.npy", np.ascontiguousarray(values), allow_pickle=False)
+        write_json(
+            staging / MANIFEST_NAME,
+            {
+                "rule_store_schema_version": RULE_STORE_SCHEMA_VERSION,
+                "created_at": utc_timestamp(),
+                "rules": len(arrays),
+                "metrics": list(arrays.metrics),
+                "names": arrays.names is not None,
+            },
+        )
+        publish_directory(staging, destination)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return destination
+
+
+def _load_arrays(directory: Path, names: Iterable[str], mode: str | None) -> dict[str, np.ndarray]:
+    try:
+        return {
+            name: np.load(directory / f"{name}.npy", mmap_mode=mode, allow_pickle=False)
+            for name in names
+        }
+    except (OSError, ValueError) as exc:
+        raise RuleStoreError(f"Rule store at {directory} is incomplete: {exc}") from exc
+
+
+def load_rule_store(directory: Path | str, *, mmap: bool = True) -> RuleArrays:
+    """Open a rule store read-only, memory-mapped unless ``mmap`` is false."""
+    path = Path(directory)
+    try:
+        manifest = json.loads((path / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except FileNotFoundError as exc:
+        raise FileNotFoundError(
+            f"Rule store not found at {path}; run instacart-basket first"
+        ) from exc
+    except (OSError, json.JSONDecodeError) as exc:
+        raise RuleStoreError(f"Rule store manifest at {path} is unreadable") from exc
+    if manifest.get("rule_store_schema_version") != RULE_STORE_SCHEMA_VERSION:
+        raise RuleStoreError(
+            f"Rule store at {path} uses an unsupported schema; rerun market-basket mining"
+        )
+    mode = "r" if mmap else None
+    core = _load_arrays(
+        path, [f"{side}_{part}" for side in _SIDES for part in ("indptr", "items")], mode
+    )
+    metrics = _load_arrays(path, manifest.get("metrics", []), mode)
+    names = None
+    if manifest.get("names"):
+        dictionary = _load_arrays(path, ("name_ids", "name_offsets", "name_bytes"), mode)
+        names = ProductNames(
+            dictionary["name_ids"], dictionary["name_offsets"], dictionary["name_bytes"]
+        )
+    n_rules = int(manifest.get("rules", -1))
+    for side in _SIDES:
+        indptr = core[f"{side}_indptr"]
+        if len(indptr) != n_rules + 1 or int(indptr[-1]) != len(core[f"{side}_items"]):
+            raise RuleStoreError(f"Rule store at {path} has inconsistent {side} offsets")
+    if any(len(values) != n_rules for values in metrics.values()):
+        raise RuleStoreError(f"Rule store at {path} has metric columns of the wrong length")
+    return RuleArrays(**core, metrics=metrics, names=names)
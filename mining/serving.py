@@ -0,0 +1,582 @@
+"""Long-lived local recommendation server with hot artifact reload and metrics.
+
+``instacart-recommend`` pays for imports, CSV/JSON decoding, label validation
+and a new engine on every invocation.  This module loads the artifacts once
+into a :class:`RuleIndex`, a :class:`ClusterIndex` and the optional cluster
+popularity table, keeps one pooled warehouse engine for live cluster queries,
+and answers requests over the standard-library HTTP server:
+
+``GET /recommend?user_id=42&cart=Banana&cart=Milk&n=10``
+    One hybrid recommendation, identical to :func:`hybrid_recommend`.
+``POST /recommend/batch``
+    ``{"requests": [{"user_id": 42, "cart": ["Banana"]}], "n": 10}`` answered
+    with :func:`recommend_batch`.
+``GET /metrics``
+    Request counts and latency histograms in the Prometheus text format.
+``GET /healthz``
+    Sizes and load time of the current artifact snapshot.
+
+Artifact files are re-checked at most every ``reload_interval`` seconds; when
+their modification time or size changes, one request thread rebuilds the
+indexes while the others keep serving the previous snapshot.  Cluster labels
+and popularity are one set: when ``clustering_metadata.json``, which
+``instacart-cluster`` writes last, sits next to the labels, only a change to it
+triggers a reload, and the labels must match the digest it records.  A reload
+that fails leaves the previous snapshot in place and is counted in the metrics.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import ipaddress
+import json
+import threading
+from collections import defaultdict
+from collections.abc import Sequence
+from dataclasses import dataclass
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from time import monotonic, perf_counter, time
+from typing import Any, Final
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+from sqlalchemy.engine import Engine
+
+from etl.config import Settings, get_engine, get_settings
+from mining.artifacts import DEFAULT_RESULTS_DIR, file_digest, utc_timestamp
+from mining.recommendation import (
+    ClusterIndex,
+    RecommendationDataError,
+    RecommendationRequest,
+    RuleIndex,
+    hybrid_recommend,
+    load_cluster_index,
+    load_cluster_popularity,
+    load_rule_index,
+    recommend_batch,
+)
+from mining.rule_store import MANIFEST_NAME, default_rules_path, is_rule_store
+
+DEFAULT_HOST: Final = "127.0.0.1"
+DEFAULT_PORT: Final = 8765
+DEFAULT_RELOAD_INTERVAL: Final = 2.0
+CLUSTERING_METADATA_NAME: Final = "clustering_metadata.json"
+MAX_BATCH_REQUESTS: Final = 10_000
+LATENCY_BUCKETS: Final = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)
+ROUTES: Final = ("/recommend", "/recommend/batch", "/metrics", "/healthz")
+
+Signature = tuple[tuple[str, int, int] | None, ...]
+
+
+class LatencyHistogram:
+    """Cumulative-bucket latency histogram in seconds, not thread-safe on its own."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        if not buckets or list(buckets) != sorted(set(buckets)):
+            raise ValueError("buckets must be strictly increasing")
+        self.buckets = tuple(float(bound) for bound in buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        slot = next(
+            (position for position, bound in enumerate(self.buckets) if seconds <= bound),
+            len(self.buckets),
+        )
+        self.counts[slot] += 1
+        self.total += seconds
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """``(le, count)`` pairs including the ``+Inf`` bucket."""
+        running = 0
+        rows = []
+        for bound, count in zip((*map(repr, self.buckets), "+Inf"), self.counts, strict=True):
+            running += count
+            rows.append((bound, running))
+        return rows
+
+
+class ServingMetrics:
+    """Thread-safe request counters, latency histograms and reload outcomes."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self._buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._requests: defaultdict[tuple[str, int], int] = defaultdict(int)
+        self._latency: dict[str, LatencyHistogram] = {}
+        self._reloads = {"success": 0, "failure": 0}
+        self._loaded_at: float | None = None
+
+    def observe(self, route: str, status: int, seconds: float) -> None:
+        with self._lock:
+            self._requests[(route, status)] += 1
+            histogram = self._latency.get(route)
+            if histogram is None:
+                histogram = self._latency[route] = LatencyHistogram(self._buckets)
+            histogram.observe(seconds)
+
+    def record_reload(self, *, succeeded: bool, loaded_at: float | None = None) -> None:
+        with self._lock:
+            self._reloads["success" if succeeded else "failure"] += 1
+            if succeeded:
+                self._loaded_at = loaded_at
+
+    def request_count(self, route: str | None = None) -> int:
+        with self._lock:
+            return sum(
+                count for (name, _), count in self._requests.items() if route in {None, name}
+            )
+
+    def render(self) -> str:
+        """Prometheus text exposition of every counter and histogram."""
+        lines = [
+            "# HELP instacart_recommend_requests_total Requests answered per route and status.",
+            "# TYPE instacart_recommend_requests_total counter",
+        ]
+        with self._lock:
+            for (route, status), count in sorted(self._requests.items()):
+                lines.append(
+                    f'instacart_recommend_requests_total{{route="{route}",status="{status}"}} '
+                    f"{count}"
+                )
+            lines += [
+                "# HELP instacart_recommend_latency_seconds Request handling latency.",
+                "# TYPE instacart_recommend_latency_seconds histogram",
+            ]
+            for route, histogram in sorted(self._latency.items()):
+                for bound, count in histogram.cumulative():
+                    lines.append(
+                        f'instacart_recommend_latency_seconds_bucket{{route="{route}",'
+                        f'le="{bound}"}} {count}'
+                    )
+                lines.append(
+                    f'instacart_recommend_latency_seconds_sum{{route="{route}"}} '
+                    f"{histogram.total:.6f}"
+                )
+                lines.append(
+                    f'instacart_recommend_latency_seconds_count{{route="{route}"}} '
+                    f"{histogram.count}"
+                )
+            lines += [
+                "# HELP instacart_recommend_reloads_total Artifact reloads by outcome.",
+                "# TYPE instacart_recommend_reloads_total counter",
+                *(
+                    f'instacart_recommend_reloads_total{{outcome="{outcome}"}} {count}'
+                    for outcome, count in self._reloads.items()
+                ),
+            ]
+            if self._loaded_at is not None:
+                lines += [
+                    "# TYPE instacart_recommend_artifacts_loaded_seconds gauge",
+                    f"instacart_recommend_artifacts_loaded_seconds {self._loaded_at:.3f}",
+                ]
+        return "\n".join(lines) + "\n"
+
+
+@dataclass(frozen=True, slots=True)
+class ServingArtifacts:
+    """One immutable snapshot of the loaded artifacts."""
+
+    rules: RuleIndex
+    clusters: ClusterIndex
+    popularity: pd.DataFrame | None
+    signature: Signature
+    loaded_at: str
+
+
+class ArtifactStore:
+    """Loads the recommendation artifacts and swaps in a new snapshot when they change."""
+
+    def __init__(
+        self,
+        rules_path: Path | str | None = None,
+        clusters_path: Path | str | None = None,
+        popularity_path: Path | str | None = None,
+        *,
+        reload_interval: float = DEFAULT_RELOAD_INTERVAL,
+        metrics: ServingMetrics | None = None,
+    ) -> None:
+        if reload_interval < 0:
+            raise ValueError("reload_interval must be non-negative")
+        self.rules_path = Path(rules_path or default_rules_path())
+        self.clusters_path = Path(clusters_path or DEFAULT_RESULTS_DIR / "cluster_labels.csv")
+        # Without an explicit path the popularity file next to the labels is
+        # optional: it is picked up once instacart-cluster writes it.
+        self.popularity_required = popularity_path is not None
+        self.popularity_path = (
+            Path(popularity_path)
+            if popularity_path is not None
+            else self.clusters_path.parent / "cluster_popularity.csv"
+        )
+        self.clusters_metadata_path = self.clusters_path.parent / CLUSTERING_METADATA_NAME
+        self.reload_interval = reload_interval
+        self.metrics = metrics or ServingMetrics()
+        self._reload_lock = threading.Lock()
+        self._checked_at = monotonic()
+        self._failed_signature: Signature | None = None
+        self._artifacts = self._load(self.signature())
+        self.metrics.record_reload(succeeded=True, loaded_at=time())
+
+    def signature(self) -> Signature:
+        """Modification time and size of every artifact file; ``None`` when absent.
+
+        With clustering metadata present it stands for the labels and the
+        popularity, so a clustering run is picked up only once it is complete.
+        """
+        cluster_paths = (
+            (self.clusters_metadata_path,)
+            if self.clusters_metadata_path.is_file()
+            else (self.clusters_path, self.popularity_path)
+        )
+        entries = []
+        for path in (self.rules_path, *cluster_paths):
+            # A rule store is replaced as a whole directory with a new manifest.
+            if is_rule_store(path):
+                path = path / MANIFEST_NAME
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                entries.append(None)
+                continue
+            entries.append((str(path), stat.st_mtime_ns, stat.st_size))
+        return tuple(entries)
+
+    def _load(self, signature: Signature) -> ServingArtifacts:
+        popularity_present = self.popularity_path.is_file()
+        if self.clusters_metadata_path.is_file():
+            metadata = json.loads(self.clusters_metadata_path.read_text(encoding="utf-8"))
+            expected = metadata.get("labels_digest")
+            if expected is not None and file_digest(self.clusters_path) != expected:
+                raise RecommendationDataError(
+                    f"{self.clusters_path} does not match {self.clusters_metadata_path}"
+                )
+            popularity_present = metadata.get("artifacts", {}).get("popularity") is not None
+        popularity = (
+            load_cluster_popularity(self.popularity_path, labels_path=self.clusters_path)
+            if self.popularity_required or popularity_present
+            else None
+        )
+        return ServingArtifacts(
+            rules=load_rule_index(self.rules_path),
+            clusters=load_cluster_index(self.clusters_path),
+            popularity=popularity,
+            signature=signature,
+            loaded_at=utc_timestamp(),
+        )
+
+    @property
+    def artifacts(self) -> ServingArtifacts:
+        """The current snapshot, reloaded first when the files changed."""
+        if monotonic() - self._checked_at >= self.reload_interval:
+            self.refresh()
+        return self._artifacts
+
+    def refresh(self) -> bool:
+        """Reload when the artifact signature changed; ``True`` when a new snapshot loaded.
+
+        Only one thread reloads at a time; concurrent callers return immediately
+        and keep using the current snapshot.  Artifact data errors are
+        ``ValueError`` subclasses, so a bad file never replaces a good snapshot.
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            self._checked_at = monotonic()
+            signature = self.signature()
+            if signature in {self._artifacts.signature, self._failed_signature}:
+                return False
+            try:
+                artifacts = self._load(signature)
+            except (OSError, ValueError):
+                # Retried only after the files change again, e.g. once a
+                # partially written artifact is complete.
+                self._failed_signature = signature
+                self.metrics.record_reload(succeeded=False)
+                return False
+            self._artifacts = artifacts
+            self.metrics.record_reload(succeeded=True, loaded_at=time())
+            return True
+        finally:
+            self._reload_lock.release()
+
+
+class RecommendationService:
+    """Hybrid recommendations over an :class:`ArtifactStore` and one pooled engine."""
+
+    def __init__(
+        self,
+        store: ArtifactStore,
+        *,
+        engine: Engine | None = None,
+        settings: Settings | None = None,
+        rule_weight: float = 0.6,
+        cluster_weight: float = 0.4,
+        rrf_k: int = 60,
+    ) -> None:
+        self.store = store
+        self.rule_weight = rule_weight
+        self.cluster_weight = cluster_weight
+        self.rrf_k = rrf_k
+        self._settings = settings
+        self._engine = engine
+        self._engine_lock = threading.Lock()
+
+    def engine(self, artifacts: ServingArtifacts) -> Engine | None:
+        """The shared engine, created on first use; unused with precomputed popularity."""
+        if artifacts.popularity is not None:
+            return None
+        with self._engine_lock:
+            if self._engine is None:
+                self._engine = get_engine(self._settings or get_settings())
+            return self._engine
+
+    def recommend(
+        self, user_id: int, cart: Sequence[str], n: int = 10, *, item_space: str = "auto"
+    ) -> list[tuple[str, float]]:
+        artifacts = self.store.artifacts
+        return hybrid_recommend(
+            user_id,
+            cart,
+            artifacts.rules,
+            artifacts.clusters,
+            n,
+            engine=self.engine(artifacts),
+            rule_weight=self.rule_weight,
+            cluster_weight=self.cluster_weight,
+            rrf_k=self.rrf_k,
+            item_space=item_space,
+            popularity=artifacts.popularity,
+        )
+
+    def recommend_many(
+        self,
+        requests: Sequence[RecommendationRequest],
+        n: int = 10,
+        *,
+        item_space: str = "auto",
+    ) -> list[list[tuple[str, float]]]:
+        artifacts = self.store.artifacts
+        return recommend_batch(
+            requests,
+            artifacts.rules,
+            artifacts.clusters,
+            n,
+            engine=self.engine(artifacts),
+            rule_weight=self.rule_weight,
+            cluster_weight=self.cluster_weight,
+            rrf_k=self.rrf_k,
+            item_space=item_space,
+            popularity=artifacts.popularity,
+        )
+
+
+def _ranked_payload(ranked: list[tuple[str, float]]) -> list[dict[str, Any]]:
+    return [{"product": product, "score": score} for product, score in ranked]
+
+
+def _single_value(query: dict[str, list[str]], name: str, default: str | None = None) -> str:
+    values = query.get(name)
+    if not values:
+        if default is None:
+            raise ValueError(f"{name} is required")
+        return default
+    return values[-1]
+
+
+class RecommendationHandler(BaseHTTPRequestHandler):
+    """Routes requests to the server's :class:`RecommendationService`."""
+
+    server: RecommendationServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        if self.server.access_log:
+            super().log_message(format, *args)
+
+    def do_GET(self) -> None:  # noqa: N802
+        self._dispatch("GET")
+
+    def do_POST(self) -> None:  # noqa: N802
+        self._dispatch("POST")
+
+    def _dispatch(self, method: str) -> None:
+        started = perf_counter()
+        url = urlsplit(self.path)
+        route = url.path.rstrip("/") or "/"
+        try:
+            status, body, content_type = self._route(method, route, parse_qs(url.query))
+        except (RecommendationDataError, ValueError, KeyError, TypeError) as exc:
+            status, body, content_type = self._json(HTTPStatus.BAD_REQUEST, {"error": str(exc)})
+        except Exception as exc:  # Boundary: a failed request must not stop the server.
+            status, body, content_type = self._json(
+                HTTPStatus.INTERNAL_SERVER_ERROR, {"error": exc.__class__.__name__}
+            )
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.metrics.observe(
+            route if route in ROUTES else "other", int(status), perf_counter() - started
+        )
+
+    @staticmethod
+    def _json(status: HTTPStatus, payload: object) -> tuple[HTTPStatus, bytes, str]:
+        return status, json.dumps(payload).encode("utf-8"), "application/json"
+
+    def _route(
+        self, method: str, route: str, query: dict[str, list[str]]
+    ) -> tuple[HTTPStatus, bytes, str]:
+        service = self.server.service
+        if method == "GET" and route == "/metrics":
+            body = self.server.metrics.render().encode("utf-8")
+            return HTTPStatus.OK, body, "text/plain; version=0.0.4"
+        if method == "GET" and route == "/healthz":
+            artifacts = service.store.artifacts
+            return self._json(
+                HTTPStatus.OK,
+                {
+                    "status": "ok",
+                    "loaded_at": artifacts.loaded_at,
+                    "rules": len(artifacts.rules),
+                    "users": len(artifacts.clusters),
+                    "popularity_rows": (
+                        None if artifacts.popularity is None else len(artifacts.popularity)
+                    ),
+                },
+            )
+        if method == "GET" and route == "/recommend":
+            user_id = int(_single_value(query, "user_id"))
+            ranked = service.recommend(
+                user_id,
+                query.get("cart", []),
+                int(_single_value(query, "n", "10")),
+                item_space=_single_value(query, "item_space", "auto"),
+            )
+            return self._json(
+                HTTPStatus.OK, {"user_id": user_id, "recommendations": _ranked_payload(ranked)}
+            )
+        if method == "POST" and route == "/recommend/batch":
+            length = int(self.headers.get("Content-Length", "0"))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            entries = payload["requests"]
+            if not isinstance(entries, list) or len(entries) > MAX_BATCH_REQUESTS:
+                raise ValueError(f"requests must be a list of at most {MAX_BATCH_REQUESTS}")
+            requests = [
+                RecommendationRequest(
+                    int(entry["user_id"]), tuple(str(item) for item in entry.get("cart", []))
+                )
+                for entry in entries
+            ]
+            results = service.recommend_many(
+                requests,
+                int(payload.get("n", 10)),
+                item_space=str(payload.get("item_space", "auto")),
+            )
+            return self._json(
+                HTTPStatus.OK,
+                {
+                    "results": [
+                        {"user_id": request.user_id, "recommendations": _ranked_payload(ranked)}
+                        for request, ranked in zip(requests, results, strict=True)
+                    ]
+                },
+            )
+        status = HTTPStatus.METHOD_NOT_ALLOWED if route in ROUTES else HTTPStatus.NOT_FOUND
+        return self._json(status, {"error": status.phrase})
+
+
+class RecommendationServer(ThreadingHTTPServer):
+    """Threaded HTTP server bound to a loopback address."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        service: RecommendationService,
+        *,
+        access_log: bool = False,
+    ) -> None:
+        host = address[0]
+        if host != "localhost" and not ipaddress.ip_address(host).is_loopback:
+            raise ValueError("the recommendation server only binds to loopback addresses")
+        self.service = service
+        self.metrics = service.store.metrics
+        self.access_log = access_log
+        super().__init__(address, RecommendationHandler)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=DEFAULT_HOST, help="loopback address to bind")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--rules", type=Path)
+    parser.add_argument("--clusters", type=Path)
+    parser.add_argument(
+        "--popularity",
+        type=Path,
+        help=(
+            "cluster_popularity.csv from instacart-cluster (default: next to the cluster "
+            "labels when present, otherwise ranked live in the warehouse)"
+        ),
+    )
+    parser.add_argument(
+        "--reload-interval",
+        type=float,
+        default=DEFAULT_RELOAD_INTERVAL,
+        help="seconds between artifact change checks",
+    )
+    parser.add_argument("--rule-weight", type=float, default=0.6)
+    parser.add_argument("--cluster-weight", type=float, default=0.4)
+    parser.add_argument("--rrf-k", type=int, default=60)
+    parser.add_argument("--access-log", action="store_true")
+    return parser
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.rule_weight < 0 or args.cluster_weight < 0:
+        raise SystemExit("rank-fusion weights must be non-negative")
+    store = ArtifactStore(
+        args.rules,
+        args.clusters,
+        args.popularity,
+        reload_interval=args.reload_interval,
+    )
+    service = RecommendationService(
+        store,
+        rule_weight=args.rule_weight,
+        cluster_weight=args.cluster_weight,
+        rrf_k=args.rrf_k,
+    )
+    with RecommendationServer(
+        (args.host, args.port), service, access_log=args.access_log
+    ) as server:
+        host, port = server.server_address[:2]
+        print(f"Serving recommendations on http://{host}:{port} (metrics at /metrics)")
+        with contextlib.suppress(KeyboardInterrupt):
+            server.serve_forever()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,400 @@
+"""Mine separate association rules per customer segment and time slice.
+
+Baskets are extracted once, exactly as ``instacart-basket`` reads them, and
+tagged with stratum keys from the per-order attributes: ``Dim_User.user_segment``
+by ``user_id`` and ``Dim_Time.hour_range``/``is_weekend`` by day and hour.  A
+process pool mines each stratum independently at the same relative thresholds.
+Every stratum gets its own rule store and ``index.json`` lists them so the
+recommender can pick the rules matching a request's context.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from etl.config import get_engine, get_settings
+from etl.streaming import read_frame
+from mining.artifacts import ensure_results_dir, utc_timestamp, write_json
+from mining.basket_store import BasketArrays
+from mining.market_basket import (
+    DEFAULT_SUPPORT_FLOOR,
+    MINING_FUNCTIONS,
+    BasketDataError,
+    basket_frame,
+    compact_itemsets,
+    encode_baskets,
+    generate_rules,
+    load_product_catalog,
+    load_run_baskets,
+    save_rules,
+    search_min_support,
+    validate_arguments,
+)
+from mining.market_basket import build_parser as build_basket_parser
+from mining.rule_store import RULE_STORE_DIRNAME, save_rule_store
+
+STRATUM_DIMENSIONS = ("user_segment", "hour_range", "weekend")
+DEFAULT_MIN_STRATUM_BASKETS = 1_000
+STRATA_DIRNAME = "strata"
+INDEX_NAME = "index.json"
+UNKNOWN_SEGMENT = "Unknown"
+
+
+@dataclass(frozen=True, slots=True)
+class TimeLookup:
+    """``Dim_Time`` labels indexed by ``order_dow * 24 + order_hour``."""
+
+    hour_ranges: tuple[str, ...]
+    weekend: tuple[bool, ...]
+
+    def labels(self, order_dow: np.ndarray, order_hour: np.ndarray) -> dict[str, np.ndarray]:
+        slots = order_dow.astype(np.int64) * 24 + order_hour.astype(np.int64)
+        return {
+            "hour_range": np.asarray(self.hour_ranges, dtype=object)[slots],
+            "weekend": np.where(np.asarray(self.weekend)[slots], "weekend", "weekday"),
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class StratumResult:
+    key: dict[str, str]
+    baskets: int
+    status: str
+    min_support: float | None = None
+    frequent_itemsets: int = 0
+    elapsed_seconds: float = 0.0
+    message: str | None = None
+    rules: pd.DataFrame | None = field(default=None, repr=False)
+
+
+def load_time_lookup(engine: Engine) -> TimeLookup:
+    query = text(
+        "SELECT order_dow, order_hour, hour_range, is_weekend FROM Dim_Time "
+        "ORDER BY order_dow, order_hour"
+    )
+    with engine.connect() as connection:
+        frame = pd.read_sql(query, connection)
+    if len(frame) != 7 * 24:
+        raise BasketDataError(f"Dim_Time must hold 168 day/hour rows, found {len(frame)}")
+    return TimeLookup(
+        hour_ranges=tuple(frame["hour_range"].astype(str)),
+        weekend=tuple(frame["is_weekend"].astype(bool)),
+    )
+
+
+def load_user_segments(engine: Engine, chunk_size: int) -> pd.Series:
+    query = text("SELECT user_id, user_segment FROM Dim_User ORDER BY user_id")
+    frame = read_frame(engine, query, chunk_size=chunk_size)
+    return pd.Series(frame["user_segment"].to_numpy(), index=frame["user_id"].to_numpy())
+
+
+def stratum_labels(
+    baskets: BasketArrays,
+    dimensions: Sequence[str],
+    *,
+    time_lookup: TimeLookup | None = None,
+    segments: pd.Series | None = None,
+) -> pd.DataFrame:
+    """One row of stratum labels per basket, in basket order."""
+    labels: dict[str, np.ndarray] = {}
+    if "user_segment" in dimensions:
+        if segments is None:
+            raise ValueError("user_segment strata need the Dim_User segments")
+        labels["user_segment"] = (
+            segments.reindex(baskets.attributes["user_id"]).fillna(UNKNOWN_SEGMENT).to_numpy()
+        )
+    if {"hour_range", "weekend"} & set(dimensions):
+        if time_lookup is None:
+            raise ValueError("time strata need the Dim_Time lookup")
+        labels |= time_lookup.labels(
+            baskets.attributes["order_dow"], baskets.attributes["order_hour"]
+        )
+    return pd.DataFrame({dimension: labels[dimension] for dimension in dimensions})
+
+
+def stratum_slug(key: Mapping[str, str]) -> str:
+    """Filesystem-safe directory name, e.g. ``vip__06-12-morning__weekend``."""
+    return "__".join(
+        re.sub(r"[^a-z0-9]+", "-", str(value).lower()).strip("-") for value in key.values()
+    )
+
+
+def _mine_stratum(
+    key: dict[str, str],
+    baskets: BasketArrays,
+    options: dict[str, object],
+) -> StratumResult:
+    started = perf_counter()
+    encoded, product_ids = encode_baskets(
+        baskets.indptr,
+        baskets.indices,
+        int(baskets.indices.max()) + 1,
+        options["top_products"],
+    )
+    min_support = options["min_support"]
+    message = None
+    try:
+        if options["target_rules"] is not None:
+            search = search_min_support(
+                encoded,
+                options["target_rules"],
+                min_confidence=options["min_confidence"],
+                min_lift=options["min_lift"],
+                top_k=options["top_k"],
+                support_floor=options.get("support_floor", DEFAULT_SUPPORT_FLOOR),
+            )
+            min_support = search.min_support
+            if not search.reached_target:
+                message = (
+                    f"only {search.estimated_rules:,} pair rules reach the support floor; "
+                    f"target was {search.target_rules:,}"
+                )
+        itemsets = MINING_FUNCTIONS[options["algorithm"]](
+            basket_frame(encoded, product_ids), min_support
+        )
+        bases = None
+        if options.get("compact") is not None:
+            bases = compact_itemsets(itemsets, options["compact"])
+        rules = generate_rules(
+            itemsets,
+            min_threshold=options["min_confidence"],
+            min_lift=options["min_lift"],
+            top_k=options["top_k"],
+            bases=bases,
+        )
+    except BasketDataError as error:
+        return StratumResult(
+            key=key,
+            baskets=len(baskets),
+            status="no_rules",
+            min_support=min_support,
+            elapsed_seconds=perf_counter() - started,
+            message=str(error),
+        )
+    return StratumResult(
+        key=key,
+        baskets=len(baskets),
+        status="ok",
+        min_support=min_support,
+        frequent_itemsets=len(itemsets),
+        elapsed_seconds=perf_counter() - started,
+        message=message,
+        rules=rules,
+    )
+
+
+def mine_strata(
+    baskets: BasketArrays,
+    labels: pd.DataFrame,
+    *,
+    min_baskets: int = DEFAULT_MIN_STRATUM_BASKETS,
+    workers: int | None = None,
+    **options: object,
+) -> list[StratumResult]:
+    """Mine every stratum with at least ``min_baskets`` baskets in a process pool.
+
+    ``options`` are the per-stratum mining settings: ``top_products``,
+    ``algorithm``, ``min_support``, ``target_rules``, ``min_confidence``,
+    ``min_lift`` and ``top_k``, plus optional ``support_floor`` and ``compact``.  Smaller
+    strata are reported as skipped.
+    """
+    if len(labels) != len(baskets):
+        raise ValueError("labels must have one row per basket")
+    groups = labels.groupby(list(labels.columns), sort=True).indices
+    results: list[StratumResult] = []
+    futures = []
+    pool_size = max(1, min(len(groups), workers or os.cpu_count() or 1))
+    with ProcessPoolExecutor(max_workers=pool_size) as pool:
+        for values, rows in groups.items():
+            values = values if isinstance(values, tuple) else (values,)
+            key = dict(zip(labels.columns, map(str, values), strict=True))
+            if len(rows) < min_baskets:
+                results.append(
+                    StratumResult(key=key, baskets=len(rows), status="too_few_baskets")
+                )
+                continue
+            mask = np.zeros(len(baskets), dtype=bool)
+            mask[rows] = True
+            subset = baskets.select(mask)
+            # Workers only need the CSR arrays, not per-order attributes.
+            payload = BasketArrays(subset.order_ids, subset.indptr, subset.indices)
+            futures.append(pool.submit(_mine_stratum, key, payload, options))
+        results.extend(future.result() for future in futures)
+    return sorted(results, key=lambda result: tuple(result.key.values()))
+
+
+def write_strata(
+    results: Sequence[StratumResult],
+    directory: Path,
+    *,
+    dimensions: Sequence[str],
+    time_lookup: TimeLookup | None,
+    catalog: Mapping[str, str] | None,
+    parameters: Mapping[str, object],
+    export_csv: bool = False,
+) -> Path:
+    """Write one rule store per mined stratum and the ``index.json`` describing all of them.
+
+    ``export_csv`` also writes each stratum's human-readable ``association_rules.csv``;
+    without it, a CSV left by an earlier run is removed.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    entries = []
+    for result in results:
+        entry: dict[str, object] = {
+            "key": result.key,
+            "baskets": result.baskets,
+            "status": result.status,
+            "min_support": result.min_support,
+            "frequent_itemsets": result.frequent_itemsets,
+            "elapsed_seconds": result.elapsed_seconds,
+            "message": result.message,
+            "rules": 0,
+            "path": None,
+        }
+        if result.rules is not None:
+            slug = stratum_slug(result.key)
+            path = save_rule_store(
+                result.rules, directory / slug / RULE_STORE_DIRNAME, catalog=catalog
+            )
+            csv_path = directory / slug / "association_rules.csv"
+            if export_csv:
+                save_rules(
+                    result.rules,
+                    csv_path,
+                    catalog=None if catalog is None else dict(catalog),
+                )
+            else:
+                csv_path.unlink(missing_ok=True)
+            entry["rules"] = len(result.rules)
+            entry["path"] = path.relative_to(directory).as_posix()
+        entries.append(entry)
+    return write_json(
+        directory / INDEX_NAME,
+        {
+            "artifact_schema_version": 1,
+            "created_at": utc_timestamp(),
+            "dimensions": list(dimensions),
+            "time_lookup": None if time_lookup is None else asdict(time_lookup),
+            "parameters": dict(parameters),
+            "strata": entries,
+        },
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = build_basket_parser()
+    parser.description = __doc__
+    parser.add_argument(
+        "--stratify-by",
+        nargs="+",
+        choices=STRATUM_DIMENSIONS,
+        default=list(STRATUM_DIMENSIONS),
+        help="dimensions whose combinations form the strata (default: all three)",
+    )
+    parser.add_argument(
+        "--min-stratum-baskets",
+        type=int,
+        default=DEFAULT_MIN_STRATUM_BASKETS,
+        help="skip strata with fewer baskets",
+    )
+    return parser
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    validate_arguments(parser, args)
+    if args.partitions is not None:
+        parser.error("--partitions does not apply; each stratum is mined by one worker")
+    if args.sketch_pairs:
+        parser.error("--sketch-pairs is not supported per stratum")
+    if args.compaction_report:
+        parser.error("--compaction-report is not supported per stratum")
+    if args.min_stratum_baskets < 1:
+        parser.error("--min-stratum-baskets must be at least 1")
+    dimensions = tuple(dict.fromkeys(args.stratify_by))
+    settings = get_settings()
+    output_dir = ensure_results_dir(args.output_dir) / STRATA_DIRNAME
+    engine = get_engine(settings)
+
+    started = perf_counter()
+    run = load_run_baskets(args, settings, engine)
+    time_lookup = (
+        load_time_lookup(engine) if {"hour_range", "weekend"} & set(dimensions) else None
+    )
+    segments = (
+        load_user_segments(engine, settings.chunk_size)
+        if "user_segment" in dimensions
+        else None
+    )
+    labels = stratum_labels(
+        run.baskets, dimensions, time_lookup=time_lookup, segments=segments
+    )
+    parameters = {
+        "mode": "full" if run.order_limit is None else "deterministic_sample",
+        "requested_order_limit": run.order_limit,
+        "random_state": run.random_state,
+        "excludes_train_orders": args.exclude_train,
+        "held_out_baskets": run.held_out_baskets,
+        "min_items": args.min_items,
+        "basket_source": run.basket_source,
+        "basket_store": run.basket_store,
+        "top_products": args.top_products,
+        "algorithm": args.algorithm,
+        "min_support": args.min_support if args.target_rules is None else None,
+        "target_rules": args.target_rules,
+        "min_support_floor": args.min_support_floor,
+        "min_confidence": args.min_confidence,
+        "min_lift": args.min_lift,
+        "top_k_consequents": args.top_k_consequents,
+        "compact": args.compact,
+        "min_stratum_baskets": args.min_stratum_baskets,
+        "workers": args.workers,
+    }
+    results = mine_strata(
+        run.baskets,
+        labels,
+        min_baskets=args.min_stratum_baskets,
+        workers=args.workers,
+        top_products=args.top_products,
+        algorithm=args.algorithm,
+        min_support=args.min_support,
+        target_rules=args.target_rules,
+        support_floor=args.min_support_floor,
+        min_confidence=args.min_confidence,
+        min_lift=args.min_lift,
+        top_k=args.top_k_consequents,
+        compact=args.compact,
+    )
+    index_path = write_strata(
+        results,
+        output_dir,
+        dimensions=dimensions,
+        time_lookup=time_lookup,
+        catalog=load_product_catalog(engine),
+        parameters=parameters | {"elapsed_seconds": perf_counter() - started},
+        export_csv=args.export_csv,
+    )
+    for result in results:
+        label = ", ".join(f"{name}={value}" for name, value in result.key.items())
+        rules = 0 if result.rules is None else len(result.rules)
+        print(f"{label}: {result.baskets:,} baskets, {result.status}, {rules:,} rules")
+    print(f"Stratum index: {index_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
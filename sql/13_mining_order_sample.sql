@@ -0,0 +1,28 @@
+-- ============================================
+-- Mining_Order_Sample: Persisted Deterministic Order Samples
+-- ============================================
+-- Source: Fact_Orders, rebuilt by instacart-etl after each load
+-- Granularity: 1 row = 1 order at its rank in one seeded sampling order
+-- Ranking: CRC32(CONCAT(order_id, ':', seed)), ties broken by order_id
+-- Purpose: an N-order mining sample is the range sample_rank < N
+-- ============================================
+
+USE instacart_dwh;
+
+CREATE TABLE IF NOT EXISTS Mining_Order_Sample (
+    seed INT NOT NULL COMMENT 'Sampling seed (MINING_SAMPLE_SEEDS)',
+    sample_rank INT NOT NULL COMMENT '0-based position in the seeded order',
+    order_id INT NOT NULL,
+
+    PRIMARY KEY (seed, sample_rank),
+    UNIQUE KEY uq_sample_order (seed, order_id),
+    CONSTRAINT chk_sample_rank CHECK (sample_rank >= 0)
+) ENGINE=InnoDB COMMENT='Seeded order ranks for bounded mining samples';
+
+CREATE TABLE IF NOT EXISTS Mining_Sample_Seeds (
+    seed INT NOT NULL PRIMARY KEY,
+    orders INT NOT NULL COMMENT 'Ranked orders; equals Fact_Orders at build time',
+    built_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB COMMENT='Seeds with a complete Mining_Order_Sample ranking';
+
+SELECT 'Mining_Order_Sample created!' as Status;
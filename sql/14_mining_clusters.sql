@@ -0,0 +1,31 @@
+-- ============================================
+-- Mining_User_Cluster / Mining_Cluster_Popularity: Customer Cluster Serving Tables
+-- ============================================
+-- Source: instacart-cluster, rebuilt after each clustering run
+-- Granularity: 1 row = 1 clustered user; 1 row = 1 product at its rank in one cluster
+-- Ranking: distinct orders desc, reorder rate desc, product_id
+-- Purpose: cluster recommendations become a top-N read instead of a member join
+-- ============================================
+
+USE instacart_dwh;
+
+CREATE TABLE IF NOT EXISTS Mining_User_Cluster (
+    user_id INT NOT NULL PRIMARY KEY,
+    cluster_id INT NOT NULL,
+
+    INDEX idx_cluster_user (cluster_id, user_id)
+) ENGINE=InnoDB COMMENT='K-Means cluster of each clustered user';
+
+CREATE TABLE IF NOT EXISTS Mining_Cluster_Popularity (
+    cluster_id INT NOT NULL,
+    popularity_rank INT NOT NULL COMMENT '1-based position within the cluster',
+    product_id INT NOT NULL,
+    order_count INT NOT NULL COMMENT 'Distinct cluster orders containing the product',
+    reorder_rate DECIMAL(7, 6) NOT NULL,
+
+    PRIMARY KEY (cluster_id, popularity_rank),
+    UNIQUE KEY uq_cluster_product (cluster_id, product_id),
+    CONSTRAINT chk_popularity_rank CHECK (popularity_rank >= 1)
+) ENGINE=InnoDB COMMENT='Most-ordered products per customer cluster';
+
+SELECT 'Mining cluster tables created!' as Status;
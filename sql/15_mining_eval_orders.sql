@@ -0,0 +1,19 @@
+-- ============================================
+-- Mining_Eval_Orders: Held-Out Train Orders
+-- ============================================
+-- Source: orders.csv rows with eval_set = 'train', rebuilt by instacart-etl after each load
+-- Granularity: 1 row = 1 train order (each evaluated user's final order)
+-- Purpose: `--exclude-train` mining leaves these orders out, so offline
+--          evaluation never scores artifacts mined from its own targets
+-- ============================================
+
+USE instacart_dwh;
+
+CREATE TABLE IF NOT EXISTS Mining_Eval_Orders (
+    order_id INT NOT NULL PRIMARY KEY,
+    user_id INT NOT NULL,
+
+    INDEX idx_eval_user (user_id)
+) ENGINE=InnoDB COMMENT='Train orders held out from mining for offline evaluation';
+
+SELECT 'Mining_Eval_Orders created!' as Status;
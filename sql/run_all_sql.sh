@@ -5,7 +5,7 @@ IFS=$'\n\t'
 
 readonly SCRIPT_DIR="$(cd -- "$(dirname -- "${BASH_SOURCE[0]}")" && pwd)"
 readonly PROJECT_ROOT="$(cd -- "${SCRIPT_DIR}/.." && pwd)"
-readonly TOTAL_STEPS=11
+readonly TOTAL_STEPS=14
 readonly -a COMPOSE=(
     docker compose
     --project-directory "$PROJECT_ROOT"
@@ -60,6 +60,9 @@ readonly -a SCHEMA_FILES=(
     "07_fact_orders.sql"
     "08_fact_order_details.sql"
     "09_additional_indexes.sql"
+    "13_mining_order_sample.sql"
+    "14_mining_clusters.sql"
+    "15_mining_eval_orders.sql"
 )
 
 printf '[1/%d] Checking MariaDB connectivity\n' "$TOTAL_STEPS"
@@ -80,7 +83,7 @@ for file_name in "${SCHEMA_FILES[@]}"; do
     ((step += 1))
 done
 
-printf '[11/%d] Verifying required tables and partitions\n' "$TOTAL_STEPS"
+printf '[14/%d] Verifying required tables and partitions\n' "$TOTAL_STEPS"
 run_app_client <<'SQL'
 SELECT TABLE_NAME
 FROM INFORMATION_SCHEMA.TABLES
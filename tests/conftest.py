@@ -22,6 +22,8 @@ def settings_factory(tmp_path: Path) -> Callable[..., Settings]:
             "dashboard_cache_ttl": 60,
             "mining_random_state": 42,
             "mining_order_limit": 1_000,
+            "mining_sample_seeds": (42,),
+            "etl_report_path": tmp_path / "artifacts" / "etl" / "latest.json",
         }
         values.update(overrides)
         return Settings(**values)
@@ -21,6 +21,7 @@ def test_settings_defaults_are_normalized_and_repo_relative(
     assert settings.dashboard_mode == "auto"
     assert settings.batch_size == 1_000
     assert settings.chunk_size == 50_000
+    assert settings.etl_report_path == (tmp_path / "artifacts/etl/latest.json").resolve()
 
 
 def test_settings_reads_explicit_values_and_builds_csv_paths(
@@ -40,6 +41,7 @@ def test_settings_reads_explicit_values_and_builds_csv_paths(
         "DASHBOARD_CACHE_TTL": "90",
         "MINING_RANDOM_STATE": "7",
         "MINING_ORDER_LIMIT": "500",
+        "ETL_REPORT_PATH": "reports/etl.json",
     }
 
     settings = Settings.from_env(environment)
@@ -48,6 +50,8 @@ def test_settings_reads_explicit_values_and_builds_csv_paths(
     assert settings.db_port == 4406
     assert settings.dashboard_mode == "live"
     assert settings.mining_random_state == 7
+    assert settings.mining_sample_seeds == (7,)
+    assert settings.etl_report_path == (tmp_path / "reports/etl.json").resolve()
     assert settings.csv_files["orders"] == tmp_path / "fixtures/source/orders.csv"
     assert settings.database_url.password == "p@ss:/word"
     assert settings.database_url.drivername == "mysql+pymysql"
@@ -68,6 +72,13 @@ def test_settings_rejects_invalid_positive_integers(name: str, value: str, messa
         Settings.from_env({name: value})
 
 
+def test_settings_parse_mining_sample_seeds() -> None:
+    assert Settings.from_env({"MINING_SAMPLE_SEEDS": "42, 7,42"}).mining_sample_seeds == (42, 7)
+
+    with pytest.raises(ConfigurationError, match="comma-separated list of integers"):
+        Settings.from_env({"MINING_SAMPLE_SEEDS": "42,seven"})
+
+
 def test_settings_rejects_unknown_dashboard_mode() -> None:
     with pytest.raises(ConfigurationError, match="DASHBOARD_MODE must be one of"):
         Settings.from_env({"DASHBOARD_MODE": "sometimes"})
@@ -55,3 +55,47 @@ def test_demo_app_identifies_the_source_without_live_database_errors(
     assert any("Demo snapshot" in markdown.value for markdown in app.markdown)
     assert any("Representative demo snapshot" in caption.value for caption in app.sidebar.caption)
     reset_settings_cache()
+
+
+def _products_page_with_counting_repository() -> None:
+    import streamlit as st
+
+    from dashboard.coalescing import CoalescingAnalyticsRepository
+    from dashboard.data import DemoAnalyticsRepository
+    from dashboard.pages import products
+
+    class CountingRepository(DemoAnalyticsRepository):
+        def products(self, **parameters):
+            st.session_state.calls.append(("products", parameters))
+            return super().products(**parameters)
+
+        def aisles(self, **parameters):
+            st.session_state.calls.append(("aisles", parameters))
+            return super().aisles(**parameters)
+
+    if "repository" not in st.session_state:
+        st.session_state.calls = []
+        st.session_state.repository = CoalescingAnalyticsRepository(CountingRepository())
+    products.show(st.session_state.repository)
+
+
+def test_products_page_sliders_slice_locally_without_new_source_queries() -> None:
+    app = AppTest.from_function(
+        _products_page_with_counting_repository, default_timeout=30
+    ).run()
+    initial_calls = list(app.session_state["calls"])
+
+    app.slider[0].set_value(5).run()
+    app.slider[1].set_value(5)
+    app.number_input[0].set_value(50_000).run()
+
+    assert len(app.exception) == 0
+    assert initial_calls == [
+        ("products", {"limit": 100, "department": None}),
+        ("aisles", {"limit": 134, "min_items": 0}),
+    ]
+    assert app.session_state["calls"] == initial_calls
+    assert len(app.dataframe[0].value) == 5
+    aisles = app.dataframe[1].value
+    assert len(aisles) <= 5
+    assert (aisles["items"] >= 50_000).all()
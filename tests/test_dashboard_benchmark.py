@@ -0,0 +1,93 @@
+import json
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+
+from dashboard import benchmark
+from dashboard.data import DemoAnalyticsRepository, MariaDBAnalyticsRepository
+
+
+def test_workload_is_deterministic_and_covers_page_parameter_shapes() -> None:
+    first = benchmark.build_workload(
+        sessions=3, requests_per_session=200, seed=7, departments=["produce", "dairy eggs"]
+    )
+    second = benchmark.build_workload(
+        sessions=3, requests_per_session=200, seed=7, departments=["produce", "dairy eggs"]
+    )
+
+    assert first == second
+    assert first[0] != first[1]
+    calls = [call for session in first for call in session]
+    assert {method for method, _ in calls} == set(benchmark.METHOD_WEIGHTS)
+    departments = {params["department"] for method, params in calls if method == "products"}
+    assert departments == {None, "produce", "dairy eggs"}
+
+
+def test_demo_run_reports_throughput_latency_percentiles_and_methods() -> None:
+    workload = benchmark.build_workload(
+        sessions=4, requests_per_session=25, seed=1, departments=["produce"]
+    )
+
+    report = benchmark.run_benchmark(DemoAnalyticsRepository(), workload)
+
+    assert (report["sessions"], report["requests"], report["errors"]) == (4, 100, 0)
+    assert report["throughput_rps"] > 0
+    latency = report["latency_ms"]
+    assert latency["p50_ms"] <= latency["p95_ms"] <= latency["p99_ms"] <= latency["max_ms"]
+    assert report["pool_wait_ms"] is None
+    assert sum(stats["requests"] for stats in report["methods"].values()) == 100
+
+
+def test_pool_wait_probe_times_checkouts_and_restores_the_pool() -> None:
+    engine = create_engine("sqlite://")
+    repository = MariaDBAnalyticsRepository(engine)
+    probe = benchmark.PoolWaitProbe()
+
+    with probe.installed(repository) as pooled:
+        repository._read_frame("SELECT 1 AS value", operation="probe")
+
+    assert pooled
+    assert len(probe.waits_ms) == 1
+    assert "connect" not in vars(engine.pool)
+
+
+def test_cli_writes_baseline_and_fails_on_regression(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    baseline_path = tmp_path / "baseline.json"
+    assert (
+        benchmark.main(
+            ["--sessions", "2", "--requests-per-session", "10", "--output", str(baseline_path)]
+        )
+        == 0
+    )
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    assert baseline["source"]["mode"] == "demo"
+    assert baseline["workload"]["seed"] == 42
+
+    # A baseline that was twice as fast makes every latency metric a regression.
+    for stats in [baseline["latency_ms"], *baseline["methods"].values()]:
+        for metric in benchmark.REGRESSION_METRICS:
+            stats[metric] /= 2
+    baseline_path.write_text(json.dumps(baseline), encoding="utf-8")
+    current_path = tmp_path / "current.json"
+
+    exit_code = benchmark.main(
+        [
+            "--sessions",
+            "2",
+            "--requests-per-session",
+            "10",
+            "--output",
+            str(current_path),
+            "--baseline",
+            str(baseline_path),
+            "--fail-on-regression",
+            "1",
+        ]
+    )
+
+    assert exit_code == 2
+    comparison = json.loads(current_path.read_text(encoding="utf-8"))["comparison"]
+    assert any(row["scope"] == "overall" for row in comparison["metrics"])
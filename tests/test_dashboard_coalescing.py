@@ -0,0 +1,117 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+from dashboard.coalescing import CoalescingAnalyticsRepository
+from dashboard.data import DemoAnalyticsRepository
+
+
+class GatedRepository(DemoAnalyticsRepository):
+    """Demo source whose KPI query blocks until the test releases it."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.fail = False
+
+    def overview_kpis(self) -> pd.DataFrame:
+        self.calls += 1
+        self.started.set()
+        assert self.release.wait(timeout=5)
+        if self.fail:
+            raise ConnectionError("warehouse unavailable")
+        frame = super().overview_kpis()
+        frame["generation"] = self.calls
+        return frame
+
+
+class ManualClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_concurrent_identical_calls_share_one_execution() -> None:
+    source = GatedRepository()
+    repository = CoalescingAnalyticsRepository(source)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(repository.overview_kpis) for _ in range(8)]
+        assert source.started.wait(timeout=5)
+        source.release.set()
+        results = [future.result(timeout=5) for future in futures]
+
+    assert source.calls == 1
+    assert all(result.equals(results[0]) for result in results)
+    results[0].loc[0, "total_orders"] = -1
+    assert int(repository.overview_kpis().loc[0, "total_orders"]) != -1
+
+
+def test_distinct_parameters_are_not_coalesced() -> None:
+    repository = CoalescingAnalyticsRepository(DemoAnalyticsRepository())
+
+    dairy = repository.products(limit=10, department="dairy eggs")
+    everything = repository.products(limit=10)
+
+    assert dairy["department_name"].eq("dairy eggs").all()
+    assert len(dairy) < len(everything)
+
+
+def test_stale_result_is_served_while_one_background_refresh_runs() -> None:
+    source = GatedRepository()
+    clock = ManualClock()
+    repository = CoalescingAnalyticsRepository(
+        source, fresh_seconds=10, stale_seconds=10, clock=clock
+    )
+    source.release.set()
+    first = repository.overview_kpis()
+    source.release.clear()
+    source.started.clear()
+
+    clock.now = 15
+    stale = repository.overview_kpis()
+    assert source.started.wait(timeout=5)
+    assert repository.overview_kpis()["generation"].iloc[0] == 1
+    source.release.set()
+
+    for _ in range(100):
+        if repository.overview_kpis()["generation"].iloc[0] == 2:
+            break
+        threading.Event().wait(0.01)
+    assert stale.equals(first)
+    assert source.calls == 2
+    assert repository.overview_kpis()["generation"].iloc[0] == 2
+
+
+def test_expired_result_and_shared_failures_propagate_to_every_waiter() -> None:
+    source = GatedRepository()
+    clock = ManualClock()
+    repository = CoalescingAnalyticsRepository(
+        source, fresh_seconds=1, stale_seconds=1, clock=clock
+    )
+    source.fail = True
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(repository.overview_kpis) for _ in range(4)]
+        assert source.started.wait(timeout=5)
+        source.release.set()
+        for future in futures:
+            with pytest.raises(ConnectionError):
+                future.result(timeout=5)
+
+    assert source.calls == 1
+    source.fail = False
+    assert repository.overview_kpis()["generation"].iloc[0] == 2
+
+
+def test_unknown_methods_are_rejected_before_reaching_the_source() -> None:
+    repository = CoalescingAnalyticsRepository(DemoAnalyticsRepository())
+
+    with pytest.raises(ValueError, match="Unsupported repository method"):
+        repository.call("close")
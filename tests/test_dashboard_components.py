@@ -0,0 +1,70 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from dashboard import components
+from dashboard.coalescing import CoalescingAnalyticsRepository
+from dashboard.data import DemoAnalyticsRepository
+
+
+class BarrierRepository(DemoAnalyticsRepository):
+    """Succeeds only when the three timing queries are in flight together."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.barrier = threading.Barrier(3, timeout=5)
+
+    def day_trends(self) -> pd.DataFrame:
+        self.barrier.wait()
+        return super().day_trends()
+
+    def hour_trends(self) -> pd.DataFrame:
+        self.barrier.wait()
+        return super().hour_trends()
+
+    def weekend_comparison(self) -> pd.DataFrame:
+        self.barrier.wait()
+        return super().weekend_comparison()
+
+
+def test_repository_batch_runs_requests_concurrently_and_keeps_request_order() -> None:
+    repository = CoalescingAnalyticsRepository(BarrierRepository())
+
+    day, hour, comparison = components.load_repository_batch(
+        repository,
+        [("day_trends", {}), ("hour_trends", {}), ("weekend_comparison", {})],
+        loading_label="Loading",
+    )
+
+    assert len(day) == 7
+    assert len(hour) == 24
+    assert set(comparison["day_type"]) == {"Weekday", "Weekend"}
+
+
+def test_repository_batch_isolates_one_failed_request(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    repository = CoalescingAnalyticsRepository(DemoAnalyticsRepository())
+    warnings: list[str] = []
+    monkeypatch.setattr(components.st, "warning", warnings.append)
+
+    products, kpis = components.load_repository_batch(
+        repository,
+        [("products", {"limit": 0}), ("overview_kpis", {})],
+        loading_label="Loading",
+    )
+
+    assert products is None
+    assert len(kpis) == 1
+    assert len(warnings) == 1
+
+
+def test_iter_repository_batch_yields_every_request_position_once() -> None:
+    repository = CoalescingAnalyticsRepository(DemoAnalyticsRepository())
+    requests = [("products", {"limit": limit}) for limit in (1, 2, 3, 4)]
+
+    completed = dict(components.iter_repository_batch(repository, requests))
+
+    assert sorted(completed) == [0, 1, 2, 3]
+    assert [len(completed[index].result()) for index in range(4)] == [1, 2, 3, 4]
@@ -0,0 +1,90 @@
+import json
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+from dashboard.coalescing import CoalescingAnalyticsRepository
+from dashboard.data import (
+    DemoAnalyticsRepository,
+    MariaDBAnalyticsRepository,
+    RepositoryConfigurationError,
+    create_repository,
+)
+from dashboard.instrumentation import QueryRecorder
+
+
+def test_recorder_summarizes_rolling_percentiles_and_cache_hit_rate() -> None:
+    recorder = QueryRecorder(window=4)
+    frame = pd.DataFrame({"orders": [1, 2, 3]})
+    for elapsed_ms in (100.0, 10.0, 20.0, 30.0, 40.0):
+        recorder.record_query("departments", elapsed_ms=elapsed_ms, frame=frame)
+    for outcome in ("miss", "fresh", "coalesced", "stale"):
+        recorder.record_cache("departments", outcome)
+
+    row = recorder.summary().set_index("method").loc["departments"]
+
+    assert row["queries"] == 4
+    assert row["p50_ms"] == pytest.approx(25.0)
+    assert row["max_ms"] == pytest.approx(40.0)
+    assert row["avg_rows"] == pytest.approx(3.0)
+    assert row["cache_hit_rate_pct"] == pytest.approx(75.0)
+    with pytest.raises(ValueError, match="outcome"):
+        recorder.record_cache("departments", "warm")
+
+
+def test_recorder_json_export_contains_summary_and_records_without_sql() -> None:
+    recorder = QueryRecorder(slow_query_ms=5)
+    recorder.record_query(
+        "products", elapsed_ms=7.5, frame=pd.DataFrame({"a": [1]}), plan_json="{}"
+    )
+    recorder.record_cache("overview_kpis", "miss")
+
+    payload = json.loads(recorder.to_json())
+
+    assert payload["slow_query_ms"] == 5
+    assert {row["method"] for row in payload["summary"]} == {"products", "overview_kpis"}
+    assert payload["queries"][0]["plan_json"] == "{}"
+    assert "statement" not in payload["queries"][0]
+
+
+def test_live_read_frame_records_latency_rows_and_sanitizes_failed_plans() -> None:
+    recorder = QueryRecorder(slow_query_ms=0)
+    repository = MariaDBAnalyticsRepository(create_engine("sqlite://"), recorder=recorder)
+
+    frame = repository._read_frame(
+        "SELECT :value AS value UNION ALL SELECT 2", {"value": 1}, operation="probe"
+    )
+
+    (record,) = recorder.records()
+    assert frame["value"].tolist() == [1, 2]
+    assert (record.method, record.rows) == ("probe", 2)
+    assert record.elapsed_ms >= 0
+    assert record.result_bytes > 0
+    # SQLite has no EXPLAIN FORMAT=JSON; plan capture must fail closed.
+    assert record.plan_json is None
+
+
+def test_coalescing_layer_records_misses_and_fresh_hits() -> None:
+    repository = CoalescingAnalyticsRepository(DemoAnalyticsRepository())
+
+    repository.day_trends()
+    repository.day_trends()
+
+    row = repository.query_recorder.summary().set_index("method").loc["day_trends"]
+    assert row["cache_requests"] == 2
+    assert row["cache_hit_rate_pct"] == pytest.approx(50.0)
+    assert DemoAnalyticsRepository().query_recorder is None
+
+
+@pytest.mark.parametrize("threshold", ["slow", "-1"])
+def test_create_repository_rejects_invalid_slow_query_threshold(threshold: str) -> None:
+    with pytest.raises(RepositoryConfigurationError, match="DASHBOARD_SLOW_QUERY_MS"):
+        create_repository(
+            {
+                "DASHBOARD_MODE": "auto",
+                "engine": MagicMock(),
+                "DASHBOARD_SLOW_QUERY_MS": threshold,
+            }
+        )
@@ -5,8 +5,9 @@ from types import SimpleNamespace
 from unittest.mock import MagicMock
 
 import pytest
+from sqlalchemy import create_engine, text
 
-from etl import etl_pipeline
+from etl import etl_pipeline, eval_orders, mining_sample
 from etl.etl_pipeline import PipelineError, StageReport
 from etl.quality import WarehouseCheckResult
 
@@ -70,21 +71,40 @@ def test_empty_target_guard_accepts_empty_and_summarizes_populated_tables(
     assert "--reset-data --yes" in str(error.value)
 
 
-def test_reset_load_data_disables_and_restores_foreign_key_checks() -> None:
+@pytest.mark.parametrize("samples_present", [True, False])
+def test_reset_load_data_disables_and_restores_foreign_key_checks(
+    monkeypatch: pytest.MonkeyPatch, samples_present: bool
+) -> None:
     engine = MagicMock()
     connection = engine.connect.return_value.__enter__.return_value
+    monkeypatch.setattr(
+        etl_pipeline, "sample_tables_present", MagicMock(return_value=samples_present)
+    )
+    monkeypatch.setattr(
+        etl_pipeline, "eval_orders_table_present", MagicMock(return_value=samples_present)
+    )
 
     etl_pipeline.reset_load_data(engine)
 
     statements = [call.args[0] for call in connection.exec_driver_sql.call_args_list]
     assert statements[0] == "SET FOREIGN_KEY_CHECKS=0"
     assert statements[-1] == "SET FOREIGN_KEY_CHECKS=1"
+    sample_tables = (
+        ["Mining_Order_Sample", "Mining_Sample_Seeds", "Mining_Eval_Orders"]
+        if samples_present
+        else []
+    )
     assert statements[1:-1] == [
-        f"TRUNCATE TABLE {table}" for table in etl_pipeline.MUTABLE_TABLES
+        f"TRUNCATE TABLE {table}"
+        for table in (*sample_tables, *etl_pipeline.MUTABLE_TABLES)
     ]
 
 
-def test_reset_load_data_restores_foreign_keys_after_truncate_failure() -> None:
+def test_reset_load_data_restores_foreign_keys_after_truncate_failure(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(etl_pipeline, "sample_tables_present", MagicMock(return_value=True))
+    monkeypatch.setattr(etl_pipeline, "eval_orders_table_present", MagicMock(return_value=True))
     engine = MagicMock()
     connection = engine.connect.return_value.__enter__.return_value
 
@@ -100,6 +120,38 @@ def test_reset_load_data_restores_foreign_keys_after_truncate_failure() -> None:
     connection.exec_driver_sql.assert_called_with("SET FOREIGN_KEY_CHECKS=1")
 
 
+def test_build_order_samples_replaces_rankings_once_per_seed() -> None:
+    engine = MagicMock()
+    connection = engine.begin.return_value.__enter__.return_value
+    connection.execute.return_value.rowcount = 3
+
+    rows = mining_sample.build_order_samples(engine, [7, 42, 7])
+
+    statements = [" ".join(str(call.args[0]).split()) for call in connection.execute.call_args_list]
+    assert rows == 6
+    assert statements[:2] == ["DELETE FROM Mining_Sample_Seeds", "DELETE FROM Mining_Order_Sample"]
+    assert [call.args[1] for call in connection.execute.call_args_list[2:]] == [
+        {"seed": 7},
+        {"seed": 7, "orders": 3},
+        {"seed": 42},
+        {"seed": 42, "orders": 3},
+    ]
+    assert "ROW_NUMBER() OVER (ORDER BY CRC32" in statements[2]
+
+
+def test_build_eval_orders_records_only_train_orders(settings_factory) -> None:
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE Mining_Eval_Orders (order_id INT, user_id INT)"))
+        connection.execute(text("INSERT INTO Mining_Eval_Orders VALUES (99, 9)"))
+    settings = settings_factory(data_path=Path(__file__).parent / "fixtures" / "data")
+
+    assert eval_orders.eval_orders_table_present(engine)
+    assert eval_orders.build_eval_orders(engine, settings) == 2
+    assert eval_orders.held_out_order_ids(engine).tolist() == [3, 5]
+    assert eval_orders.held_out_order_ids(create_engine("sqlite://")) is None
+
+
 def test_timed_stage_returns_integer_rows_and_elapsed_time(
     monkeypatch: pytest.MonkeyPatch,
 ) -> None:
@@ -173,6 +225,12 @@ def test_run_pipeline_orchestrates_all_stages_and_quality_gate(
             )
         ),
     )
+    monkeypatch.setattr(etl_pipeline, "sample_tables_present", MagicMock(return_value=True))
+    sample_build = MagicMock(return_value=5)
+    monkeypatch.setattr(etl_pipeline, "build_order_samples", sample_build)
+    monkeypatch.setattr(etl_pipeline, "eval_orders_table_present", MagicMock(return_value=True))
+    eval_build = MagicMock(return_value=2)
+    monkeypatch.setattr(etl_pipeline, "build_eval_orders", eval_build)
     check = WarehouseCheckResult("duplicate_orders", actual=0, expected=0)
     monkeypatch.setattr(etl_pipeline, "run_warehouse_checks", MagicMock(return_value=(check,)))
     monkeypatch.setattr(
@@ -188,12 +246,16 @@ def test_run_pipeline_orchestrates_all_stages_and_quality_gate(
         ("orders", 5),
         ("order_details", 6),
         ("derived_metrics", 7),
+        ("mining_samples", 5),
+        ("eval_orders", 2),
     ]
     assert counts == {"Fact_Orders": 5, "Fact_Order_Details": 6}
     assert checks[0]["passed"] is True
     reset.assert_called_once_with(engine)
     department_load.assert_called_once_with(dimension_connection, settings)
     order_load.assert_called_once_with(engine, settings)
+    sample_build.assert_called_once_with(engine, (42,))
+    eval_build.assert_called_once_with(engine, settings)
 
 
 @pytest.mark.parametrize(
@@ -234,8 +296,8 @@ def test_cli_dry_run_checks_files_without_connecting(
 def test_cli_writes_deterministic_success_report(
     monkeypatch: pytest.MonkeyPatch, settings_factory, tmp_path: Path
 ) -> None:
-    settings = settings_factory(db_password="must-not-leak")
     report_path = tmp_path / "reports" / "success.json"
+    settings = settings_factory(db_password="must-not-leak", etl_report_path=report_path)
     stage = StageReport("orders", rows=2, elapsed_seconds=0.25)
     monkeypatch.setattr(etl_pipeline, "get_settings", MagicMock(return_value=settings))
     monkeypatch.setattr(
@@ -265,12 +327,13 @@ def test_cli_writes_deterministic_success_report(
         MagicMock(side_effect=[100.0, 102.345]),
     )
 
-    exit_code = etl_pipeline.cli(["--report", str(report_path)])
+    exit_code = etl_pipeline.cli([])
     payload = json.loads(report_path.read_text(encoding="utf-8"))
 
     assert exit_code == 0
     assert payload["status"] == "succeeded"
     assert payload["run_id"] == "00000000-0000-0000-0000-000000000042"
+    assert payload["loaded_run_id"] == payload["run_id"]
     assert payload["elapsed_seconds"] == 2.345
     assert payload["stages"] == [{"name": "orders", "rows": 2, "elapsed_seconds": 0.25}]
     assert payload["table_counts"] == {"Fact_Orders": 2}
@@ -282,6 +345,7 @@ def test_cli_converts_pipeline_failure_to_nonzero_report(
 ) -> None:
     settings = settings_factory()
     report_path = tmp_path / "failure.json"
+    report_path.write_text(json.dumps({"loaded_run_id": "previous-load"}), encoding="utf-8")
     monkeypatch.setattr(etl_pipeline, "get_settings", MagicMock(return_value=settings))
     monkeypatch.setattr(
         etl_pipeline,
@@ -295,6 +359,8 @@ def test_cli_converts_pipeline_failure_to_nonzero_report(
     assert exit_code == 1
     assert payload["status"] == "failed"
     assert payload["mode"] == "validate"
+    # Validation never changes tables, so the last load still identifies the data.
+    assert payload["loaded_run_id"] == "previous-load"
     assert payload["error_type"] == "PipelineError"
     assert payload["error"] == "fixture warehouse is invalid"
     assert "ETL failed: PipelineError" in capsys.readouterr().err
@@ -0,0 +1,82 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, text
+
+from mining.basket_store import (
+    BasketArrays,
+    load_baskets,
+    loaded_run_id,
+    save_baskets,
+    store_key,
+)
+
+
+def _baskets() -> BasketArrays:
+    return BasketArrays(
+        order_ids=np.array([11, 12, 13], dtype=np.int64),
+        indptr=np.array([0, 1, 4, 6], dtype=np.int32),
+        indices=np.array([5, 1, 2, 3, 2, 9], dtype=np.int32),
+        attributes={
+            "user_id": np.array([7, 7, 8], dtype=np.int32),
+            "days_since_prior_order": np.array([np.nan, 3.0, 30.0], dtype=np.float32),
+        },
+    )
+
+
+def test_store_round_trips_memory_mapped_arrays_and_attributes(tmp_path: Path) -> None:
+    directory = tmp_path / store_key("run-1", 42, 100)
+    save_baskets(_baskets(), directory, key_fields={"etl_run_id": "run-1"})
+
+    loaded = load_baskets(directory)
+
+    assert loaded is not None
+    assert isinstance(loaded.indices, np.memmap)
+    assert loaded.to_lists() == [["5"], ["1", "2", "3"], ["2", "9"]]
+    assert loaded.attributes["user_id"].tolist() == [7, 7, 8]
+    manifest = json.loads((directory / "manifest.json").read_text(encoding="utf-8"))
+    assert (manifest["baskets"], manifest["lines"], manifest["etl_run_id"]) == (3, 6, "run-1")
+
+    filtered = loaded.with_min_items(2)
+    assert filtered.order_ids.tolist() == [12, 13]
+    assert filtered.indptr.tolist() == [0, 3, 5]
+    assert filtered.attributes["days_since_prior_order"].tolist() == [3.0, 30.0]
+
+
+def test_incompatible_or_missing_store_is_ignored(tmp_path: Path) -> None:
+    directory = tmp_path / "store"
+    assert load_baskets(directory) is None
+
+    save_baskets(_baskets(), directory, key_fields={})
+    manifest = directory / "manifest.json"
+    manifest.write_text(json.dumps({"basket_store_schema_version": 0}), encoding="utf-8")
+
+    assert load_baskets(directory) is None
+
+
+def test_store_keys_follow_the_last_successful_load(tmp_path: Path) -> None:
+    report = tmp_path / "latest.json"
+    assert loaded_run_id(report) is None
+    report.write_text(json.dumps({"run_id": "b", "loaded_run_id": "a"}), encoding="utf-8")
+
+    assert loaded_run_id(report) == "a"
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE Fact_Orders (order_id INTEGER PRIMARY KEY)"))
+        connection.execute(text("INSERT INTO Fact_Orders VALUES (1), (2)"))
+    # Without recorded counts the report cannot be matched to the warehouse.
+    assert loaded_run_id(report, engine) is None
+    report.write_text(
+        json.dumps({"loaded_run_id": "a", "table_counts": {"Fact_Orders": 2}}), encoding="utf-8"
+    )
+    assert loaded_run_id(report, engine) == "a"
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO Fact_Orders VALUES (3)"))
+    # A later load reported elsewhere changed the warehouse, so this report is stale.
+    assert loaded_run_id(report, engine) is None
+    assert store_key("a", 42, None) == "a-seed42-full"
+    assert store_key("a", 42, 1_000) != store_key("a", 7, 1_000)
+    with pytest.raises(ValueError, match="run_id"):
+        store_key("../escape", 42, None)
@@ -3,8 +3,11 @@ from pathlib import Path
 import numpy as np
 import pandas as pd
 import pytest
+from sqlalchemy import create_engine, text
 
 import mining.customer_clustering as clustering
+import mining.recommendation as recommendation
+from mining.artifacts import file_digest
 
 
 @pytest.fixture
@@ -104,6 +107,69 @@ def test_find_optimal_k_bounds_candidates_by_available_rows(
     assert all(call == {} for call in calls)
 
 
+def test_parallel_sweep_matches_the_serial_sweep_and_reuses_the_selected_model(
+    customer_features: pd.DataFrame,
+) -> None:
+    scaled = clustering.StandardScaler().fit_transform(
+        customer_features.loc[:, clustering.FEATURE_COLUMNS]
+    )
+    options = {"max_k": 5, "random_state": 5, "silhouette_sample_size": 12}
+    serial = clustering.sweep_k(scaled, **options)
+    parallel = clustering.sweep_k(scaled, workers=2, **options)
+
+    assert (serial.workers, parallel.workers) == (1, 2)
+    assert [candidate.k for candidate in parallel.candidates] == [2, 3, 4, 5]
+    assert [(c.inertia, c.silhouette) for c in parallel.candidates] == pytest.approx(
+        [(c.inertia, c.silhouette) for c in serial.candidates]
+    )
+    assert parallel.optimal_k == serial.optimal_k
+    assert all(candidate.seconds > 0 for candidate in parallel.candidates)
+
+    candidate = parallel.candidate(parallel.optimal_k)
+    clustered, model, _, _ = clustering.train_kmeans(
+        customer_features,
+        n_clusters=parallel.optimal_k,
+        random_state=5,
+        silhouette_sample_size=12,
+        candidate=candidate.model,
+    )
+    assert model is candidate.model
+    assert clustered["cluster"].tolist() == candidate.model.labels_.tolist()
+    assert model.training_metrics_["inertia"] == pytest.approx(candidate.inertia)
+    with pytest.raises(ValueError, match="n_clusters"):
+        clustering.train_kmeans(customer_features, n_clusters=3, candidate=candidate.model)
+
+
+@pytest.mark.parametrize("strategy", ["minibatch", "subsample"])
+def test_cheap_sweeps_refine_the_selected_k_on_every_user(
+    customer_features: pd.DataFrame, strategy: str
+) -> None:
+    scaled = clustering.StandardScaler().fit_transform(
+        customer_features.loc[:, clustering.FEATURE_COLUMNS]
+    )
+    sweep = clustering.sweep_k(
+        scaled,
+        max_k=4,
+        random_state=3,
+        silhouette_sample_size=12,
+        strategy=strategy,
+        sample_size=8,
+    )
+
+    assert sweep.strategy == strategy
+    assert sweep.optimal_k == 2
+    candidate = sweep.candidate(2)
+    clustered, model, _, _ = clustering.train_kmeans(
+        customer_features, n_clusters=2, random_state=3, candidate=candidate.model
+    )
+    assert model is not candidate.model
+    assert model.n_init == 1
+    # The two well-separated groups of six users survive the cheap sweep.
+    assert sorted(clustered["cluster"].value_counts().tolist()) == [6, 6]
+    with pytest.raises(ValueError, match="strategy"):
+        clustering.sweep_k(scaled, strategy="exhaustive")
+
+
 def test_bounded_silhouette_expands_a_too_small_sample_deterministically() -> None:
     values = np.asarray([[0.0], [0.1], [5.0], [5.1], [10.0], [10.1]])
     labels = np.asarray([0, 0, 1, 1, 2, 2])
@@ -152,6 +218,74 @@ def test_cluster_profiles_and_labels_are_written_to_requested_directory(
     assert saved_labels["user_id"].tolist() == sorted(customer_features["user_id"])
 
 
+def test_cluster_popularity_is_published_once_and_served_as_a_lookup(tmp_path: Path) -> None:
+    engine = create_engine(f"sqlite:///{tmp_path / 'warehouse.db'}")
+    rng = np.random.default_rng(8)
+    orders = pd.DataFrame({"order_id": range(200), "user_id": rng.integers(1, 21, size=200)})
+    details = pd.DataFrame(
+        {
+            "order_id": np.repeat(orders["order_id"], 4),
+            "product_id": rng.integers(1, 16, size=800),
+            "reordered": rng.integers(0, 2, size=800),
+        }
+    ).drop_duplicates(["order_id", "product_id"])
+    with engine.begin() as connection:
+        orders.to_sql("Fact_Orders", connection, index=False)
+        details.to_sql("Fact_Order_Details", connection, index=False)
+        pd.DataFrame(
+            {"product_id": range(1, 16), "product_name": [f"Item {i}" for i in range(1, 16)]}
+        ).to_sql("Dim_Product", connection, index=False)
+        connection.execute(
+            text("CREATE TABLE Mining_User_Cluster (user_id INT PRIMARY KEY, cluster_id INT)")
+        )
+        connection.execute(
+            text(
+                "CREATE TABLE Mining_Cluster_Popularity (cluster_id INT, popularity_rank INT, "
+                "product_id INT, order_count INT, reorder_rate DECIMAL(7, 6))"
+            )
+        )
+    assert clustering.cluster_tables_present(engine)
+    labels = pd.DataFrame({"user_id": range(1, 21), "cluster": np.arange(20) % 2})
+
+    clustering.publish_cluster_popularity(engine, labels.assign(cluster=0), depth=3)
+    popularity = clustering.publish_cluster_popularity(engine, labels, depth=5)
+
+    lines = details.merge(orders).merge(labels)
+    expected = (
+        lines.groupby(["cluster", "product_id"])
+        .agg(order_count=("order_id", "nunique"), reorder_rate=("reordered", "mean"))
+        .reset_index()
+        .sort_values(
+            ["cluster", "order_count", "reorder_rate", "product_id"],
+            ascending=[True, False, False, True],
+        )
+        .groupby("cluster")
+        .head(5)
+    )
+    assert popularity["popularity_rank"].tolist() == [1, 2, 3, 4, 5] * 2
+    assert popularity[["cluster", "product_id", "order_count"]].values.tolist() == (
+        expected[["cluster", "product_id", "order_count"]].values.tolist()
+    )
+    with engine.connect() as connection:
+        stored = connection.execute(text("SELECT COUNT(*) FROM Mining_User_Cluster")).scalar()
+    assert stored == 20
+
+    labels_path = clustering.save_cluster_labels(labels, output_dir=tmp_path)
+    path = clustering.save_cluster_popularity(
+        popularity, output_dir=tmp_path, labels_digest=file_digest(labels_path)
+    )
+    served = recommendation.load_cluster_popularity(path, labels_path=labels_path)
+    assert "labels_digest" not in served.columns
+    top = served[served["cluster"].eq(1)]["product_name"].tolist()
+    assert recommendation.recommend_by_cluster(
+        2, labels, 3, exclude_items=[top[0]], popularity=served
+    ) == top[1:4]
+    swapped = labels.assign(cluster=1 - labels["cluster"])
+    clustering.save_cluster_labels(swapped, output_dir=tmp_path)
+    with pytest.raises(recommendation.RecommendationDataError, match="rerun instacart-cluster"):
+        recommendation.load_cluster_popularity(path, labels_path=labels_path)
+
+
 def test_clustering_parser_accepts_reproducibility_controls() -> None:
     args = clustering.build_parser().parse_args(
         [
@@ -165,9 +299,15 @@ def test_clustering_parser_accepts_reproducibility_controls() -> None:
             "500",
             "--seed",
             "99",
+            "--workers",
+            "4",
+            "--sweep-strategy",
+            "subsample",
             "--no-plots",
         ]
     )
 
     assert (args.min_orders, args.max_k, args.clusters) == (5, 7, 3)
     assert (args.silhouette_sample_size, args.seed, args.no_plots) == (500, 99, True)
+    assert (args.workers, args.sweep_strategy) == (4, "subsample")
+    assert args.sweep_sample_size == clustering.DEFAULT_SWEEP_SAMPLE_SIZE
@@ -0,0 +1,102 @@
+import json
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import mining.evaluation as evaluation
+from mining.artifacts import file_digest, itemset_to_json
+
+FIXTURE_DATA = Path(__file__).parent / "fixtures" / "data"
+
+
+def test_train_orders_become_cart_prefixes_with_held_out_targets(settings_factory) -> None:
+    cases = evaluation.load_train_cases(
+        settings_factory(data_path=FIXTURE_DATA), cart_fraction=0.5
+    )
+
+    assert cases == [
+        evaluation.EvaluationCase(100, 3, ("10",), frozenset({"20", "21"})),
+        evaluation.EvaluationCase(200, 5, ("20",), frozenset({"11"})),
+    ]
+    with pytest.raises(ValueError):
+        evaluation.split_train_orders(pd.DataFrame(), pd.DataFrame(), cart_fraction=1.0)
+
+
+def test_rankings_score_hit_rate_and_average_precision() -> None:
+    hits, average_precision = evaluation.score_ranking(["a", "b", "c"], frozenset("bc"), (1, 3))
+
+    assert hits.tolist() == [0.0, 1.0]
+    assert average_precision.tolist() == pytest.approx([0.0, (1 / 2 + 2 / 3) / 2])
+
+
+def test_offline_evaluation_scores_every_case_in_a_process_pool(
+    tmp_path: Path, settings_factory
+) -> None:
+    pd.DataFrame(
+        [
+            {
+                "antecedents_json": itemset_to_json({antecedent}),
+                "consequents_json": itemset_to_json({consequent}),
+                "support": 0.2,
+                "confidence": 0.8,
+                "lift": 1.5,
+            }
+            for antecedent, consequent in (("10", "20"), ("20", "10"))
+        ]
+    ).to_csv(tmp_path / "association_rules.csv", index=False)
+    pd.DataFrame({"user_id": [100, 200], "cluster": [0, 0]}).to_csv(
+        tmp_path / "cluster_labels.csv", index=False
+    )
+    pd.DataFrame(
+        {
+            "cluster": [0, 0],
+            "popularity_rank": [1, 2],
+            "product_id": [21, 10],
+            "product_name": ["Lime", "Banana"],
+            "labels_digest": file_digest(tmp_path / "cluster_labels.csv"),
+        }
+    ).to_csv(tmp_path / "cluster_popularity.csv", index=False)
+    cases = evaluation.load_train_cases(settings_factory(data_path=FIXTURE_DATA))
+    paths = {
+        "rules_path": tmp_path / "association_rules.csv",
+        "clusters_path": tmp_path / "cluster_labels.csv",
+        "popularity_path": tmp_path / "cluster_popularity.csv",
+    }
+
+    with pytest.raises(evaluation.TrainLeakageError, match="not mined with --exclude-train"):
+        evaluation.evaluate_offline(cases, **paths)
+    (tmp_path / "market_basket_metadata.json").write_text(
+        json.dumps(
+            {"excludes_train_orders": True, "artifacts": {"rules": "association_rules.csv"}}
+        ),
+        encoding="utf-8",
+    )
+    (tmp_path / "clustering_metadata.json").write_text(
+        json.dumps(
+            {
+                "excludes_train_orders": True,
+                "labels_digest": file_digest(tmp_path / "cluster_labels.csv"),
+            }
+        ),
+        encoding="utf-8",
+    )
+    assert evaluation.train_order_sources(**paths) == []
+    assert evaluation.train_order_sources(paths["rules_path"], paths["clusters_path"], None) == [
+        "live cluster popularity ranks every warehouse order"
+    ]
+
+    report = evaluation.evaluate_offline(cases, **paths, ks=(2, 1), catalogue_size=4, workers=2)
+
+    assert report["train_order_sources"] == []
+    assert (report["requests"], report["workers"], report["shards"]) == (2, 2, 2)
+    assert report["metrics"]["1"] == {
+        "hit_rate": 0.5,
+        "map": 0.5,
+        "distinct_products": 2,
+        "coverage": 0.5,
+    }
+    assert report["metrics"]["2"]["hit_rate"] == 0.5
+    assert report["metrics"]["2"]["distinct_products"] == 3
+    assert report["latency_ms"]["p50"] <= report["latency_ms"]["max"]
+    json.dumps(report)
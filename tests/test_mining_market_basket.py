@@ -1,14 +1,34 @@
+import subprocess
+import sys
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 import pytest
+from mlxtend.frequent_patterns import association_rules
+from sqlalchemy import create_engine, text
 
+from mining import market_basket
 from mining.artifacts import itemset_from_json
+from mining.basket_store import BasketArrays
+from mining.compaction_benchmark import compaction_report
 from mining.market_basket import (
+    BasketDataError,
+    basket_frame,
     build_parser,
+    compact_itemsets,
     create_basket_matrix,
+    encode_baskets,
+    extract_basket_arrays,
+    extract_transactions,
+    generate_rules,
+    persisted_sample_size,
+    run_counts,
+    run_fpgrowth,
+    run_partitioned,
     save_frequent_itemsets,
     save_rules,
+    search_min_support,
 )
 
 
@@ -27,6 +47,23 @@ def test_basket_matrix_is_sparse_and_preserves_every_transaction() -> None:
     ]
 
 
+def test_integer_basket_encoding_counts_baskets_not_lines_and_keeps_empty_rows() -> None:
+    # Baskets: {7, 7, 3}, {5}, {3, 5}, {9}; product 7 repeats within one basket.
+    indptr = np.array([0, 3, 4, 6, 7])
+    product_ids = np.array([7, 7, 3, 5, 3, 5, 9])
+
+    matrix, selected = encode_baskets(indptr, product_ids, n_items=10, top_n_products=3)
+
+    # 3 and 5 appear in two baskets; 7 beats 9 on the product-ID tie-break.
+    assert selected.tolist() == [3, 5, 7]
+    assert matrix.dtype == bool
+    assert matrix.toarray().astype(int).tolist() == [[1, 0, 1], [0, 1, 0], [1, 1, 0], [0, 0, 0]]
+    frame = basket_frame(matrix, selected)
+    assert frame.columns.tolist() == ["3", "5", "7"]
+    assert (frame.dtypes == pd.SparseDtype(bool, False)).all()
+    assert frame.sparse.to_dense().sum().tolist() == [2, 2, 1]
+
+
 def test_frequent_itemset_serialization_preserves_exact_ids_and_names(
     tmp_path: Path,
 ) -> None:
@@ -91,3 +128,267 @@ def test_market_basket_parser_rejects_sample_and_full_modes_together() -> None:
 
     args = parser.parse_args(["--order-limit", "100", "--seed", "7", "--no-plot"])
     assert (args.order_limit, args.full, args.seed, args.no_plot) == (100, False, 7, True)
+
+
+ORDER_LINES = pd.DataFrame(
+    {
+        "order_id": [1, 1, 2, 3, 3, 3, 3, 3, 4, 4, 5],
+        "product_id": [10, 11, 12, 13, 14, 15, 16, 17, 18, 10, 19],
+        "user_id": [1, 1, 2, 3, 3, 3, 3, 3, 1, 1, 4],
+    }
+)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 4, 11])
+def test_array_extraction_carries_baskets_across_chunk_edges(
+    monkeypatch: pytest.MonkeyPatch, chunk_size: int
+) -> None:
+    def chunks(engine, *, limit, random_state, chunk_size):
+        for start in range(0, len(ORDER_LINES), chunk_size):
+            yield ORDER_LINES.iloc[start : start + chunk_size]
+
+    monkeypatch.setattr(market_basket, "_transaction_chunks", chunks)
+    options = {"engine": object(), "random_state": 1, "chunk_size": chunk_size}
+
+    baskets = extract_basket_arrays(10, 2, **options)
+
+    assert baskets.order_ids.tolist() == [1, 3, 4]
+    assert baskets.indptr.tolist() == [0, 2, 7, 9]
+    assert baskets.indices.dtype == np.int32
+    assert baskets.indices.tolist() == [10, 11, 13, 14, 15, 16, 17, 18, 10]
+    assert baskets.attributes["user_id"].tolist() == [1, 3, 1]
+    assert extract_transactions(10, 1, **options) == [
+        ["10", "11"],
+        ["12"],
+        ["13", "14", "15", "16", "17"],
+        ["18", "10"],
+        ["19"],
+    ]
+    with pytest.raises(BasketDataError, match="min_items=6"):
+        extract_basket_arrays(10, 6, **options)
+
+
+def test_persisted_sample_is_a_rank_range_read(tmp_path: Path) -> None:
+    engine = create_engine(f"sqlite:///{tmp_path / 'warehouse.db'}")
+    orders = pd.DataFrame(
+        {
+            "order_id": [1, 2, 3, 4],
+            "user_id": [7, 7, 8, 9],
+            "time_id": [9, 9, 109, 614],
+            "days_since_prior_order": [None, 3.0, 1.0, 30.0],
+        }
+    )
+    assert persisted_sample_size(engine, 42) is None
+    with engine.begin() as connection:
+        orders.to_sql("Fact_Orders", connection, index=False)
+        ORDER_LINES.assign(add_to_cart_order=ORDER_LINES.groupby("order_id").cumcount()).loc[
+            :, ["order_id", "product_id", "add_to_cart_order"]
+        ].to_sql("Fact_Order_Details", connection, index=False)
+        pd.DataFrame(
+            {"time_id": [9, 109, 614], "order_dow": [0, 1, 6], "order_hour": [9, 9, 14]}
+        ).to_sql("Dim_Time", connection, index=False)
+        pd.DataFrame(
+            {"seed": 42, "sample_rank": [0, 1, 2, 3], "order_id": [4, 1, 3, 2]}
+        ).to_sql("Mining_Order_Sample", connection, index=False)
+        pd.DataFrame({"seed": [42], "orders": [4]}).to_sql(
+            "Mining_Sample_Seeds", connection, index=False
+        )
+
+    baskets = extract_basket_arrays(3, 1, engine=engine, random_state=42, chunk_size=2)
+
+    assert persisted_sample_size(engine, 42) == 4
+    assert persisted_sample_size(engine, 7) is None
+    assert baskets.order_ids.tolist() == [1, 3, 4]
+    assert baskets.indices.tolist() == [10, 11, 13, 14, 15, 16, 17, 18, 10]
+
+    # A ranking from an earlier load no longer matches Fact_Orders and is ignored.
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM Fact_Orders WHERE order_id = 2"))
+    assert persisted_sample_size(engine, 42) is None
+    assert baskets.attributes["order_dow"].tolist() == [0, 1, 6]
+
+
+def test_sparse_counting_matches_fpgrowth_up_to_triples() -> None:
+    rng = np.random.default_rng(3)
+    transactions = [
+        [str(item) for item in rng.zipf(1.4, size=rng.integers(2, 12)) % 60]
+        for _ in range(3_000)
+    ]
+    matrix = create_basket_matrix(transactions, top_n_products=40)
+
+    counted = run_counts(matrix, min_support=0.005)
+    reference = run_fpgrowth(matrix, min_support=0.005)
+    reference = reference[reference["length"] <= 3]
+
+    assert counted.columns.tolist() == reference.columns.tolist()
+    assert counted["length"].max() == 3
+    assert dict(zip(counted["itemsets"], counted["support"], strict=True)) == pytest.approx(
+        dict(zip(reference["itemsets"], reference["support"], strict=True))
+    )
+    assert not generate_rules(counted, min_threshold=0.1).empty
+
+
+RULE_COLUMNS = [
+    "antecedent support",
+    "consequent support",
+    "support",
+    "confidence",
+    "lift",
+    "leverage",
+    "conviction",
+]
+
+
+def test_vectorized_rules_match_mlxtend_and_prune_per_antecedent() -> None:
+    rng = np.random.default_rng(11)
+    transactions = [
+        [str(item) for item in rng.zipf(1.3, size=rng.integers(2, 12)) % 40]
+        for _ in range(2_000)
+    ]
+    itemsets = run_fpgrowth(create_basket_matrix(transactions, top_n_products=30), 0.01)
+    reference = association_rules(itemsets, min_threshold=0.2, support_only=False)
+
+    rules = generate_rules(itemsets, min_threshold=0.2)
+    pruned = generate_rules(itemsets, min_threshold=0.2, min_lift=1.1, top_k=2)
+
+    def by_rule(frame: pd.DataFrame) -> dict:
+        return {
+            (row[0], row[1]): row[2:]
+            for row in frame.loc[:, ["antecedents", "consequents", *RULE_COLUMNS]].itertuples(
+                index=False
+            )
+        }
+
+    expected = by_rule(reference)
+    actual = by_rule(rules)
+    assert itemsets["length"].max() >= 3
+    assert actual.keys() == expected.keys()
+    for key, values in expected.items():
+        assert actual[key] == pytest.approx(values)
+    assert rules["lift"].is_monotonic_decreasing
+    assert (pruned["lift"] >= 1.1).all()
+    assert pruned.groupby("antecedents").size().max() <= 2
+    for antecedent, group in pruned.groupby("antecedents"):
+        candidates = rules[(rules["antecedents"] == antecedent) & (rules["lift"] >= 1.1)]
+        assert group["lift"].tolist() == candidates["lift"].head(2).tolist()
+    with pytest.raises(BasketDataError, match="lift>=100"):
+        generate_rules(itemsets, min_threshold=0.2, min_lift=100)
+
+
+def test_compaction_keeps_closed_or_maximal_bases_and_their_exact_rules() -> None:
+    rng = np.random.default_rng(5)
+    transactions = [
+        sorted({str(item) for item in rng.zipf(1.3, size=rng.integers(2, 10)) % 25})
+        for _ in range(1_500)
+    ]
+    # Items 90 and 91 always co-occur, so neither single item is closed.
+    transactions += [["90", "91", "1"]] * 60
+    itemsets = run_fpgrowth(create_basket_matrix(transactions, top_n_products=30), 0.01)
+    support = dict(zip(itemsets["itemsets"], itemsets["support"], strict=True))
+
+    closed = compact_itemsets(itemsets)
+    maximal = compact_itemsets(itemsets, "maximal")
+
+    def supersets(itemset: frozenset) -> list[frozenset]:
+        return [other for other in support if itemset < other]
+
+    assert set(closed["itemsets"]) == {
+        itemset
+        for itemset in support
+        if all(support[other] != pytest.approx(support[itemset]) for other in supersets(itemset))
+    }
+    assert set(maximal["itemsets"]) == {itemset for itemset in support if not supersets(itemset)}
+    assert frozenset({"90"}) not in set(closed["itemsets"])
+    assert len(maximal) < len(closed) < len(itemsets)
+
+    rules = generate_rules(itemsets, min_threshold=0.2)
+    compacted = generate_rules(itemsets, min_threshold=0.2, bases=closed)
+    full = {(row.antecedents, row.consequents): row.lift for row in rules.itertuples()}
+    assert 0 < len(compacted) < len(rules)
+    for row in compacted.itertuples():
+        assert row.antecedents | row.consequents in set(closed["itemsets"])
+        assert row.lift == pytest.approx(full[(row.antecedents, row.consequents)])
+
+    codes = [[int(item) for item in transaction] for transaction in transactions[:50]]
+    baskets = BasketArrays(
+        order_ids=np.arange(50, dtype=np.int64),
+        indptr=np.cumsum([0, *map(len, codes)]),
+        indices=np.concatenate(codes),
+    )
+    report = compaction_report(itemsets, closed, rules, compacted, baskets, carts=20)
+    assert report["itemsets_after"] == len(closed)
+    assert report["rules_before"] == len(rules)
+    assert report["latency_carts"] == 20
+    assert report["recommendation_ms_before"] > 0
+
+
+def test_miner_does_not_import_the_recommender() -> None:
+    probe = "import sys, mining.market_basket; print('mining.recommendation' in sys.modules)"
+    result = subprocess.run(
+        [sys.executable, "-c", probe], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "False"
+
+
+def test_support_search_picks_highest_threshold_reaching_target_pair_rules() -> None:
+    rng = np.random.default_rng(7)
+    transactions = [
+        [str(item) for item in rng.zipf(1.4, size=rng.integers(2, 10)) % 50]
+        for _ in range(3_000)
+    ]
+    matrix = create_basket_matrix(transactions, top_n_products=40)
+
+    def pair_rules(min_support: float) -> int:
+        itemsets = run_counts(matrix, min_support, max_len=2)
+        return len(generate_rules(itemsets, min_threshold=0.3))
+
+    search = search_min_support(matrix.sparse.to_coo(), 25, min_confidence=0.3)
+
+    assert search.estimated_rules == pair_rules(search.min_support) >= 25
+    assert pair_rules(search.min_support + 1 / len(matrix)) < 25
+    assert 1 < search.evaluations <= int(np.log2(search.candidate_rules)) + 2
+    assert search.reached_target
+    with pytest.raises(BasketDataError, match="confidence>=1.5"):
+        search_min_support(matrix.sparse.to_coo(), 25, min_confidence=1.5)
+
+
+def test_support_search_flags_unreachable_targets_and_keeps_the_floor() -> None:
+    rng = np.random.default_rng(7)
+    transactions = [
+        [str(item) for item in rng.zipf(1.4, size=rng.integers(2, 10)) % 50]
+        for _ in range(3_000)
+    ]
+    coo = create_basket_matrix(transactions, top_n_products=40).sparse.to_coo()
+
+    search = search_min_support(coo, 1_000_000, min_confidence=0.3, support_floor=0.01)
+
+    assert not search.reached_target
+    assert search.estimated_rules < search.target_rules
+    assert search.min_support >= search.support_floor == 0.01
+    assert search_min_support(coo, 1_000_000, min_confidence=0.3).min_support >= 0.001
+    with pytest.raises(BasketDataError, match="min-support-floor"):
+        search_min_support(coo, 5, min_confidence=0.3, support_floor=0.9)
+
+
+def test_partitioned_son_mining_is_exact_and_reports_every_shard() -> None:
+    rng = np.random.default_rng(5)
+    transactions = [
+        [str(item) for item in rng.zipf(1.5, size=rng.integers(2, 10)) % 50]
+        for _ in range(2_000)
+    ]
+    matrix = create_basket_matrix(transactions, top_n_products=30)
+
+    itemsets, shards = run_partitioned(
+        matrix.sparse.to_coo(),
+        matrix.columns.tolist(),
+        0.01,
+        partitions=3,
+        workers=2,
+    )
+    reference = run_fpgrowth(matrix, 0.01)
+
+    assert dict(zip(itemsets["itemsets"], itemsets["support"], strict=True)) == pytest.approx(
+        dict(zip(reference["itemsets"], reference["support"], strict=True))
+    )
+    assert [shard.baskets for shard in shards] == [666, 667, 667]
+    assert all(shard.local_itemsets > 0 and shard.mine_seconds >= 0 for shard in shards)
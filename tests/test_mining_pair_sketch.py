@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from mining.basket_store import BasketArrays
+from mining.market_basket import basket_frame, encode_baskets, run_counts
+from mining.pair_sketch import CountMinSketch, count_pairs_streaming
+
+N_ITEMS = 400
+
+
+def _baskets(count: int) -> BasketArrays:
+    rng = np.random.default_rng(7)
+    rows = [np.unique(rng.zipf(1.3, size=rng.integers(2, 15)) % N_ITEMS) for _ in range(count)]
+    indptr = np.concatenate(([0], np.cumsum([len(row) for row in rows]))).astype(np.int32)
+    return BasketArrays(
+        order_ids=np.arange(1, count + 1, dtype=np.int64),
+        indptr=indptr,
+        indices=np.concatenate(rows).astype(np.int32),
+    )
+
+
+def _exact_supports(baskets: BasketArrays, min_support: float) -> dict[frozenset, float]:
+    encoded, product_ids = encode_baskets(baskets.indptr, baskets.indices, N_ITEMS, N_ITEMS)
+    exact = run_counts(basket_frame(encoded, product_ids), min_support)
+    exact = exact[exact["length"] <= 2]
+    return dict(zip(exact["itemsets"], exact["support"], strict=True))
+
+
+def test_sketched_pairs_over_every_product_match_exact_counts() -> None:
+    baskets = _baskets(4_000)
+
+    itemsets, stats = count_pairs_streaming(
+        baskets, 0.002, memory_mb=0.25, capacity=5_000, chunk_baskets=700
+    )
+
+    assert stats.complete
+    assert stats.memory_mb <= 0.25
+    assert stats.pair_occurrences == int(
+        (np.diff(baskets.indptr) * (np.diff(baskets.indptr) - 1) // 2).sum()
+    )
+    assert stats.max_overcount == pytest.approx(np.e / stats.width * stats.pair_occurrences)
+    assert dict(zip(itemsets["itemsets"], itemsets["support"], strict=True)) == pytest.approx(
+        _exact_supports(baskets, 0.002)
+    )
+
+
+def test_full_heavy_hitter_set_keeps_the_strongest_pairs_and_reports_its_floor() -> None:
+    baskets = _baskets(4_000)
+    exact = _exact_supports(baskets, 0.002)
+    pairs = {itemset: support for itemset, support in exact.items() if len(itemset) == 2}
+
+    itemsets, stats = count_pairs_streaming(baskets, 0.002, capacity=50, chunk_baskets=700)
+
+    assert not stats.complete
+    found = itemsets[itemsets["length"] == 2]
+    assert 0 < len(found) <= 50
+    for itemset, support in zip(found["itemsets"], found["support"], strict=True):
+        assert support == pytest.approx(pairs[itemset])
+    missed = set(pairs) - set(found["itemsets"])
+    assert all(pairs[itemset] * len(baskets) <= stats.candidate_floor for itemset in missed)
+
+
+def test_count_min_estimates_never_undercount() -> None:
+    keys = np.random.default_rng(1).integers(0, 10_000, size=50_000)
+    sketch = CountMinSketch(256, 4)
+    sketch.add(keys)
+
+    distinct, counts = np.unique(keys, return_counts=True)
+    estimates = sketch.estimate(distinct)
+    assert (estimates >= counts).all()
+    assert sketch.nbytes == 4 * 256 * 4
@@ -1,8 +1,9 @@
+import numpy as np
 import pandas as pd
 import pytest
 
 import mining.recommendation as recommendation
-from mining.artifacts import itemset_to_json
+from mining.artifacts import itemset_from_json, itemset_to_json
 
 
 @pytest.fixture
@@ -65,6 +66,141 @@ def test_rule_recommendations_exclude_products_already_in_cart(
     assert "Milk" not in recommended
 
 
+def _scan_rules(cart: frozenset[str], rules: pd.DataFrame, n: int) -> list[str]:
+    """The per-rule subset scan the index replaces."""
+    scores: dict[str, float] = {}
+    for row in rules.itertuples(index=False):
+        if row.antecedent_items and row.antecedent_items.issubset(cart):
+            quality = row.support * row.confidence * max(row.lift, 0.0)
+            for product in row.consequent_items:
+                if product not in cart:
+                    scores[product] = scores.get(product, 0.0) + quality
+    return [product for product, _ in sorted(scores.items(), key=lambda p: (-p[1], p[0]))[:n]]
+
+
+def test_rule_index_touches_cart_postings_and_ranks_like_a_full_scan() -> None:
+    rng = np.random.default_rng(2)
+    records = []
+    for _ in range(400):
+        items = rng.choice(30, size=rng.integers(2, 5), replace=False).astype(str)
+        split = int(rng.integers(1, len(items)))
+        records.append(
+            {
+                "antecedents_json": itemset_to_json(set(items[:split])),
+                "consequents_json": itemset_to_json(set(items[split:])),
+                "support": round(float(rng.uniform(0.01, 0.2)), 2),
+                "confidence": round(float(rng.uniform(0.1, 0.9)), 1),
+                "lift": round(float(rng.uniform(0.5, 3.0)), 1),
+            }
+        )
+    frame = pd.DataFrame(records)
+    index = recommendation.RuleIndex.from_rules(frame)
+    prepared = frame.assign(
+        antecedent_items=frame["antecedents_json"].map(itemset_from_json),
+        consequent_items=frame["consequents_json"].map(itemset_from_json),
+    )
+
+    assert len(index) == len(frame)
+    for _ in range(200):
+        cart = frozenset(rng.choice(32, size=rng.integers(1, 8), replace=False).astype(str))
+        assert recommendation.recommend_by_rules(cart, index, 10) == _scan_rules(
+            cart, prepared, 10
+        )
+    cart_codes = index.ids.cart_codes({"3", "7"})
+    matched = index.ids.matching_rules(cart_codes)
+    assert set(matched) == {
+        rule
+        for rule, items in enumerate(prepared["antecedent_items"])
+        if items <= {"3", "7"}
+    }
+
+
+def test_batch_recommendations_match_single_calls_with_one_cluster_query(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    rng = np.random.default_rng(4)
+    names = {str(item): f"Product {item % 25}" for item in range(40)}
+    records = []
+    for _ in range(300):
+        items = rng.choice(40, size=rng.integers(2, 4), replace=False).astype(str)
+        records.append(
+            {
+                "antecedents_json": itemset_to_json(set(items[:1])),
+                "consequents_json": itemset_to_json(set(items[1:])),
+                "antecedent_names_json": itemset_to_json({names[items[0]]}),
+                "consequent_names_json": itemset_to_json({names[item] for item in items[1:]}),
+                "support": round(float(rng.uniform(0.01, 0.2)), 2),
+                "confidence": round(float(rng.uniform(0.1, 0.9)), 1),
+                "lift": round(float(rng.uniform(0.5, 3.0)), 1),
+            }
+        )
+    # Rules with zero lift or support still rank their consequents, at score 0.
+    for record in records[::7]:
+        record["lift"] = 0.0
+    for record in records[3::11]:
+        record["support"] = 0.0
+    index = recommendation.RuleIndex.from_rules(pd.DataFrame(records))
+    clusters = pd.DataFrame({"user_id": range(1, 31), "cluster": np.arange(30) % 3})
+    popularity = pd.DataFrame(
+        [
+            {
+                "cluster": cluster,
+                "popularity_rank": rank + 1,
+                "product_id": int(product),
+                "product_name": names[str(product)],
+                "order_count": 100 - rank,
+                "reorder_rate": 0.5,
+            }
+            for cluster in range(3)
+            for rank, product in enumerate(rng.permutation(40))
+        ]
+    )
+    queries: list[set[int]] = []
+
+    def load_popularity(engine, members: pd.DataFrame, candidate_limit: int) -> pd.DataFrame:
+        queries.append(set(members["cluster"]))
+        selected = popularity[popularity["cluster"].isin(members["cluster"])]
+        return selected.groupby("cluster").head(candidate_limit)
+
+    monkeypatch.setattr(recommendation, "query_cluster_popularity", load_popularity)
+    requests = []
+    for user_id in range(1, 36):
+        cart = rng.choice(40, size=rng.integers(0, 6), replace=False).astype(str).tolist()
+        requests.append(
+            recommendation.RecommendationRequest(
+                user_id, tuple(names[item] for item in cart) if user_id % 2 else tuple(cart)
+            )
+        )
+
+    batch = recommendation.recommend_batch(requests, index, clusters, n=4, engine=object())
+
+    assert queries == [{0, 1, 2}]
+    single = [
+        recommendation.hybrid_recommend(
+            request.user_id, request.cart_items, index, clusters, n=4, engine=object()
+        )
+        for request in requests
+    ]
+    assert batch == single
+    precomputed = recommendation.recommend_batch(
+        requests, index, clusters, n=4, popularity=popularity
+    )
+    assert precomputed == batch
+    assert len(queries) == 1 + len(requests) - 5
+    assert any(len(result) == 4 for result in batch)
+    assert recommendation.recommend_batch([], index, clusters) == []
+
+    no_popularity = popularity.iloc[:0]
+    assert recommendation.recommend_batch(
+        requests, index, clusters, n=4, popularity=no_popularity
+    ) == [
+        recommendation.hybrid_recommend(
+            request.user_id, request.cart_items, index, clusters, n=4, popularity=no_popularity
+        )
+        for request in requests
+    ]
+
+
 def test_hybrid_recommendation_uses_weighted_rrf_and_filters_cart(
     monkeypatch: pytest.MonkeyPatch,
     rules: pd.DataFrame,
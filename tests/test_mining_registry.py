@@ -0,0 +1,161 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mining.recommendation import (
+    RecommendationDataError,
+    RuleIndex,
+    load_registered,
+)
+from mining.registry import ArtifactRegistry, RegistryError
+from mining.rule_store import save_rule_store
+
+
+def _rules_run(directory: Path, lift: float) -> dict[str, Path]:
+    rules = pd.DataFrame(
+        {
+            "antecedents": [frozenset({"10"}), frozenset({"20"})],
+            "consequents": [frozenset({"20"}), frozenset({"10", "30"})],
+            "support": [0.2, 0.1],
+            "confidence": [0.8, 0.5],
+            "lift": [lift, 1.2],
+        }
+    )
+    catalog = {"10": "Banana", "20": "Milk", "30": "Bread"}
+    metadata = directory / "market_basket_metadata.json"
+    metadata.write_text(f'{{"lift": {lift}}}\n', encoding="utf-8")
+    return {
+        "rules": save_rule_store(rules, directory / "association_rules", catalog=catalog),
+        "metadata": metadata,
+    }
+
+
+def _clusters_run(directory: Path, users: int = 3) -> dict[str, Path]:
+    labels = directory / "cluster_labels.csv"
+    pd.DataFrame({"user_id": range(1, users + 1), "cluster": [0, 0] + [1] * (users - 2)}).to_csv(
+        labels, index=False
+    )
+    return {"labels": labels}
+
+
+def test_runs_are_stored_once_per_content_and_resolved_by_digest(tmp_path: Path) -> None:
+    registry = ArtifactRegistry(tmp_path / "registry")
+    files = _rules_run(tmp_path, lift=1.5)
+
+    first = registry.register("rules", files, parameters={"min_support": 0.01}, etl_run_id="a1")
+    again = registry.register(
+        "rules", files, parameters={"min_support": 0.5}, etl_run_id="a1"
+    )
+    assert again == first
+    assert first.parameters == {"min_support": 0.01}
+    assert len(registry.runs()) == 1
+    assert registry.refs() == {"rules": first.digest}
+    assert registry.resolve("rules", first.digest[:8]) == first
+    assert (registry.path(first, "rules") / "manifest.json").is_file()
+
+    (tmp_path / "rerun").mkdir()
+    rerun = _rules_run(tmp_path / "rerun", lift=1.5)
+    rerun["metadata"].write_text('{"created_at": "later"}\n', encoding="utf-8")
+    assert registry.register("rules", rerun, etl_run_id="a1") == first
+
+    (tmp_path / "newer").mkdir()
+    second = registry.register("rules", _rules_run(tmp_path / "newer", lift=2.0))
+    assert second.digest != first.digest
+    assert registry.resolve("rules") == second
+    with pytest.raises(RegistryError, match="No current clusters run"):
+        registry.resolve("clusters")
+    with pytest.raises(RegistryError, match="is a rules run"):
+        registry.resolve("clusters", first.digest)
+    with pytest.raises(FileNotFoundError):
+        registry.register("rules", {"rules": tmp_path / "missing"})
+
+
+def test_derived_structures_are_cached_by_digest(tmp_path: Path) -> None:
+    registry = ArtifactRegistry(tmp_path / "registry")
+    run = registry.register("clusters", _clusters_run(tmp_path))
+    builds = []
+
+    def build() -> dict[str, np.ndarray]:
+        builds.append(1)
+        return {"users": np.arange(100_000)}
+
+    assert registry.cached(run.digest, "labels-v1", build)["users"].sum() == 4_999_950_000
+    cached = registry.cached(run.digest, "labels-v1", build)
+    assert isinstance(cached["users"], np.memmap)
+    assert len(builds) == 1
+
+    (registry.cache_dir / run.digest / "labels-v1.joblib").write_bytes(b"truncated")
+    registry.cached(run.digest, "labels-v1", build)
+    assert len(builds) == 2
+
+
+def test_registered_rules_and_clusters_load_from_one_warehouse_load(tmp_path: Path) -> None:
+    registry = ArtifactRegistry(tmp_path / "registry")
+    rules_run = registry.register("rules", _rules_run(tmp_path, lift=1.5), etl_run_id="load-1")
+    clusters_run = registry.register("clusters", _clusters_run(tmp_path), etl_run_id="load-1")
+
+    loaded = load_registered(registry)
+    assert (loaded.rules_run, loaded.clusters_run) == (rules_run, clusters_run)
+    assert loaded.popularity is None
+    assert loaded.clusters.clusters_of([2, 3]).tolist() == [0, 1]
+    assert loaded.rules.recommend(["Banana"], 2) == ["Milk"]
+    reloaded = load_registered(registry).rules
+    assert isinstance(reloaded, RuleIndex)
+    assert isinstance(reloaded.quality, np.memmap)
+
+    (tmp_path / "other").mkdir()
+    registry.register("clusters", _clusters_run(tmp_path / "other", 4), etl_run_id="load-2")
+    with pytest.raises(RecommendationDataError, match="different warehouse loads"):
+        load_registered(registry)
+    assert load_registered(registry, clusters_digest=clusters_run.digest).clusters_run == (
+        clusters_run
+    )
+
+    unlabelled = registry.register("clusters", _clusters_run(tmp_path / "other", 5))
+    with pytest.raises(RecommendationDataError, match=f"clusters run {unlabelled.digest[:12]}"):
+        load_registered(registry)
+    with pytest.warns(RuntimeWarning, match="record no ETL load"):
+        assert load_registered(registry, allow_unknown_load=True).clusters_run == unlabelled
+
+
+def test_identical_content_reregistered_after_a_reload_records_the_new_load(
+    tmp_path: Path,
+) -> None:
+    registry = ArtifactRegistry(tmp_path / "registry")
+    clusters = _clusters_run(tmp_path)
+    first = registry.register("clusters", clusters, etl_run_id="load-A")
+    reloaded = registry.register("clusters", clusters, etl_run_id="load-B")
+    assert reloaded.digest != first.digest
+    assert (first.etl_run_id, reloaded.etl_run_id) == ("load-A", "load-B")
+    assert registry.register("clusters", clusters, etl_run_id="load-B") == reloaded
+
+    rules_run = registry.register("rules", _rules_run(tmp_path, lift=1.5), etl_run_id="load-B")
+    loaded = load_registered(registry)
+    assert (loaded.rules_run, loaded.clusters_run) == (rules_run, reloaded)
+    with pytest.raises(RecommendationDataError, match="different warehouse loads"):
+        load_registered(registry, clusters_digest=first.digest)
+
+
+def test_gc_keeps_current_and_recently_used_runs(tmp_path: Path) -> None:
+    registry = ArtifactRegistry(tmp_path / "registry")
+    digests = []
+    for lift in (1.1, 1.2, 1.3, 1.4):
+        directory = tmp_path / str(lift)
+        directory.mkdir()
+        digest = registry.register("rules", _rules_run(directory, lift=lift)).digest
+        registry.cached(digest, "rule_index-v1", lambda: {"rules": 2})
+        os.utime(registry.runs_dir / digest, (len(digests), len(digests)))
+        digests.append(digest)
+    registry.set_current("rules", digests[0])
+
+    assert registry.gc(keep=2, dry_run=True) == [digests[1]]
+    assert registry.gc(keep=2) == [digests[1]]
+    assert {run.digest for run in registry.runs()} == {digests[0], digests[2], digests[3]}
+    assert sorted(path.name for path in registry.cache_dir.iterdir()) == sorted(
+        [digests[0], digests[2], digests[3]]
+    )
+    assert registry.gc(keep=0) == [digests[3], digests[2]]
+    assert [run.digest for run in registry.runs()] == [digests[0]]
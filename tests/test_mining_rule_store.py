@@ -0,0 +1,108 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mining.market_basket import save_rules
+from mining.recommendation import RuleIndex, load_association_rules, load_rule_index
+from mining.rule_store import (
+    MANIFEST_NAME,
+    RuleStoreError,
+    default_rules_path,
+    load_rule_store,
+    save_rule_store,
+)
+
+
+@pytest.fixture
+def rules() -> pd.DataFrame:
+    rng = np.random.default_rng(8)
+    records = []
+    for _ in range(300):
+        items = rng.choice(40, size=rng.integers(2, 5), replace=False).astype(str)
+        split = int(rng.integers(1, len(items)))
+        records.append(
+            {
+                "antecedents": frozenset(items[:split]),
+                "consequents": frozenset(items[split:]),
+                "support": round(float(rng.uniform(0.01, 0.2)), 2),
+                "confidence": round(float(rng.uniform(0.1, 0.9)), 1),
+                "lift": round(float(rng.uniform(0.5, 3.0)), 1),
+                "leverage": 0.01,
+                "conviction": 1.1,
+            }
+        )
+    return pd.DataFrame(records)
+
+
+def test_rule_store_round_trips_and_ranks_like_the_csv_export(
+    tmp_path: Path, rules: pd.DataFrame
+) -> None:
+    # Several IDs share a name, so name itemsets can be smaller than ID itemsets.
+    catalog = {str(item): f"Product {item % 25}" for item in range(39)}
+    store = save_rule_store(rules, tmp_path / "association_rules", catalog=catalog)
+    csv_path = save_rules(rules, tmp_path / "association_rules.csv", catalog=catalog)
+
+    arrays = load_rule_store(store)
+    assert isinstance(arrays.antecedent_items, np.memmap)
+    assert len(arrays) == len(rules)
+    assert arrays.itemsets("antecedent") == rules["antecedents"].tolist()
+    assert arrays.catalog()["39"] == "product:39"
+    assert default_rules_path(tmp_path) == store
+
+    from_store = load_association_rules(store)
+    from_csv = load_association_rules(csv_path)
+    for column in ("antecedent_items", "consequent_name_items", "support", "lift"):
+        assert from_store[column].tolist() == from_csv[column].tolist()
+
+    indexed, reference = load_rule_index(store), RuleIndex.from_rules(from_csv)
+    rng = np.random.default_rng(3)
+    for _ in range(200):
+        cart = rng.choice(41, size=rng.integers(1, 8), replace=False)
+        ids = [str(item) for item in cart]
+        names = [catalog.get(item, f"product:{item}") for item in ids]
+        for cart_items in (ids, names):
+            assert indexed.recommend(cart_items, 10) == reference.recommend(cart_items, 10)
+
+
+def test_rule_store_rejects_unusable_rules_and_other_schemas(
+    tmp_path: Path, rules: pd.DataFrame
+) -> None:
+    with pytest.raises(RuleStoreError, match="integer"):
+        save_rule_store(rules.assign(antecedents=[frozenset({"Milk"})] * len(rules)), tmp_path)
+    with pytest.raises(RuleStoreError, match="empty"):
+        save_rule_store(rules.iloc[:0], tmp_path / "empty")
+
+    store = save_rule_store(rules.drop(columns=["leverage"]), tmp_path / "association_rules")
+    assert sorted(load_rule_store(store).metrics) == ["confidence", "conviction", "lift", "support"]
+    manifest = json.loads((store / MANIFEST_NAME).read_text(encoding="utf-8"))
+    (store / MANIFEST_NAME).write_text(
+        json.dumps(manifest | {"rule_store_schema_version": 0}), encoding="utf-8"
+    )
+    with pytest.raises(RuleStoreError, match="unsupported schema"):
+        load_rule_store(store)
+    missing = tmp_path / "missing"
+    assert default_rules_path(missing) == missing / "association_rules.csv"
+
+
+def test_rule_store_swaps_versions_behind_a_symlink(tmp_path: Path, rules: pd.DataFrame) -> None:
+    legacy = tmp_path / "association_rules"
+    legacy.mkdir()
+    (legacy / "stale.npy").write_bytes(b"")
+
+    store = save_rule_store(rules.iloc[:10], legacy)
+    first = store.resolve()
+    assert store.is_symlink() and not (first / "stale.npy").exists()
+    opened = load_rule_store(store)
+
+    save_rule_store(rules.iloc[:20], store)
+    second = store.resolve()
+    assert len(load_rule_store(store)) == 20
+    assert first.is_dir() and len(opened) == 10
+
+    save_rule_store(rules, store)
+    versions = sorted(tmp_path.glob(".association_rules.version-*"))
+    assert versions == sorted([second, store.resolve()])
+    assert default_rules_path(tmp_path) == store
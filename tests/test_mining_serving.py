@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import mining.serving as serving
+from mining.artifacts import file_digest, itemset_to_json
+from mining.recommendation import hybrid_recommend, load_cluster_popularity, load_rule_index
+
+
+def _write_rules(path: Path, consequent: str) -> None:
+    pd.DataFrame(
+        [
+            {
+                "antecedents_json": itemset_to_json({"1"}),
+                "consequents_json": itemset_to_json({"2"}),
+                "antecedent_names_json": itemset_to_json({"Milk"}),
+                "consequent_names_json": itemset_to_json({consequent}),
+                "support": 0.2,
+                "confidence": 0.8,
+                "lift": 1.5,
+            }
+        ]
+    ).to_csv(path, index=False)
+
+
+@pytest.fixture
+def artifacts(tmp_path: Path) -> Path:
+    _write_rules(tmp_path / "association_rules.csv", "Bread")
+    pd.DataFrame({"user_id": [1, 2], "cluster": [0, 1]}).to_csv(
+        tmp_path / "cluster_labels.csv", index=False
+    )
+    pd.DataFrame(
+        {
+            "cluster": [0, 0, 1],
+            "popularity_rank": [1, 2, 1],
+            "product_id": [3, 1, 4],
+            "product_name": ["Eggs", "Milk", "Coffee"],
+            "order_count": [9, 8, 7],
+            "reorder_rate": [0.5, 0.4, 0.3],
+            "labels_digest": file_digest(tmp_path / "cluster_labels.csv"),
+        }
+    ).to_csv(tmp_path / "cluster_popularity.csv", index=False)
+    return tmp_path
+
+
+def _get(base: str, path: str) -> tuple[int, bytes]:
+    try:
+        with urllib.request.urlopen(base + path, timeout=5) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as error:
+        return error.code, error.read()
+
+
+def test_server_answers_like_hybrid_recommend_and_hot_reloads(artifacts: Path) -> None:
+    rules_path = artifacts / "association_rules.csv"
+    store = serving.ArtifactStore(
+        rules_path, artifacts / "cluster_labels.csv", reload_interval=0.0
+    )
+    server = serving.RecommendationServer(
+        ("127.0.0.1", 0), serving.RecommendationService(store)
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        status, body = _get(base, "/recommend?user_id=1&cart=Milk&n=3")
+        assert status == 200
+        expected = hybrid_recommend(
+            1,
+            ["Milk"],
+            load_rule_index(rules_path),
+            pd.read_csv(artifacts / "cluster_labels.csv"),
+            3,
+            popularity=load_cluster_popularity(artifacts / "cluster_popularity.csv"),
+        )
+        assert [
+            (entry["product"], entry["score"]) for entry in json.loads(body)["recommendations"]
+        ] == expected
+        assert [product for product, _ in expected] == ["Bread", "Eggs"]
+
+        _write_rules(rules_path, "Butter")
+        stat = rules_path.stat()
+        os.utime(rules_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        request = urllib.request.Request(
+            base + "/recommend/batch",
+            data=json.dumps(
+                {"requests": [{"user_id": 1, "cart": ["Milk"]}, {"user_id": 2}], "n": 2}
+            ).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=5) as response:
+            results = json.loads(response.read())["results"]
+        assert [entry["product"] for entry in results[0]["recommendations"]] == [
+            "Butter",
+            "Eggs",
+        ]
+        assert [entry["product"] for entry in results[1]["recommendations"]] == ["4"]
+
+        (artifacts / "cluster_labels.csv").write_text("user_id\n1\n", encoding="utf-8")
+        assert store.refresh() is False
+        assert _get(base, "/healthz")[0] == 200
+        assert _get(base, "/recommend?cart=Milk")[0] == 400
+        assert _get(base, "/missing")[0] == 404
+
+        status, body = _get(base, "/metrics")
+        metrics = body.decode()
+        assert status == 200
+        assert 'instacart_recommend_requests_total{route="/recommend",status="200"} 1' in metrics
+        assert 'instacart_recommend_requests_total{route="/recommend",status="400"} 1' in metrics
+        assert (
+            'instacart_recommend_latency_seconds_count{route="/recommend/batch"} 1' in metrics
+        )
+        assert 'instacart_recommend_reloads_total{outcome="success"} 2' in metrics
+        assert 'instacart_recommend_reloads_total{outcome="failure"} 1' in metrics
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_latency_histogram_buckets_are_cumulative() -> None:
+    histogram = serving.LatencyHistogram((0.01, 0.1))
+    for seconds in (0.005, 0.01, 0.05, 3.0):
+        histogram.observe(seconds)
+
+    assert histogram.cumulative() == [("0.01", 2), ("0.1", 3), ("+Inf", 4)]
+    assert histogram.count == 4
+    with pytest.raises(ValueError):
+        serving.LatencyHistogram((0.1, 0.01))
+
+
+def test_server_refuses_non_loopback_addresses(artifacts: Path) -> None:
+    store = serving.ArtifactStore(
+        artifacts / "association_rules.csv", artifacts / "cluster_labels.csv"
+    )
+    with pytest.raises(ValueError, match="loopback"):
+        serving.RecommendationServer(("0.0.0.0", 0), serving.RecommendationService(store))
+
+
+def test_cluster_artifacts_reload_only_as_a_complete_clustering_run(artifacts: Path) -> None:
+    labels_path = artifacts / "cluster_labels.csv"
+    popularity_path = artifacts / "cluster_popularity.csv"
+    metadata_path = artifacts / "clustering_metadata.json"
+
+    def write_metadata(popularity: str | None) -> None:
+        metadata_path.write_text(
+            json.dumps(
+                {"labels_digest": file_digest(labels_path), "artifacts": {"popularity": popularity}}
+            ),
+            encoding="utf-8",
+        )
+
+    write_metadata("cluster_popularity.csv")
+    store = serving.ArtifactStore(artifacts / "association_rules.csv", labels_path)
+    assert store.artifacts.clusters.clusters_of([2]).tolist() == [1]
+
+    # A new run has written its labels but not yet its popularity or metadata.
+    pd.DataFrame({"user_id": [1, 2], "cluster": [1, 0]}).to_csv(labels_path, index=False)
+    assert store.refresh() is False
+    assert store.artifacts.clusters.clusters_of([2]).tolist() == [1]
+    assert 'reloads_total{outcome="failure"} 0' in store.metrics.render()
+
+    popularity = pd.read_csv(popularity_path).assign(labels_digest=file_digest(labels_path))
+    popularity.to_csv(popularity_path, index=False)
+    write_metadata("cluster_popularity.csv")
+    assert store.refresh() is True
+    assert store.artifacts.clusters.clusters_of([2]).tolist() == [0]
+    assert store.artifacts.popularity is not None
+
+    popularity_path.unlink()
+    write_metadata(None)
+    assert store.refresh() is True
+    assert store.artifacts.popularity is None
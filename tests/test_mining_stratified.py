@@ -0,0 +1,92 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from mining.basket_store import BasketArrays
+from mining.market_basket import basket_frame, encode_baskets, generate_rules, run_fpgrowth
+from mining.recommendation import load_association_rules, select_stratum_rules
+from mining.stratified import TimeLookup, mine_strata, stratum_labels, write_strata
+
+TIME_LOOKUP = TimeLookup(
+    hour_ranges=tuple(
+        "00-06 Night" if hour < 6 else "06-12 Morning" if hour < 12 else "12-18 Afternoon"
+        if hour < 18 else "18-24 Evening"
+        for _ in range(7)
+        for hour in range(24)
+    ),
+    weekend=tuple(dow in (0, 6) for dow in range(7) for _ in range(24)),
+)
+
+
+def _baskets(count: int) -> BasketArrays:
+    rng = np.random.default_rng(13)
+    lengths = rng.integers(2, 8, size=count)
+    indptr = np.concatenate(([0], np.cumsum(lengths))).astype(np.int32)
+    indices = (rng.zipf(1.4, size=int(indptr[-1])) % 30).astype(np.int32)
+    # Users 0-9 order in the morning, the rest in the afternoon; user 0 has no segment.
+    user_id = np.arange(count, dtype=np.int32) % 40
+    return BasketArrays(
+        order_ids=np.arange(1, count + 1, dtype=np.int64),
+        indptr=indptr,
+        indices=indices,
+        attributes={
+            "user_id": user_id,
+            "order_dow": np.where(user_id % 2 == 0, 0, 3).astype(np.int8),
+            "order_hour": np.where(user_id < 10, 9, 15).astype(np.int8),
+        },
+    )
+
+
+def test_strata_are_mined_once_each_and_selectable_by_context(tmp_path: Path) -> None:
+    baskets = _baskets(2_000)
+    segments = pd.Series(["VIP"] * 9 + ["Regular"] * 30, index=range(1, 40))
+    labels = stratum_labels(
+        baskets,
+        ("user_segment", "hour_range"),
+        time_lookup=TIME_LOOKUP,
+        segments=segments,
+    )
+
+    results = mine_strata(
+        baskets,
+        labels,
+        min_baskets=100,
+        workers=2,
+        top_products=20,
+        algorithm="fpgrowth",
+        min_support=0.02,
+        target_rules=None,
+        min_confidence=0.2,
+        min_lift=None,
+        top_k=None,
+    )
+    index_path = write_strata(
+        results,
+        tmp_path / "strata",
+        dimensions=("user_segment", "hour_range"),
+        time_lookup=TIME_LOOKUP,
+        catalog=None,
+        parameters={"min_support": 0.02},
+    )
+
+    by_key = {tuple(result.key.values()): result for result in results}
+    assert {key: result.status for key, result in by_key.items()} == {
+        ("Regular", "12-18 Afternoon"): "ok",
+        ("Unknown", "06-12 Morning"): "too_few_baskets",
+        ("VIP", "06-12 Morning"): "ok",
+    }
+    assert sum(result.baskets for result in results) == len(baskets)
+
+    selected = select_stratum_rules(index_path, user_segment="VIP", order_dow=3, order_hour=9)
+    assert selected == tmp_path / "strata" / "vip__06-12-morning" / "association_rules"
+    vip = baskets.select(labels["user_segment"].eq("VIP").to_numpy())
+    encoded, product_ids = encode_baskets(vip.indptr, vip.indices, 30, 20)
+    itemsets = run_fpgrowth(basket_frame(encoded, product_ids), 0.02)
+    expected = generate_rules(itemsets, min_threshold=0.2)
+    assert len(load_association_rules(selected)) == len(expected)
+
+    for segment, hour in (("Unknown", 9), ("VIP", 20)):
+        context = {"user_segment": segment, "order_dow": 1, "order_hour": hour}
+        assert select_stratum_rules(index_path, **context) is None
+    assert select_stratum_rules(index_path, user_segment="VIP") is None
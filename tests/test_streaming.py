@@ -0,0 +1,105 @@
+import pymysql
+import pytest
+from sqlalchemy import create_engine, text
+
+from etl.streaming import read_frame, stream_frames
+
+ROWS = 10_000
+CHUNK_SIZE = 1_000
+QUERY = text("SELECT line_id, label FROM lines ORDER BY line_id")
+# Answers to the statements SQLAlchemy's MySQL dialect sends on first connect.
+SERVER_SETTINGS = {
+    "VERSION()": "10.11.6-MariaDB",
+    "DATABASE()": "instacart_dwh",
+    "@@TX_ISOLATION": "REPEATABLE-READ",
+    "@@SQL_MODE": "",
+    "@@LOWER_CASE_TABLE_NAMES": "0",
+}
+
+
+class FakeCursor:
+    """A PyMySQL-like cursor: the default class buffers the whole result on execute."""
+
+    def __init__(self, connection: "FakeConnection", cursorclass: type | None) -> None:
+        self.connection = connection
+        self.cursorclass = cursorclass
+        self.rows: list[tuple] = []
+        self.description: list[tuple] | None = None
+        self.rowcount = -1
+
+    def execute(self, statement: str, parameters: object = None) -> None:
+        upper = statement.upper()
+        setting = next((value for key, value in SERVER_SETTINGS.items() if key in upper), None)
+        if "FROM LINES" in upper:
+            if self.cursorclass is not pymysql.cursors.SSCursor:
+                raise AssertionError("a buffered cursor would hold every row on the client")
+            self.connection.cursor_classes.append(self.cursorclass)
+            rows = [(index, f"product-{index:08d}") for index in range(ROWS)]
+            self._result(rows, ("line_id", "label"))
+        else:
+            self._result([] if setting is None else [(setting,)], ("value",))
+
+    def _result(self, rows: list[tuple], names: tuple[str, ...]) -> None:
+        self.rows = rows
+        self.description = [(name, None, None, None, None, None, None) for name in names]
+
+    def fetchone(self) -> tuple | None:
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchmany(self, size: int = 1) -> list[tuple]:
+        self.connection.fetch_sizes.append(size)
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def fetchall(self) -> list[tuple]:
+        raise AssertionError("an unbuffered result must not be fetched all at once")
+
+    def close(self) -> None:
+        pass
+
+
+class FakeConnection:
+    def __init__(self) -> None:
+        self.cursor_classes: list[type] = []
+        self.fetch_sizes: list[int] = []
+
+    def cursor(self, cursorclass: type | None = None) -> FakeCursor:
+        return FakeCursor(self, cursorclass)
+
+    def character_set_name(self) -> str:
+        return "utf8mb4"
+
+    def ping(self, *args: object) -> None:
+        pass
+
+    def rollback(self) -> None:
+        pass
+
+    def commit(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+@pytest.fixture
+def connection() -> FakeConnection:
+    return FakeConnection()
+
+
+def test_streamed_reads_use_an_unbuffered_pymysql_cursor(connection: FakeConnection) -> None:
+    engine = create_engine("mysql+pymysql://", module=pymysql, creator=lambda: connection)
+
+    rows = 0
+    for chunk in stream_frames(engine, QUERY, chunk_size=CHUNK_SIZE):
+        assert len(chunk) <= CHUNK_SIZE
+        rows += len(chunk)
+
+    assert rows == ROWS
+    assert connection.cursor_classes == [pymysql.cursors.SSCursor]
+    assert max(connection.fetch_sizes) <= CHUNK_SIZE
+    assert read_frame(engine, QUERY, chunk_size=CHUNK_SIZE)["line_id"].tolist() == list(
+        range(ROWS)
+    )
+    with pytest.raises(AssertionError, match="buffered cursor"), engine.connect() as plain:
+        plain.execute(QUERY)